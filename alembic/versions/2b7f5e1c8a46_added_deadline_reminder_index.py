@@ -0,0 +1,28 @@
+"""Added deadline reminder index
+
+Revision ID: 2b7f5e1c8a46
+Revises: 9e3b7c1d4a58
+Create Date: 2026-10-17 16:41:09.204318
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '2b7f5e1c8a46'
+down_revision: Union[str, None] = '9e3b7c1d4a58'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_application_statuses_action_deadline_id', 'application_statuses', ['action_deadline', 'id'], unique=False, postgresql_where=sa.text('action_deadline IS NOT NULL'))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_application_statuses_action_deadline_id', table_name='application_statuses', postgresql_where=sa.text('action_deadline IS NOT NULL'))
@@ -0,0 +1,58 @@
+"""Moved session ids to user_sessions
+
+Revision ID: 3f9a1c7d2b64
+Revises: c12bdd87db15
+Create Date: 2026-10-17 11:20:41.512377
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3f9a1c7d2b64'
+down_revision: Union[str, None] = 'c12bdd87db15'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('user_sessions',
+    sa.Column('id', sa.Uuid(), nullable=False),
+    sa.Column('user_id', sa.Uuid(), nullable=False),
+    sa.Column('expires_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_user_sessions_user_id'), 'user_sessions', ['user_id'], unique=False)
+    # carry over whoever is currently logged in so nobody gets kicked out by the migration
+    op.execute(
+        """
+        INSERT INTO user_sessions (id, user_id, expires_at)
+        SELECT session_id, id, (now() at time zone 'utc') + interval '7 days'
+        FROM "user" WHERE session_id IS NOT NULL
+        """
+    )
+    op.drop_column('user', 'session_id')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.add_column('user', sa.Column('session_id', sa.Uuid(), nullable=True))
+    op.create_unique_constraint('user_session_id_key', 'user', ['session_id'])
+    # only one session per user fits back into the old column, keep the latest one
+    op.execute(
+        """
+        UPDATE "user" SET session_id = latest.id
+        FROM (
+            SELECT DISTINCT ON (user_id) id, user_id FROM user_sessions
+            ORDER BY user_id, expires_at DESC
+        ) AS latest
+        WHERE "user".id = latest.user_id
+        """
+    )
+    op.drop_index(op.f('ix_user_sessions_user_id'), table_name='user_sessions')
+    op.drop_table('user_sessions')
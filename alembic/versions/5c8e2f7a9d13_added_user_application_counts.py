@@ -0,0 +1,54 @@
+"""Added user_application_counts
+
+Revision ID: 5c8e2f7a9d13
+Revises: d41f6a8e3c27
+Create Date: 2026-10-17 12:41:05.913274
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5c8e2f7a9d13'
+down_revision: Union[str, None] = 'd41f6a8e3c27'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('user_application_counts',
+    sa.Column('user_id', sa.Uuid(), nullable=False),
+    sa.Column('applied', sa.Integer(), server_default='0', nullable=False),
+    sa.Column('interview', sa.Integer(), server_default='0', nullable=False),
+    sa.Column('pending', sa.Integer(), server_default='0', nullable=False),
+    sa.Column('offered', sa.Integer(), server_default='0', nullable=False),
+    sa.Column('rejected', sa.Integer(), server_default='0', nullable=False),
+    sa.Column('accepted', sa.Integer(), server_default='0', nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('user_id')
+    )
+    # every existing user gets a row, so stats never have to fall back to counting
+    op.execute(
+        """
+        INSERT INTO user_application_counts
+            (user_id, applied, interview, pending, offered, rejected, accepted)
+        SELECT u.id,
+            count(*) FILTER (WHERE a.status = 'Applied'),
+            count(*) FILTER (WHERE a.status = 'Interview'),
+            count(*) FILTER (WHERE a.status = 'Pending'),
+            count(*) FILTER (WHERE a.status = 'Offered'),
+            count(*) FILTER (WHERE a.status = 'Rejected'),
+            count(*) FILTER (WHERE a.status = 'Accepted')
+        FROM "user" u LEFT JOIN application_statuses a ON a.user_id = u.id
+        GROUP BY u.id
+        """
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('user_application_counts')
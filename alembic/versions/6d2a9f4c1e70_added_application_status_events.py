@@ -0,0 +1,52 @@
+"""Added application status events
+
+Revision ID: 6d2a9f4c1e70
+Revises: 2b7f5e1c8a46
+Create Date: 2026-10-17 17:25:42.118407
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '6d2a9f4c1e70'
+down_revision: Union[str, None] = '2b7f5e1c8a46'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+STATUSES = ('Applied', 'Interview', 'Pending', 'Offered', 'Rejected', 'Accepted')
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('application_status_events',
+    sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+    sa.Column('application_id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Uuid(), nullable=False),
+    sa.Column('from_status', sa.Enum(*STATUSES, name='application_status_event_from_status', native_enum=False, create_constraint=True), nullable=True),
+    sa.Column('to_status', sa.Enum(*STATUSES, name='application_status_event_to_status', native_enum=False, create_constraint=True), nullable=True),
+    sa.Column('changed_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_application_status_events_user_id_changed_at', 'application_status_events', ['user_id', 'changed_at'], unique=False)
+    op.create_index('ix_application_status_events_application_id_changed_at', 'application_status_events', ['application_id', 'changed_at', 'id'], unique=False)
+    # earlier changes were overwritten in place, so existing applications start their
+    # history in the status they have now, as of when they were created
+    op.execute(
+        """
+        INSERT INTO application_status_events (application_id, user_id, from_status, to_status, changed_at)
+        SELECT id, user_id, NULL, status, created_at
+        FROM application_statuses
+        """
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_application_status_events_application_id_changed_at', table_name='application_status_events')
+    op.drop_index('ix_application_status_events_user_id_changed_at', table_name='application_status_events')
+    op.drop_table('application_status_events')
@@ -0,0 +1,27 @@
+"""Added application keyset index
+
+Revision ID: 7b2e4d9a1f05
+Revises: 3f9a1c7d2b64
+Create Date: 2026-10-17 11:35:12.084311
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7b2e4d9a1f05'
+down_revision: Union[str, None] = '3f9a1c7d2b64'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_application_statuses_user_id_id', 'application_statuses', ['user_id', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_application_statuses_user_id_id', table_name='application_statuses')
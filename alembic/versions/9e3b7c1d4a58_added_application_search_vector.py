@@ -0,0 +1,40 @@
+"""Added application search vector
+
+Revision ID: 9e3b7c1d4a58
+Revises: 5c8e2f7a9d13
+Create Date: 2026-10-17 13:20:33.640158
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9e3b7c1d4a58'
+down_revision: Union[str, None] = '5c8e2f7a9d13'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # not mapped on UserApplication, see MIGRATION_ONLY in env.py
+    op.execute(
+        """
+        ALTER TABLE application_statuses ADD COLUMN search_vector tsvector
+        GENERATED ALWAYS AS (
+            to_tsvector('english',
+                coalesce(company_name, '') || ' ' || coalesce(role_name, '') || ' ' ||
+                coalesce(location, '') || ' ' || coalesce(notes, '')
+            )
+        ) STORED
+        """
+    )
+    op.create_index('ix_application_statuses_search_vector', 'application_statuses', ['search_vector'], unique=False, postgresql_using='gin')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_application_statuses_search_vector', table_name='application_statuses', postgresql_using='gin')
+    op.drop_column('application_statuses', 'search_vector')
@@ -0,0 +1,36 @@
+"""Added application filter indexes
+
+Revision ID: d41f6a8e3c27
+Revises: 7b2e4d9a1f05
+Create Date: 2026-10-17 12:02:47.551930
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd41f6a8e3c27'
+down_revision: Union[str, None] = '7b2e4d9a1f05'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_application_statuses_user_id_status', 'application_statuses', ['user_id', 'status'], unique=False)
+    op.create_index('ix_application_statuses_user_id_created_at', 'application_statuses', ['user_id', 'created_at', 'id'], unique=False)
+    op.create_index('ix_application_statuses_user_id_action_deadline', 'application_statuses', ['user_id', 'action_deadline', 'id'], unique=False, postgresql_where=sa.text('action_deadline IS NOT NULL'))
+    op.create_index('ix_application_statuses_user_id_company_name', 'application_statuses', ['user_id', sa.text('lower(company_name) text_pattern_ops')], unique=False)
+    op.create_index('ix_application_statuses_user_id_role_name', 'application_statuses', ['user_id', sa.text('lower(role_name) text_pattern_ops')], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_application_statuses_user_id_role_name', table_name='application_statuses')
+    op.drop_index('ix_application_statuses_user_id_company_name', table_name='application_statuses')
+    op.drop_index('ix_application_statuses_user_id_action_deadline', table_name='application_statuses', postgresql_where=sa.text('action_deadline IS NOT NULL'))
+    op.drop_index('ix_application_statuses_user_id_created_at', table_name='application_statuses')
+    op.drop_index('ix_application_statuses_user_id_status', table_name='application_statuses')
@@ -1,23 +1,57 @@
 """Modules for FastAPI, schemas, services and db session injection dependencies"""
 from typing import Annotated
+import io
 import uuid
 
-from fastapi import APIRouter, Depends, HTTPException, Response, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, UploadFile, status
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
+from redis.asyncio import Redis
 
-from app.services.user_applications_service import UserApplications
-from app.dependencies.security import verify_jwt
+from app.services.user_applications_service import UserApplications, stream_applications
+from app.dependencies.security import verify_jwt, verify_admin, verify_calendar_token
 from app.schemas.application_status import (
     UserApplicationCreate,
     UserApplicationModify,
     GetUserApplication,
-    ApplicationStatusCounts
+    ApplicationStatusCounts,
+    ApplicationAnalytics,
+    ApplicationsPageQuery,
+    ApplicationBatch,
+    ApplicationBatchResult,
+    ApplicationImportResult,
+    ExportFormat,
+    DeadlineWindow,
+    CalendarFeed,
+    DEFAULT_SEARCH_SIZE,
+    MAX_SEARCH_SIZE,
+    MAX_SEARCH_OFFSET,
+    DEFAULT_ANALYTICS_WEEKS,
+    MAX_ANALYTICS_WEEKS
+)
+from app.db.database import get_session, close_after
+from app.dependencies.redis_client import get_redis
+from app.dependencies.etag import application_etag, calendar_etag, cache_headers
+from app.core.calendar_token import CalendarToken
+from app.core.config import get_settings
+from app.exceptions.application_exceptions import (
+    NoApplicationFound,
+    InvalidApplication,
+    InvalidCursor,
+    InvalidImport,
+    ImportTooLarge
 )
-from app.db.database import get_session
-from app.exceptions.application_exceptions import NoApplicationFound, InvalidApplication
 from app.openapi import (
     INVALID_APPLICATION_RESPONSE,
     APPLICATION_NOT_FOUND_RESPONSE,
+    INVALID_CURSOR_RESPONSE,
+    INVALID_IMPORT_RESPONSE,
+    PAGINATED_RESPONSE,
+    NOT_MODIFIED_RESPONSE,
+    EXPORT_RESPONSE,
+    INVALID_ADMIN_KEY_RESPONSE,
+    INVALID_CALENDAR_TOKEN_RESPONSE,
+    CALENDAR_RESPONSE,
     BAD_JWT
 )
 from app.core.logger import setup_custom_logger
@@ -26,9 +60,19 @@ logger = setup_custom_logger(__name__)
 
 router = APIRouter(prefix="/api")
 
+settings = get_settings()
+
 APPLICATION_NOT_FOUND = "Application not found"
 INVALID_APPPLICATION = "Invalid application"
 SOMETHING_WRONG = "Something wrong"
+INVALID_CURSOR = "Invalid cursor"
+INVALID_IMPORT = "Invalid import file"
+IMPORT_TOO_LARGE = "Import file too large"
+
+EXPORT_MEDIA_TYPES = {
+    ExportFormat.NDJSON: "application/x-ndjson",
+    ExportFormat.CSV: "text/csv"
+}
 
 @router.post("/application",
     tags=["application"],
@@ -38,11 +82,12 @@ SOMETHING_WRONG = "Something wrong"
 async def create_application(
     application_details: UserApplicationCreate,
     user_id: Annotated[uuid.UUID, Depends(verify_jwt)],
-    db: Annotated[AsyncSession, Depends(get_session)]
+    db: Annotated[AsyncSession, Depends(get_session)],
+    redis: Annotated[Redis, Depends(get_redis)]
 ):
     """Creates a user application, then returns the application for frontend to instantly process"""
     try:
-        user_application = UserApplications(db)
+        user_application = UserApplications(db, redis)
         application = await user_application.create_application(application_details,
             user_id
         )
@@ -86,19 +131,96 @@ async def get_application(
             detail=SOMETHING_WRONG
         ) from e
 
+@router.post("/applications/batch",
+    tags=["application"],
+    response_model=ApplicationBatchResult,
+    responses={**BAD_JWT, **INVALID_APPLICATION_RESPONSE}
+)
+async def apply_application_batch(
+    batch: ApplicationBatch,
+    user_id: Annotated[uuid.UUID, Depends(verify_jwt)],
+    db: Annotated[AsyncSession, Depends(get_session)],
+    redis: Annotated[Redis, Depends(get_redis)]
+):
+    """Creates, modifies and deletes several user applications in one transaction,
+    then returns the outcome of every operation in request order"""
+    try:
+        user_application = UserApplications(db, redis)
+        result = await user_application.apply_batch(batch, user_id)
+        return result
+    except InvalidApplication as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=INVALID_APPPLICATION
+        ) from e
+    except Exception as e:
+        logger.error(e)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=SOMETHING_WRONG
+        ) from e
+
 @router.get("/all_applications",
     response_model=list[GetUserApplication],
     tags=["application"],
-    responses=BAD_JWT
+    responses={**PAGINATED_RESPONSE, **NOT_MODIFIED_RESPONSE, **BAD_JWT, **INVALID_CURSOR_RESPONSE}
 )
 async def get_all_applications(
     user_id: Annotated[uuid.UUID, Depends(verify_jwt)],
-    db: Annotated[AsyncSession, Depends(get_session)]
+    db: Annotated[AsyncSession, Depends(get_session)],
+    response: Response,
+    query: Annotated[ApplicationsPageQuery, Query()],
+    etag: Annotated[str | None, Depends(application_etag)]
+):
+    """Returns a page of users' applications given user's id, filtered and sorted server side.
+    Pass the X-Next-Cursor header back as cursor, with the same filters, to get the next page.
+    The header is absent on the last page"""
+    try:
+        user_application = UserApplications(db)
+        applications, next_cursor = await user_application.get_all_applications(
+            user_id,
+            limit=query.limit,
+            cursor=query.cursor,
+            filters=query
+        )
+        if next_cursor is not None:
+            response.headers["X-Next-Cursor"] = next_cursor
+        if etag is not None:
+            response.headers.update(cache_headers(etag))
+        return applications
+    except InvalidCursor as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=INVALID_CURSOR
+        ) from e
+    except Exception as e:
+        logger.error(e)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=SOMETHING_WRONG
+        ) from e
+
+@router.get("/applications/search",
+    response_model=list[GetUserApplication],
+    tags=["application"],
+    responses={**NOT_MODIFIED_RESPONSE, **BAD_JWT}
+)
+async def search_applications(
+    user_id: Annotated[uuid.UUID, Depends(verify_jwt)],
+    db: Annotated[AsyncSession, Depends(get_session)],
+    response: Response,
+    etag: Annotated[str | None, Depends(application_etag)],
+    q: Annotated[str, Query(min_length=1, max_length=200)],
+    limit: Annotated[int, Query(ge=1, le=MAX_SEARCH_SIZE)] = DEFAULT_SEARCH_SIZE,
+    offset: Annotated[int, Query(ge=0, le=MAX_SEARCH_OFFSET)] = 0
 ):
-    """Returns all users' applications given user's id (to create paginagtion)"""
+    """Searches users' company, role, location and notes, best matches first.
+    Supports web search syntax, e.g. "software engineer" -google"""
     try:
         user_application = UserApplications(db)
-        applications = await user_application.get_all_applications(user_id)
+        applications = await user_application.search_applications(user_id, q, limit, offset)
+        if etag is not None:
+            response.headers.update(cache_headers(etag))
         return applications
     except Exception as e:
         logger.error(e)
@@ -107,19 +229,97 @@ async def get_all_applications(
             detail=SOMETHING_WRONG
         ) from e
 
+@router.post("/applications/import",
+    tags=["application"],
+    response_model=ApplicationImportResult,
+    responses={**BAD_JWT, **INVALID_IMPORT_RESPONSE}
+)
+async def import_applications(
+    file: UploadFile,
+    user_id: Annotated[uuid.UUID, Depends(verify_jwt)],
+    db: Annotated[AsyncSession, Depends(get_session)],
+    redis: Annotated[Redis, Depends(get_redis)]
+):
+    """Imports applications from a CSV with a header row of application fields, e.g. a
+    spreadsheet export. Returns how many were imported and why each rejected row was rejected"""
+    # utf-8-sig drops the byte order mark spreadsheet apps put at the start
+    rows = io.TextIOWrapper(file.file, encoding="utf-8-sig", newline="")
+    try:
+        user_application = UserApplications(db, redis)
+        return await user_application.import_applications(rows, user_id)
+    except InvalidImport as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=INVALID_IMPORT
+        ) from e
+    except ImportTooLarge as e:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=IMPORT_TOO_LARGE
+        ) from e
+    except Exception as e:
+        logger.error(e)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=SOMETHING_WRONG
+        ) from e
+    finally:
+        # leave closing the spooled file to UploadFile
+        rows.detach()
+
+@router.get("/applications/export",
+    tags=["application"],
+    response_class=StreamingResponse,
+    responses={**EXPORT_RESPONSE, **BAD_JWT}
+)
+async def export_applications(
+    user_id: Annotated[uuid.UUID, Depends(verify_jwt)],
+    db: Annotated[AsyncSession, Depends(get_session)],
+    export_format: Annotated[ExportFormat, Query(alias="format")] = ExportFormat.NDJSON
+):
+    """Streams all of a user's applications as NDJSON or CSV, without holding them in memory"""
+    return StreamingResponse(
+        close_after(db, stream_applications(db, export_format, user_id)),
+        media_type=EXPORT_MEDIA_TYPES[export_format],
+        headers={"Content-Disposition": f'attachment; filename="applications.{export_format.value}"'}
+    )
+
+@router.get("/admin/applications/export",
+    tags=["admin"],
+    response_class=StreamingResponse,
+    dependencies=[Depends(verify_admin)],
+    responses={**EXPORT_RESPONSE, **INVALID_ADMIN_KEY_RESPONSE}
+)
+async def export_all_applications(
+    db: Annotated[AsyncSession, Depends(get_session)],
+    export_format: Annotated[ExportFormat, Query(alias="format")] = ExportFormat.NDJSON
+):
+    """Streams every user's applications as NDJSON or CSV, with user_id on every row"""
+    return StreamingResponse(
+        close_after(db, stream_applications(db, export_format)),
+        media_type=EXPORT_MEDIA_TYPES[export_format],
+        headers={"Content-Disposition": f'attachment; filename="all_applications.{export_format.value}"'}
+    )
+
 @router.get("/all_deadlines",
     response_model=list[GetUserApplication],
     tags=["application"],
-    responses=BAD_JWT
+    responses={**NOT_MODIFIED_RESPONSE, **BAD_JWT}
 )
 async def get_all_deadlines(
     user_id: Annotated[uuid.UUID, Depends(verify_jwt)],
-    db: Annotated[AsyncSession, Depends(get_session)]
+    db: Annotated[AsyncSession, Depends(get_session)],
+    redis: Annotated[Redis, Depends(get_redis)],
+    window: Annotated[DeadlineWindow, Query()],
+    response: Response,
+    etag: Annotated[str | None, Depends(application_etag)]
 ):
-    """Returns all users' applications with deadlines in ascending order"""
+    """Returns users' applications with deadlines from (inclusive) to (exclusive), in ascending order"""
     try:
-        user_application = UserApplications(db)
-        applications = await user_application.get_all_deadlines(user_id)
+        user_application = UserApplications(db, redis)
+        applications = await user_application.get_all_deadlines(user_id, window)
+        if etag is not None:
+            response.headers.update(cache_headers(etag))
         return applications
     except Exception as e:
         logger.error(e)
@@ -128,6 +328,46 @@ async def get_all_deadlines(
             detail=SOMETHING_WRONG
         ) from e
 
+@router.get("/calendar_feed",
+    response_model=CalendarFeed,
+    tags=["application"],
+    responses={**BAD_JWT}
+)
+async def get_calendar_feed(
+    request: Request,
+    user_id: Annotated[uuid.UUID, Depends(verify_jwt)]
+):
+    """Returns the url of the user's deadline calendar, to subscribe to from a calendar app.
+    Takes the same from, to and limit query parameters as /all_deadlines"""
+    token = CalendarToken().create_calendar_token(user_id)
+    return CalendarFeed(url=str(request.url_for("get_deadline_calendar", token=token)))
+
+@router.get("/calendar/{token}.ics",
+    tags=["application"],
+    response_class=Response,
+    responses={**CALENDAR_RESPONSE, **NOT_MODIFIED_RESPONSE, **INVALID_CALENDAR_TOKEN_RESPONSE}
+)
+async def get_deadline_calendar(
+    user_id: Annotated[uuid.UUID, Depends(verify_calendar_token)],
+    db: Annotated[AsyncSession, Depends(get_session)],
+    redis: Annotated[Redis, Depends(get_redis)],
+    window: Annotated[DeadlineWindow, Query()],
+    etag: Annotated[str | None, Depends(calendar_etag)]
+):
+    """Returns a user's deadlines as an iCalendar feed. Calendar apps poll it, so unchanged
+    feeds are answered with 304 from redis alone, and changed ones are rendered once per write"""
+    try:
+        user_application = UserApplications(db, redis)
+        calendar = await user_application.get_deadline_calendar(user_id, window)
+        headers = cache_headers(etag, settings.calendar_feed_max_age) if etag is not None else None
+        return Response(content=calendar, media_type="text/calendar", headers=headers)
+    except Exception as e:
+        logger.error(e)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=SOMETHING_WRONG
+        ) from e
+
 @router.put("/application",
     tags=["application"],
     response_model=GetUserApplication,
@@ -136,11 +376,12 @@ async def get_all_deadlines(
 async def modify_application(
     old_application: UserApplicationModify,
     user_id: Annotated[uuid.UUID, Depends(verify_jwt)],
-    db: Annotated[AsyncSession, Depends(get_session)]
+    db: Annotated[AsyncSession, Depends(get_session)],
+    redis: Annotated[Redis, Depends(get_redis)]
 ):
     """Modifies user application and returns updated version"""
     try:
-        user_application = UserApplications(db)
+        user_application = UserApplications(db, redis)
         new_application = await user_application.modify_application(old_application, user_id)
         return new_application
     except InvalidApplication as e:
@@ -167,11 +408,12 @@ async def modify_application(
 async def delete_application(
     application_id: int,
     user_id: Annotated[uuid.UUID, Depends(verify_jwt)],
-    db: Annotated[AsyncSession, Depends(get_session)]
+    db: Annotated[AsyncSession, Depends(get_session)],
+    redis: Annotated[Redis, Depends(get_redis)]
 ):
     """Deletes user application given post id"""
     try:
-        user_application = UserApplications(db)
+        user_application = UserApplications(db, redis)
         await user_application.delete_application(application_id, user_id)
         return Response(status_code=status.HTTP_202_ACCEPTED)
     except NoApplicationFound:
@@ -188,17 +430,22 @@ async def delete_application(
 
 @router.get("/application_stats",
     tags=["application"],
-    responses=BAD_JWT,
+    responses={**NOT_MODIFIED_RESPONSE, **BAD_JWT},
     response_model=ApplicationStatusCounts
 )
 async def get_application_stats(
     user_id: Annotated[uuid.UUID, Depends(verify_jwt)],
-    db: Annotated[AsyncSession, Depends(get_session)]
+    db: Annotated[AsyncSession, Depends(get_session)],
+    redis: Annotated[Redis, Depends(get_redis)],
+    response: Response,
+    etag: Annotated[str | None, Depends(application_etag)]
 ):
     """Returns counts of user application of each status and the total count"""
     try:
-        user_application = UserApplications(db)
+        user_application = UserApplications(db, redis)
         result = await user_application.get_statistics(user_id)
+        if etag is not None:
+            response.headers.update(cache_headers(etag))
         return result
     except Exception as e:
         logger.error(e)
@@ -206,3 +453,26 @@ async def get_application_stats(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=SOMETHING_WRONG
         ) from e
+
+@router.get("/application_analytics",
+    tags=["application"],
+    responses={**BAD_JWT},
+    response_model=ApplicationAnalytics
+)
+async def get_application_analytics(
+    user_id: Annotated[uuid.UUID, Depends(verify_jwt)],
+    db: Annotated[AsyncSession, Depends(get_session)],
+    redis: Annotated[Redis, Depends(get_redis)],
+    weeks: Annotated[int, Query(ge=1, le=MAX_ANALYTICS_WEEKS)] = DEFAULT_ANALYTICS_WEEKS
+):
+    """Returns how far user's applications got through each status and how long they stayed,
+    and weekly counts of applications created and status changes for the last weeks weeks"""
+    try:
+        user_application = UserApplications(db, redis)
+        return await user_application.get_analytics(user_id, weeks)
+    except Exception as e:
+        logger.error(e)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=SOMETHING_WRONG
+        ) from e
@@ -2,28 +2,47 @@
 from typing import Annotated
 import uuid
 
-from fastapi import APIRouter, Depends, HTTPException, status, Response, Cookie
+from fastapi import APIRouter, Depends, HTTPException, status, Request, Response, Cookie
+from fastapi.security import HTTPAuthorizationCredentials
 from sqlalchemy.ext.asyncio import AsyncSession
+from redis.asyncio import Redis
 
 from app.services.auth_service import UserAuth
+from app.dependencies.redis_client import get_redis
+from app.dependencies.rate_limiter import enforce_rate_limit
 from app.dependencies.security import (
+    security,
     verify_jwt,
     verify_expired_jwt,
     create_session_id,
     use_session_token,
-    test_session_token
+    test_session_token,
+    decode_session_token,
+    verify_admin
 )
 from app.core.jwt import UserJWT
 from app.core.refresh_token import UserRefreshToken
-from app.schemas.user import UserCreate, UserLogin, UserToken, UserLoginReturns
+from app.core.revocation import revocation_list
+from app.core.process_pool import hashing_pool
+from app.core.principal_cache import principal_cache
+from app.schemas.user import UserCreate, UserLogin, UserToken, UserLoginReturns, HashingPoolStats, PrincipalCacheStats
 from app.db.database import get_session
-from app.exceptions.auth_exceptions import DuplicateEmailError, NoAccountError, WrongPasswordError
+from app.exceptions.auth_exceptions import (
+    DuplicateEmailError,
+    NoAccountError,
+    WrongPasswordError,
+    HasherBusy,
+    RateLimited
+)
 from app.openapi import (
     NO_ACCOUNT_RESPONSE,
     INVALID_SESSION_TOKEN_RESPONSE,
     EMAIL_ALREADY_EXISTS_RESPONSE,
     PASSWORD_INCORRECT_RESPONSE,
     BAD_REFRESH_TOKEN_RESPONSE,
+    AUTH_BUSY_RESPONSE,
+    TOO_MANY_ATTEMPTS_RESPONSE,
+    INVALID_ADMIN_KEY_RESPONSE,
     BAD_JWT
 )
 from app.core.logger import setup_custom_logger
@@ -38,22 +57,27 @@ SOMETHING_WRONG = "Something wrong"
 ACCOUNT_NOT_CREATED = "Account not created"
 PASSWORD_INCORRECT = "Password incorrect"
 BAD_REFRESH_TOKEN = "Bad refresh token"
+AUTH_BUSY = "Authentication busy"
+TOO_MANY_ATTEMPTS = "Too many attempts"
 
 @router.post("/register",
     tags=["register_user"],
     response_model=UserToken,
-    responses={**EMAIL_ALREADY_EXISTS_RESPONSE}
+    responses={**EMAIL_ALREADY_EXISTS_RESPONSE, **AUTH_BUSY_RESPONSE, **TOO_MANY_ATTEMPTS_RESPONSE}
 )
 async def register_user(
     user_in: UserCreate,
     db: Annotated[AsyncSession, Depends(get_session)],
     user_jwt: Annotated[UserJWT, Depends(UserJWT)],
     refresh_token: Annotated[UserRefreshToken, Depends(UserRefreshToken)],
+    redis: Annotated[Redis, Depends(get_redis)],
+    request: Request,
     response: Response
 ):
     """Registers user, if successful logs user in, returning userJWT
     (and in the future session token)"""
     try:
+        await enforce_rate_limit(redis, "register", request.client and request.client.host, user_in.email)
         auth = UserAuth(db)
         user_id = await auth.register(user_in)
         user_token = user_jwt.create_jwt(user_id)
@@ -71,6 +95,18 @@ async def register_user(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail=EMAIL_ALREADY_EXISTS
         ) from DuplicateEmailError
+    except RateLimited as e:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail=TOO_MANY_ATTEMPTS,
+            headers={"Retry-After": str(e.retry_after)}
+        ) from e
+    except HasherBusy as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=AUTH_BUSY,
+            headers={"Retry-After": "1"}
+        ) from e
     except Exception as e:
         logger.error(e)
         raise HTTPException(
@@ -80,18 +116,26 @@ async def register_user(
 @router.post("/login",
     tags=["login_user"],
     response_model=UserLoginReturns,
-    responses={**NO_ACCOUNT_RESPONSE, **PASSWORD_INCORRECT_RESPONSE}
+    responses={
+        **NO_ACCOUNT_RESPONSE,
+        **PASSWORD_INCORRECT_RESPONSE,
+        **AUTH_BUSY_RESPONSE,
+        **TOO_MANY_ATTEMPTS_RESPONSE
+    }
 )
 async def login_user(
     user_in: UserLogin,
     db: Annotated[AsyncSession, Depends(get_session)],
     user_jwt: Annotated[UserJWT, Depends(UserJWT)],
     refresh_token: Annotated[UserRefreshToken, Depends(UserRefreshToken)],
+    redis: Annotated[Redis, Depends(get_redis)],
+    request: Request,
     response: Response
 ):
     """Attempts to log user in, and if successful returns the user JWT 
     (and in the future session token)"""
     try:
+        await enforce_rate_limit(redis, "login", request.client and request.client.host, user_in.email)
         auth = UserAuth(db)
         user_creds = await auth.login(user_in)
         user_token = user_jwt.create_jwt(user_creds.id)
@@ -114,6 +158,18 @@ async def login_user(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail=PASSWORD_INCORRECT
         ) from WrongPasswordError
+    except RateLimited as e:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail=TOO_MANY_ATTEMPTS,
+            headers={"Retry-After": str(e.retry_after)}
+        ) from e
+    except HasherBusy as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=AUTH_BUSY,
+            headers={"Retry-After": "1"}
+        ) from e
     except Exception as e:
         logger.error(e)
         raise HTTPException(
@@ -136,10 +192,11 @@ async def refresh_user_token(
     user_jwt: Annotated[UserJWT, Depends(UserJWT)],
     response: Response,
     db: Annotated[AsyncSession, Depends(get_session)],
+    redis: Annotated[Redis, Depends(get_redis)],
     refresh_token: str = Cookie(description="Refresh Token"),
 ):
     """Refreshes user jwt and refresh token, given refresh token"""
-    session_id = await use_session_token(user_id, refresh_token, db)
+    session_id = await use_session_token(user_id, refresh_token, db, redis)
     user_token = user_jwt.create_jwt(user_id)
     response.set_cookie(
         key="refresh_token",
@@ -152,17 +209,39 @@ async def refresh_user_token(
 
 @router.post("/logout",
     tags=["logout_user"],
-    responses={**NO_ACCOUNT_RESPONSE, **BAD_JWT}
+    responses={
+        **NO_ACCOUNT_RESPONSE,
+        **BAD_JWT,
+        **INVALID_SESSION_TOKEN_RESPONSE,
+        **BAD_REFRESH_TOKEN_RESPONSE
+    }
 )
 async def logout(
     user_id: Annotated[uuid.UUID, Depends(verify_jwt)],
+    authorization: Annotated[HTTPAuthorizationCredentials, Depends(security)],
+    user_jwt: Annotated[UserJWT, Depends(UserJWT)],
     db: Annotated[AsyncSession, Depends(get_session)],
+    redis: Annotated[Redis, Depends(get_redis)],
+    refresh_token: str | None = Cookie(default=None, description="Refresh Token")
     ):
-    """Logs user out"""
+    """Logs user out of this device if its refresh token is sent, otherwise out of every device.
+    The access token used is revoked as well, for when stateless auth is on. A refresh token
+    that does not decode only gets the access token revoked, so a stale cookie on one device
+    can't log the user out everywhere"""
     try:
-        user_auth = UserAuth(db)
-        await user_auth.log_out(user_id)
+        await revocation_list.revoke(user_jwt.decode_claims(authorization.credentials), redis)
+        session_id = None
+        if refresh_token:
+            try:
+                session_id = decode_session_token(refresh_token)
+            except HTTPException as e:
+                logger.warning(f"{user_id} logged out with a bad refresh token, only revoked its access token.")
+                raise e
+        user_auth = UserAuth(db, redis)
+        await user_auth.log_out(user_id, session_id)
         return Response(status_code=status.HTTP_200_OK)
+    except HTTPException as e:
+        raise e
     except NoAccountError:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -175,6 +254,26 @@ async def logout(
             detail=SOMETHING_WRONG
         ) from e
 
+@router.get("/admin/hashing_pool",
+    response_model=HashingPoolStats,
+    tags=["admin"],
+    dependencies=[Depends(verify_admin)],
+    responses={**INVALID_ADMIN_KEY_RESPONSE}
+)
+async def get_hashing_pool_stats():
+    """Returns queue depth, rejections and latency of this worker's hashing pool"""
+    return hashing_pool.stats()
+
+@router.get("/admin/principal_cache",
+    response_model=PrincipalCacheStats,
+    tags=["admin"],
+    dependencies=[Depends(verify_admin)],
+    responses={**INVALID_ADMIN_KEY_RESPONSE}
+)
+async def get_principal_cache_stats():
+    """Returns hits, misses and size of this worker's principal cache"""
+    return principal_cache.stats()
+
 @router.post("/test_login")
 async def verify_token(user_id: Annotated[uuid.UUID, Depends(verify_jwt)]):
     """Test function to check JWTs generated are valid"""
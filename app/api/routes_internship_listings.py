@@ -9,7 +9,7 @@ import filetype
 from redis.asyncio import Redis
 
 from app.dependencies.redis_client import get_redis
-from app.schemas.internship_listings import InternshipListing
+from app.schemas.internship_listings import InternshipListing, PAGE_LENGTH, DASHBOARD_LENGTH, ACTIVE_PORTALS
 from app.services.internship_listings_service import upload_resume, get_listings
 from app.dependencies.security import verify_jwt
 from app.db.database import get_session
@@ -35,10 +35,6 @@ R2_DOWN = "R2 down"
 SCRAPER_DEAD = "Internship scraper down"
 NEVER_UPLOADED_DETAILS = "User has not uploaded details"
 
-PAGE_LENGTH = 10
-DASHBOARD_LENGTH = 4 # the number of listings to show on dashboard
-ACTIVE_PORTALS = 2 # the number of working job portals
-
 router = APIRouter(prefix="/api")
 
 @router.post("/upload_resume",
@@ -0,0 +1,87 @@
+"""Modules for caching a user's application reads in redis, versioned by a per user generation"""
+import time
+import uuid
+
+import orjson
+from redis.asyncio import Redis
+
+from .config import get_settings
+from .logger import setup_custom_logger
+
+logger = setup_custom_logger(__name__)
+
+settings = get_settings()
+
+GENERATION_TTL = 7 * 24 * 3600 # seconds, a lost generation restarts from the clock anyway
+
+class ApplicationCache:
+    """Cache of read results (stats, deadlines) keyed by user and generation. Every write bumps
+    the user's generation, which makes all their older entries unreachable without deleting them,
+    and those then expire by TTL. Every operation fails open, a redis outage only costs db reads"""
+    def __init__(self, ttl: int):
+        self.__ttl = ttl
+
+    @staticmethod
+    def __generation_key(user_id: uuid.UUID):
+        return f"applications:generation:{user_id}"
+
+    @staticmethod
+    def __key(user_id: uuid.UUID, name: str, generation: int):
+        return f"applications:{name}:{user_id}:{generation}"
+
+    async def __generation(self, redis: Redis, user_id: uuid.UUID):
+        """Returns the user's current generation, starting one if there is none"""
+        key = self.__generation_key(user_id)
+        generation = await redis.get(key)
+        if generation is None:
+            # start from the clock instead of 0, so an evicted counter never revisits
+            # a generation that still has entries cached
+            await redis.set(key, time.time_ns(), ex=GENERATION_TTL, nx=True)
+            generation = await redis.get(key)
+        return int(generation)
+
+    async def generation(self, redis: Redis | None, user_id: uuid.UUID):
+        """Returns the user's current generation, None if redis is unavailable"""
+        if redis is None:
+            return None
+        try:
+            return await self.__generation(redis, user_id)
+        except Exception as e:
+            logger.warning(f"Application cache generation lookup for {user_id} failed. Cause: {e}")
+            return None
+
+    async def get(self, redis: Redis | None, user_id: uuid.UUID, name: str):
+        """Returns (generation, cached value). The value is None on a miss, and the generation
+        is what a freshly computed value must be stored under, None if redis is unavailable"""
+        if redis is None:
+            return None, None
+        try:
+            generation = await self.__generation(redis, user_id)
+            cached = await redis.get(self.__key(user_id, name, generation))
+            return generation, orjson.loads(cached) if cached is not None else None
+        except Exception as e:
+            logger.warning(f"Application cache lookup of {name} for {user_id} failed. Cause: {e}")
+            return None, None
+
+    async def put(self, redis: Redis | None, user_id: uuid.UUID, name: str, generation: int | None, value):
+        """Stores value under the generation it was read at. If a write bumped the generation
+        in the meantime the value is already unreachable, so a stale read is never served"""
+        if redis is None or generation is None:
+            return
+        try:
+            await redis.set(self.__key(user_id, name, generation), orjson.dumps(value), ex=self.__ttl)
+        except Exception as e:
+            logger.warning(f"Failed to cache {name} for {user_id}. Cause: {e}")
+
+    async def bump(self, redis: Redis | None, user_id: uuid.UUID):
+        """Moves the user to a new generation, call after the write has committed"""
+        if redis is None:
+            return
+        key = self.__generation_key(user_id)
+        try:
+            await redis.set(key, time.time_ns(), ex=GENERATION_TTL, nx=True)
+            await redis.incr(key)
+        except Exception as e:
+            logger.error(f"Failed to bump application cache generation for {user_id}. Cause: {e}")
+
+application_cache = ApplicationCache(settings.application_cache_ttl)
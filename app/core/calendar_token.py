@@ -0,0 +1,41 @@
+"""Modules for the signed tokens that authenticate calendar feed urls"""
+import base64
+import binascii
+import hashlib
+import hmac
+import uuid
+
+from app.exceptions.auth_exceptions import InvalidCalendarToken
+from .config import get_settings
+
+settings = get_settings()
+
+SIGNATURE_BYTES = 16
+
+class CalendarToken:
+    """Handles creation and decoding of calendar feed tokens. Calendar apps can't send an
+    Authorization header, so the feed url carries the user id signed with the JWT secret.
+    Tokens don't expire, rotating the JWT secret revokes every feed url"""
+    def __init__(self):
+        self.__secret_key = settings.jwt_secret_key.encode()
+
+    def __sign(self, user_id: uuid.UUID):
+        return hmac.new(self.__secret_key, b"calendar:" + user_id.bytes, hashlib.sha256).digest()[:SIGNATURE_BYTES]
+
+    def create_calendar_token(self, user_id: uuid.UUID):
+        """Creates a url safe calendar token for the user"""
+        raw = user_id.bytes + self.__sign(user_id)
+        return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+    def decode_calendar_token(self, token: str):
+        """Decodes calendar token to get user id, raises InvalidCalendarToken if it wasn't signed here"""
+        try:
+            raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        except (binascii.Error, ValueError) as e:
+            raise InvalidCalendarToken from e
+        if len(raw) != 16 + SIGNATURE_BYTES:
+            raise InvalidCalendarToken
+        user_id = uuid.UUID(bytes=raw[:16])
+        if not hmac.compare_digest(raw[16:], self.__sign(user_id)):
+            raise InvalidCalendarToken
+        return user_id
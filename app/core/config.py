@@ -22,6 +22,34 @@ class Settings(BaseSettings):
     local_cache_dir: Optional[str] = "."
     redis_host: str
     redis_port: str
+    principal_cache_size: int = 10000
+    principal_cache_ttl: int = 300 # seconds a verified user id is trusted without a db lookup
+    hasher_workers: int = 2
+    hasher_max_queue: int = 16 # argon2 jobs allowed in flight before auth returns 503
+    argon2_hash_budget_ms: int = 150 # target latency of one hash when calibrating at startup
+    argon2_memory_cost: int = 65536 # KiB, upper bound when calibrating
+    argon2_parallelism: int = 4
+    argon2_time_cost: Optional[int] = None # pins the cost and skips calibration if set
+    argon2_calibration_file: str = "/tmp/argon2_calibration.json" # shared by the workers on a machine, calibrated once
+    login_rate_limit: int = 10 # attempts per minute, per client ip and per email
+    register_rate_limit: int = 5 # attempts per minute, per client ip and per email
+    stateless_auth: bool = False # trust signed access tokens without a db lookup
+    revocation_refresh_interval: int = 5 # seconds between pulls of revoked tokens from redis
+    application_cache_ttl: int = 3600 # seconds cached application stats and deadlines live
+    calendar_feed_max_age: int = 300 # seconds calendar apps may reuse a feed before revalidating
+    reminder_scheduler: bool = False # also run the deadline reminder scheduler inside every API task
+    reminder_horizon_hours: int = 24 # deadlines this close get a reminder
+    reminder_interval: int = 300 # seconds between reminder scans
+    reminder_batch_size: int = 500
+    reminder_sink: str = "redis" # "redis" publishes to the application_reminders stream, "log" only logs
+    reminder_lease_ttl: int = 60 # seconds a crashed scheduler keeps others from scanning
+    listings_warmer: bool = False # also run the listings cache warmer inside every API task
+    listings_warm_interval: int = 900 # seconds between warming runs
+    listings_warm_pages: int = 3 # pages of each listings key kept cached
+    listings_warm_max_scrapes: int = 20 # scrapes per run, so warming can't hammer the job portals
+    listings_warm_industries: int = 5 # most requested industries warmed for every role
+    listings_demand_window_hours: int = 24 # how far back request frequency counts
+    admin_api_key: Optional[str] = None # X-Admin-Key for admin routes, which are off if unset
 
 @lru_cache
 def get_settings():
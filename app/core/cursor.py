@@ -0,0 +1,22 @@
+"""Modules for opaque keyset pagination cursors"""
+import base64
+import binascii
+import json
+
+from app.exceptions.application_exceptions import InvalidCursor
+
+def encode_cursor(position: dict):
+    """Encodes the sort key of the last row on a page into an opaque url safe cursor"""
+    raw = json.dumps(position, separators=(",", ":"), default=str).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor: str):
+    """Decodes a cursor back into the sort key it was made from, raises InvalidCursor if tampered"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        position = json.loads(raw)
+    except (binascii.Error, ValueError) as e:
+        raise InvalidCursor from e
+    if not isinstance(position, dict):
+        raise InvalidCursor
+    return position
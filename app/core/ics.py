@@ -0,0 +1,67 @@
+"""Modules for rendering application deadlines as an iCalendar (RFC 5545) feed"""
+from datetime import datetime, timezone
+from typing import Iterable
+
+from app.schemas.application_status import GetUserApplication
+
+PRODUCT_ID = "-//Intern Hunters//Application deadlines//EN"
+CALENDAR_NAME = "Internship deadlines"
+MAX_LINE_OCTETS = 75
+
+def escape_text(value: str):
+    """Escapes a TEXT property value"""
+    return (
+        value.replace("\\", "\\\\")
+        .replace(";", "\\;")
+        .replace(",", "\\,")
+        .replace("\r\n", "\\n")
+        .replace("\n", "\\n")
+    )
+
+def format_utc(value: datetime):
+    """Formats a datetime as UTC, naive datetimes are already UTC like in the db"""
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc)
+    return value.strftime("%Y%m%dT%H%M%SZ")
+
+def fold(line: str):
+    """Folds a content line into 75 octet lines, without splitting a UTF-8 character"""
+    encoded = line.encode()
+    parts = []
+    limit = MAX_LINE_OCTETS
+    while len(encoded) > limit:
+        cut = limit
+        while encoded[cut] & 0xC0 == 0x80:
+            cut -= 1
+        parts.append(encoded[:cut].decode())
+        encoded = encoded[cut:]
+        # continuation lines start with a space, which counts towards the limit
+        limit = MAX_LINE_OCTETS - 1
+    parts.append(encoded.decode())
+    return "\r\n ".join(parts)
+
+def render_calendar(applications: Iterable[GetUserApplication], stamp: datetime):
+    """Renders applications with deadlines as a calendar, one event at each deadline"""
+    lines = [
+        "BEGIN:VCALENDAR",
+        "VERSION:2.0",
+        f"PRODID:{PRODUCT_ID}",
+        "CALSCALE:GREGORIAN",
+        "METHOD:PUBLISH",
+        f"X-WR-CALNAME:{CALENDAR_NAME}"
+    ]
+    for application in applications:
+        lines += [
+            "BEGIN:VEVENT",
+            f"UID:application-{application.id}@intern-hunters",
+            f"DTSTAMP:{format_utc(stamp)}",
+            # no DTEND, so the event is the instant of the deadline
+            f"DTSTART:{format_utc(application.action_deadline)}",
+            f"SUMMARY:{escape_text(f'{application.role_name} at {application.company_name} ({application.status.value})')}",
+            f"LOCATION:{escape_text(application.location)}"
+        ]
+        if application.notes:
+            lines.append(f"DESCRIPTION:{escape_text(application.notes)}")
+        lines.append("END:VEVENT")
+    lines.append("END:VCALENDAR")
+    return "".join(fold(line) + "\r\n" for line in lines)
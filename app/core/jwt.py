@@ -9,33 +9,39 @@ from .config import get_settings
 
 settings = get_settings()
 
+ACCESS_TOKEN_EXPIRE_MINUTES = 15
+
 class JWTPayload(BaseModel):
     """JWT representation"""
     sub: uuid.UUID
     exp: int
     iat: int
+    jti: str | None = None
 
 class UserJWT:
     """Handles creation and decoding of JWT"""
     def __init__(self):
         self.__secret_key = settings.jwt_secret_key
         self.__algorithm = "HS256"
-        self.__access_token_expire_minutes = 15
+        self.__access_token_expire_minutes = ACCESS_TOKEN_EXPIRE_MINUTES
 
     def create_jwt(self, data: uuid.UUID):
         """Creates JWT from given user id"""
-        to_encode = {"sub": str(data)}
+        to_encode = {"sub": str(data), "jti": uuid.uuid4().hex}
         to_encode.update({"iat": datetime.now(timezone.utc)})
         expire = datetime.now(timezone.utc) + timedelta(minutes=self.__access_token_expire_minutes)
         to_encode.update({"exp": expire})
         encoded_jwt = jwt.encode(to_encode, self.__secret_key, algorithm=self.__algorithm)
         return encoded_jwt
 
+    def decode_claims(self, incoming_jwt: str):
+        """Decodes JWT and returns all its claims"""
+        payload = jwt.decode(incoming_jwt, self.__secret_key, algorithms=self.__algorithm)
+        return JWTPayload(**payload)
+
     def decode_jwt(self, incoming_jwt: str):
         """Decodes JWT and returns unverified user id"""
-        payload = jwt.decode(incoming_jwt, self.__secret_key, algorithms=self.__algorithm)
-        user_details = JWTPayload(**payload)
-        return user_details.sub
+        return self.decode_claims(incoming_jwt).sub
 
     def decode_expired_jwt(self, incoming_jwt: str):
         """Decodes expired JWT and returns unverified user id"""
@@ -0,0 +1,67 @@
+"""Modules for redis leases, so only one of many ECS tasks does a job at a time"""
+import asyncio
+import uuid
+
+from redis.asyncio import Redis
+
+from .logger import setup_custom_logger
+
+logger = setup_custom_logger(__name__)
+
+# only the holder may extend or give back a lease, so check and act in one step
+RENEW_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('PEXPIRE', KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+RELEASE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+class LeaseLock:
+    """Lock that lapses after ttl_ms unless renewed, so a crashed holder only blocks the job
+    for one ttl. Every instance has its own token, so a holder whose lease lapsed can't renew
+    or release the next holder's"""
+    def __init__(self, redis: Redis, name: str, ttl_ms: int):
+        self.__redis = redis
+        self.__key = f"lease:{name}"
+        self.__ttl_ms = ttl_ms
+        self.__token = uuid.uuid4().hex
+        self.__renew = redis.register_script(RENEW_SCRIPT)
+        self.__release = redis.register_script(RELEASE_SCRIPT)
+        self.held = False
+
+    async def acquire(self):
+        """Takes the lease if nobody holds it, returns if it is now held"""
+        self.held = bool(await self.__redis.set(self.__key, self.__token, px=self.__ttl_ms, nx=True))
+        return self.held
+
+    async def renew(self):
+        """Extends the lease by another ttl, returns False if it had lapsed to someone else"""
+        self.held = bool(int(await self.__renew(keys=[self.__key], args=[self.__token, self.__ttl_ms])))
+        return self.held
+
+    async def release(self):
+        """Gives the lease back early if still held"""
+        if not self.held:
+            return
+        self.held = False
+        await self.__release(keys=[self.__key], args=[self.__token])
+
+    async def keep_alive(self):
+        """Renews the lease every third of its ttl while held, run it as a task alongside
+        work done under a short lease and cancel it when done. Stops and marks the lease
+        as not held if renewing fails, so the holder can tell it may have lapsed"""
+        while self.held:
+            await asyncio.sleep(self.__ttl_ms / 3000)
+            try:
+                await self.renew()
+            except Exception as e:
+                self.held = False
+                logger.warning(f"Failed to renew lease {self.__key}, treating it as lost. Cause: {e}")
+                return
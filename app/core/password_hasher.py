@@ -0,0 +1,98 @@
+"""Modules for argon2 and tuning its cost to the machine it runs on"""
+from functools import lru_cache
+import fcntl
+import json
+import time
+
+from argon2 import PasswordHasher, extract_parameters
+
+from .config import get_settings
+from .logger import setup_custom_logger
+
+logger = setup_custom_logger(__name__)
+
+settings = get_settings()
+
+MIN_MEMORY_COST = 19456 # KiB, OWASP's floor for argon2id
+MAX_TIME_COST = 10
+
+# configured once per process (and once per hashing pool worker by its initializer)
+hasher: PasswordHasher | None = None
+
+def measure(time_cost: int, memory_cost: int, parallelism: int):
+    """Returns the best of two hash timings in ms for the given costs"""
+    candidate = PasswordHasher(time_cost=time_cost, memory_cost=memory_cost, parallelism=parallelism)
+    timings = []
+    for _ in range(2):
+        start = time.perf_counter()
+        candidate.hash("calibration")
+        timings.append((time.perf_counter() - start) * 1000)
+    return min(timings)
+
+def calibrate(budget: int, memory_cost: int, parallelism: int):
+    """Halves memory until one pass fits the latency budget, then adds passes while they still fit"""
+    while memory_cost // 2 >= MIN_MEMORY_COST and measure(1, memory_cost, parallelism) > budget:
+        memory_cost //= 2
+    time_cost = 1
+    while time_cost < MAX_TIME_COST and measure(time_cost + 1, memory_cost, parallelism) <= budget:
+        time_cost += 1
+    logger.info(
+        f"Calibrated argon2 to time_cost={time_cost}, memory_cost={memory_cost} "
+        f"for a {budget}ms budget"
+    )
+    return {"time_cost": time_cost, "memory_cost": memory_cost, "parallelism": parallelism}
+
+@lru_cache
+def get_parameters():
+    """Returns argon2 costs for this machine. Pinned costs in settings win, otherwise they are
+    calibrated once per machine. Every gunicorn worker starts at once, and workers timing hashes
+    side by side would each measure a slower machine and pick weaker costs, so the first one
+    calibrates under a file lock and the rest wait and reuse its result"""
+    parallelism = settings.argon2_parallelism
+    memory_cost = settings.argon2_memory_cost
+    if settings.argon2_time_cost is not None:
+        return {"time_cost": settings.argon2_time_cost, "memory_cost": memory_cost, "parallelism": parallelism}
+    budget = settings.argon2_hash_budget_ms
+    calibrated_for = {"budget": budget, "memory_cost": memory_cost, "parallelism": parallelism}
+    with open(settings.argon2_calibration_file, "a+", encoding="utf-8") as file:
+        fcntl.flock(file, fcntl.LOCK_EX)
+        file.seek(0)
+        try:
+            cached = json.loads(file.read())
+        except ValueError:
+            cached = None
+        if isinstance(cached, dict) and cached.get("calibrated_for") == calibrated_for:
+            logger.info(f"Using argon2 costs calibrated by another worker: {cached['parameters']}")
+            return cached["parameters"]
+        parameters = calibrate(budget, memory_cost, parallelism)
+        file.seek(0)
+        file.truncate()
+        file.write(json.dumps({"calibrated_for": calibrated_for, "parameters": parameters}))
+    return parameters
+
+def configure_hasher(parameters: dict):
+    """Builds the process wide hasher, used as the hashing pool's initializer"""
+    global hasher
+    hasher = PasswordHasher(**parameters)
+
+def get_hasher():
+    """Returns the process wide hasher, configuring it on first use"""
+    if hasher is None:
+        configure_hasher(get_parameters())
+    return hasher
+
+def hash_password(password: str):
+    """Hashes password, runs inside a pool worker"""
+    return get_hasher().hash(password)
+
+def verify_password(hashed_password: str, password: str):
+    """Verifies password against hash, runs inside a pool worker.
+    Raises argon2's VerificationError on mismatch, otherwise returns True if the hash
+    is weaker than the current parameters and should be upgraded"""
+    current = get_hasher()
+    current.verify(hashed_password, password)
+    if not current.check_needs_rehash(hashed_password):
+        return False
+    # only upgrade, so tasks that calibrated slightly differently don't keep rehashing each other
+    stored = extract_parameters(hashed_password)
+    return stored.time_cost * stored.memory_cost < current.time_cost * current.memory_cost
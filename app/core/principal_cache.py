@@ -0,0 +1,72 @@
+"""Modules for caching verified JWT subjects in process and in redis"""
+import uuid
+
+from cachetools import TTLCache
+from redis.asyncio import Redis
+
+from .config import get_settings
+from .logger import setup_custom_logger
+
+logger = setup_custom_logger(__name__)
+
+settings = get_settings()
+
+class PrincipalCache:
+    """Bounded, TTL limited cache of user ids that have already been verified against the db.
+    The in process LRU is checked first, then the shared redis tier (if given), so the common
+    request path does not need a db round trip to authenticate"""
+    def __init__(self, maxsize: int, ttl: int):
+        self.__local = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.__ttl = ttl
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def __key(user_id: uuid.UUID):
+        return f"principal:{user_id}"
+
+    async def contains(self, user_id: uuid.UUID, redis: Redis | None = None):
+        """Returns True if user id has been verified recently"""
+        if user_id in self.__local:
+            self.hits += 1
+            return True
+        if redis is not None:
+            try:
+                if await redis.exists(self.__key(user_id)):
+                    self.__local[user_id] = True
+                    self.hits += 1
+                    return True
+            except Exception as e:
+                logger.warning(f"Principal cache lookup for {user_id} on redis failed. Cause: {e}")
+        self.misses += 1
+        return False
+
+    async def add(self, user_id: uuid.UUID, redis: Redis | None = None):
+        """Marks user id as verified in both tiers"""
+        self.__local[user_id] = True
+        if redis is not None:
+            try:
+                await redis.set(self.__key(user_id), 1, ex=self.__ttl)
+            except Exception as e:
+                logger.warning(f"Failed to cache principal {user_id} on redis. Cause: {e}")
+
+    async def invalidate(self, user_id: uuid.UUID, redis: Redis | None = None):
+        """Removes user id from both tiers, so the next request is verified against the db"""
+        self.__local.pop(user_id, None)
+        if redis is not None:
+            try:
+                await redis.delete(self.__key(user_id))
+            except Exception as e:
+                logger.warning(f"Failed to invalidate principal {user_id} on redis. Cause: {e}")
+
+    def stats(self):
+        """Returns hit/miss counters of the cache"""
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / total if total else 0.0,
+            "size": len(self.__local)
+        }
+
+principal_cache = PrincipalCache(settings.principal_cache_size, settings.principal_cache_ttl)
@@ -1,13 +1,79 @@
-# """Stores sub processes for CPU heavy tasks like spaCy"""
-# from concurrent.futures import ProcessPoolExecutor
+"""Stores sub processes for CPU heavy tasks like argon2 hashing"""
+import asyncio
+import time
+from concurrent.futures import ProcessPoolExecutor
 
-# from app.workers.resume_parser import load_model
+from app.exceptions.auth_exceptions import HasherBusy
+from .config import get_settings
+from .logger import setup_custom_logger
 
-# executor = None
+logger = setup_custom_logger(__name__)
 
-# def create_process_pool():
-#     try:
-#         global executor
-#         executor = ProcessPoolExecutor(max_workers=2, initializer=load_model)
-#     except Exception as e:
-#         raise e
+settings = get_settings()
+
+class HashingPool:
+    """Bounded process pool for argon2 so hashing never stalls the event loop.
+    Admission control rejects work once max_queue jobs are in flight,
+    so a login storm only degrades auth and not every other route"""
+    def __init__(self, workers: int, max_queue: int):
+        self.executor = None
+        self.__workers = workers
+        self.__max_queue = max_queue
+        self.__in_flight = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.total_latency = 0.0
+        self.max_latency = 0.0
+
+    def start(self, initializer=None, initargs: tuple = ()):
+        """Creates process pool, initializer runs once in every worker"""
+        self.executor = ProcessPoolExecutor(
+            max_workers=self.__workers,
+            initializer=initializer,
+            initargs=initargs
+        )
+        logger.info(f"Hashing pool started with {self.__workers} workers.")
+
+    def shutdown(self):
+        """Shuts process pool down"""
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
+
+    async def run(self, func, *args):
+        """Runs func on the pool (or the default thread pool if not started),
+        raises HasherBusy if the queue is full"""
+        if self.__in_flight >= self.__max_queue:
+            self.rejected += 1
+            logger.warning(f"Hashing pool saturated with {self.__in_flight} jobs, rejecting.")
+            raise HasherBusy
+        self.__in_flight += 1
+        start = time.perf_counter()
+        try:
+            loop = asyncio.get_running_loop()
+            result = await loop.run_in_executor(self.executor, func, *args)
+        except Exception:
+            self.failed += 1
+            raise
+        finally:
+            self.__in_flight -= 1
+        latency = time.perf_counter() - start
+        self.completed += 1
+        self.total_latency += latency
+        self.max_latency = max(self.max_latency, latency)
+        logger.debug(f"{func.__name__} took {latency:.4f}s with {self.__in_flight} jobs in flight")
+        return result
+
+    def stats(self):
+        """Returns queue depth and latency metrics of the pool, latency is of completed jobs only"""
+        return {
+            "in_flight": self.__in_flight,
+            "completed": self.completed,
+            "failed": self.failed,
+            "rejected": self.rejected,
+            "mean_latency": self.total_latency / self.completed if self.completed else 0.0,
+            "max_latency": self.max_latency
+        }
+
+hashing_pool = HashingPool(settings.hasher_workers, settings.hasher_max_queue)
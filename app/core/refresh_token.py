@@ -9,6 +9,8 @@ from .config import get_settings
 
 settings = get_settings()
 
+SESSION_EXPIRE_DAYS = 7
+
 class RefreshTokenPayload(BaseModel):
     """Refresh Token representation"""
     sub: uuid.UUID
@@ -20,7 +22,7 @@ class UserRefreshToken:
     def __init__(self):
         self.__secret_key = settings.refresh_token_secret_key
         self.__algorithm = "HS256"
-        self.__access_token_expire_days = 7
+        self.__access_token_expire_days = SESSION_EXPIRE_DAYS
 
     def create_session_token(self, session_id: uuid.UUID):
         """Creates session token using session id"""
@@ -0,0 +1,94 @@
+"""Modules for revoking access tokens when stateless auth is on"""
+import time
+import uuid
+
+from redis.asyncio import Redis
+
+from .jwt import JWTPayload, ACCESS_TOKEN_EXPIRE_MINUTES
+from .config import get_settings
+from .logger import setup_custom_logger
+
+logger = setup_custom_logger(__name__)
+
+settings = get_settings()
+
+REVOKED_KEY = "revoked_access_tokens"
+REVOKED_BEFORE = "before" # prefix of members revoking every token of a user issued before a time
+
+class RevocationList:
+    """Set of revoked token ids, and of per user times every token issued before is revoked.
+    The source of truth is a redis zset scored by when the revocation stops mattering,
+    so entries drop out as soon as the token would be rejected anyway and the set
+    stays small. It is mirrored in process and refreshed every refresh_interval seconds,
+    so checking a token normally costs no network round trip"""
+    def __init__(self, refresh_interval: int):
+        self.__revoked: dict[str, int] = {}
+        self.__revoked_before: dict[str, int] = {}
+        self.__refresh_interval = refresh_interval
+        self.__last_refresh = 0.0
+
+    @staticmethod
+    def __member(payload: JWTPayload):
+        # iat only has second precision, so fall back to it only for tokens without a jti
+        return payload.jti or f"{payload.sub}:{payload.iat}"
+
+    async def revoke(self, payload: JWTPayload, redis: Redis | None = None):
+        """Revokes token with the given claims until it expires"""
+        member = self.__member(payload)
+        self.__revoked[member] = payload.exp
+        await self.__publish(member, payload.exp, redis)
+
+    async def revoke_before(self, user_id: uuid.UUID, issued_before: int, redis: Redis | None = None):
+        """Revokes every token of user_id issued before the issued_before epoch second,
+        until the last of them expires. Tokens issued in that same second stay valid,
+        as iat has no finer precision and a login right after must not be revoked"""
+        sub = str(user_id)
+        self.__revoked_before[sub] = max(self.__revoked_before.get(sub, 0), issued_before)
+        await self.__publish(f"{REVOKED_BEFORE}:{sub}:{issued_before}", issued_before + ACCESS_TOKEN_EXPIRE_MINUTES * 60, redis)
+
+    async def __publish(self, member: str, exp: int, redis: Redis | None):
+        """Adds a revocation to the redis zset for the other workers"""
+        if redis is None:
+            return
+        try:
+            async with redis.pipeline() as pipe:
+                pipe.zadd(REVOKED_KEY, {member: exp})
+                pipe.zremrangebyscore(REVOKED_KEY, "-inf", int(time.time()))
+                await pipe.execute()
+        except Exception as e:
+            logger.error(f"Failed to publish revocation of {member}. Cause: {e}")
+
+    async def is_revoked(self, payload: JWTPayload, redis: Redis | None = None):
+        """Returns True if token with the given claims was revoked"""
+        await self.__refresh(redis)
+        return (
+            self.__member(payload) in self.__revoked
+            or payload.iat < self.__revoked_before.get(str(payload.sub), 0)
+        )
+
+    async def __refresh(self, redis: Redis | None):
+        """Pulls revocations made by other workers, at most once per refresh interval"""
+        now = time.monotonic()
+        if redis is None or now - self.__last_refresh < self.__refresh_interval:
+            return
+        self.__last_refresh = now
+        try:
+            current_time = int(time.time())
+            remote = await redis.zrangebyscore(REVOKED_KEY, current_time, "+inf", withscores=True)
+            # keep local revocations too, in case publishing them to redis failed
+            local = {member: exp for member, exp in self.__revoked.items() if exp >= current_time}
+            revoked = {**local, **{member: int(exp) for member, exp in remote}}
+            revoked_before = {
+                sub: before for sub, before in self.__revoked_before.items()
+                if before + ACCESS_TOKEN_EXPIRE_MINUTES * 60 >= current_time
+            }
+            for member in [member for member in revoked if member.startswith(f"{REVOKED_BEFORE}:")]:
+                _, sub, before = member.split(":")
+                revoked_before[sub] = max(revoked_before.get(sub, 0), int(before))
+                del revoked[member]
+            self.__revoked = revoked
+            self.__revoked_before = revoked_before
+        except Exception as e:
+            logger.warning(f"Failed to refresh revoked access tokens. Cause: {e}")
+
+revocation_list = RevocationList(settings.revocation_refresh_interval)
@@ -0,0 +1,29 @@
+"""Modules for coalescing concurrent identical calls within a process"""
+import asyncio
+from typing import Any, Awaitable, Callable
+
+class SingleFlight:
+    """Runs one call per key at a time, callers arriving while it runs await the same result
+    or exception. The call runs as its own task, so a caller being cancelled (e.g. a client
+    disconnecting) doesn't cancel it for the others"""
+    def __init__(self):
+        self.__in_flight: dict[str, asyncio.Task] = {}
+
+    def __done(self, key: str, task: asyncio.Task):
+        self.__in_flight.pop(key, None)
+        # marks the exception as retrieved, in case every caller was cancelled
+        if not task.cancelled():
+            task.exception()
+
+    async def run(self, key: str, func: Callable[[], Awaitable[Any]]):
+        """Returns the result of func(), or of the call already in flight for key"""
+        task = self.__in_flight.get(key)
+        if task is None:
+            task = asyncio.create_task(func())
+            self.__in_flight[key] = task
+            task.add_done_callback(lambda done: self.__done(key, done))
+        return await asyncio.shield(task)
+
+    def in_flight(self):
+        """Returns the number of calls running"""
+        return len(self.__in_flight)
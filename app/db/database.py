@@ -1,5 +1,7 @@
 """Modules relevant to SQLAlchemy and database url"""
-from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from typing import AsyncIterator
+
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
 
 from app.core.config import get_settings
 
@@ -17,3 +19,13 @@ async def get_session():
     """Returns db session"""
     async with SessionLocal() as db:
         yield db
+
+async def close_after(db: AsyncSession, chunks: AsyncIterator[bytes]):
+    """Keeps db open until a streamed response body ends. get_session closes the session
+    before the body is sent, and a closed session reconnects on next use, so whoever
+    streams from it has to close it again"""
+    try:
+        async for chunk in chunks:
+            yield chunk
+    finally:
+        await db.close()
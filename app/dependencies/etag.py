@@ -0,0 +1,57 @@
+"""Modules for answering conditional GETs on a user's application reads"""
+from typing import Annotated
+from urllib.parse import urlencode
+import hashlib
+import uuid
+
+from fastapi import Depends, HTTPException, Request, status
+from redis.asyncio import Redis
+
+from app.core.application_cache import application_cache
+from app.dependencies.redis_client import get_redis
+from app.dependencies.security import verify_jwt, verify_calendar_token
+
+def cache_headers(etag: str, max_age: int = 0):
+    """Headers that only ever store per user, and make clients revalidate
+    every time or, given max_age, after that many seconds"""
+    freshness = f"max-age={max_age}" if max_age else "no-cache"
+    return {"ETag": etag, "Cache-Control": f"private, {freshness}"}
+
+def etag_matches(if_none_match: str | None, etag: str):
+    """Returns True if If-None-Match lists etag, compared weakly as RFC 9110 asks for"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    candidates = [candidate.strip().removeprefix("W/") for candidate in if_none_match.split(",")]
+    return etag in candidates
+
+async def generation_etag(request: Request, user_id: uuid.UUID, redis: Redis):
+    """Returns a strong ETag for the user's application data as shaped by this request's
+    path and query, from the generation every application write bumps. Answers 304 here,
+    before the route runs any query, if the client already has it. None if redis is down"""
+    generation = await application_cache.generation(redis, user_id)
+    if generation is None:
+        return None
+    query = urlencode(sorted(request.query_params.multi_items()))
+    digest = hashlib.sha1(f"{request.url.path}?{query}".encode()).hexdigest()[:16]
+    etag = f'"{generation}-{digest}"'
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        raise HTTPException(status_code=status.HTTP_304_NOT_MODIFIED, headers=cache_headers(etag))
+    return etag
+
+async def application_etag(
+    request: Request,
+    user_id: Annotated[uuid.UUID, Depends(verify_jwt)],
+    redis: Annotated[Redis, Depends(get_redis)]
+):
+    """ETag of a JWT authenticated application read, see generation_etag"""
+    return await generation_etag(request, user_id, redis)
+
+async def calendar_etag(
+    request: Request,
+    user_id: Annotated[uuid.UUID, Depends(verify_calendar_token)],
+    redis: Annotated[Redis, Depends(get_redis)]
+):
+    """ETag of a calendar feed, see generation_etag"""
+    return await generation_etag(request, user_id, redis)
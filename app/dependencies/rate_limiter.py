@@ -0,0 +1,72 @@
+"""Modules for throttling auth endpoints with redis token buckets"""
+import math
+
+from redis.asyncio import Redis
+
+from app.core.config import get_settings
+from app.core.logger import setup_custom_logger
+from app.exceptions.auth_exceptions import RateLimited
+
+logger = setup_custom_logger(__name__)
+
+settings = get_settings()
+
+# Takes a token from every bucket in KEYS only if all of them have one, so one round trip checks
+# both the ip and the email. Uses redis' clock so every ECS task refills at the same rate.
+# Returns {allowed, ms until a token is available}
+TOKEN_BUCKET_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local refill_per_ms = tonumber(ARGV[2])
+local time = redis.call('TIME')
+local now = tonumber(time[1]) * 1000 + math.floor(tonumber(time[2]) / 1000)
+local levels = {}
+local wait = 0
+for i, key in ipairs(KEYS) do
+    local bucket = redis.call('HMGET', key, 'tokens', 'ts')
+    local tokens = tonumber(bucket[1]) or capacity
+    local ts = tonumber(bucket[2]) or now
+    tokens = math.min(capacity, tokens + (now - ts) * refill_per_ms)
+    levels[i] = tokens
+    if tokens < 1 then
+        wait = math.max(wait, math.ceil((1 - tokens) / refill_per_ms))
+    end
+end
+local allowed = 0
+if wait == 0 then
+    allowed = 1
+end
+for i, key in ipairs(KEYS) do
+    redis.call('HSET', key, 'tokens', levels[i] - allowed, 'ts', now)
+    redis.call('PEXPIRE', key, math.ceil(capacity / refill_per_ms))
+end
+return {allowed, wait}
+"""
+
+ROUTE_LIMITS = {
+    "login": lambda: settings.login_rate_limit,
+    "register": lambda: settings.register_rate_limit
+}
+
+async def take_token(redis: Redis, keys: list[str], capacity: int, refill_per_second: float):
+    """Takes a token from every bucket in keys, returns if allowed and seconds to wait if not"""
+    script = redis.register_script(TOKEN_BUCKET_SCRIPT)
+    allowed, wait_ms = await script(keys=keys, args=[capacity, refill_per_second / 1000])
+    return bool(int(allowed)), math.ceil(int(wait_ms) / 1000)
+
+async def enforce_rate_limit(redis: Redis, route: str, client_ip: str | None, email: str):
+    """Raises RateLimited if either the client ip or the email is out of tokens for route.
+    Limits are requests per minute from settings. Fails open if redis is unavailable,
+    so a redis outage doesn't lock everyone out"""
+    limit = ROUTE_LIMITS[route]()
+    keys = [
+        f"rate_limit:{route}:ip:{client_ip or 'unknown'}",
+        f"rate_limit:{route}:email:{email.strip().lower()}"
+    ]
+    try:
+        allowed, retry_after = await take_token(redis, keys, limit, limit / 60)
+    except Exception as e:
+        logger.warning(f"Rate limiter unavailable for {route}, letting request through. Cause: {e}")
+        return
+    if not allowed:
+        logger.warning(f"Rate limited {route} for {client_ip} / {email}.")
+        raise RateLimited(retry_after)
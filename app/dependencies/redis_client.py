@@ -1,7 +1,11 @@
+from functools import lru_cache
+
 from redis.asyncio import Redis
 
 from app.core.config import get_settings
 
+# one client (and so one connection pool) per worker, since redis is now on the auth hot path
+@lru_cache
 def get_redis():
     settings = get_settings()
     return Redis(host=settings.redis_host, port=settings.redis_port, decode_responses=True, socket_timeout=3)
\ No newline at end of file
@@ -1,41 +1,70 @@
 """Modules relevant for FastAPI's dependency injection and JWT"""
+from datetime import datetime, timezone, timedelta
+from typing import Annotated
+import hmac
 import uuid
 
 from sqlalchemy.exc import NoResultFound, IntegrityError
-from sqlalchemy import select, and_
+from sqlalchemy import select, insert, update, delete, and_
 from sqlalchemy.ext.asyncio import AsyncSession
 from jwt import ExpiredSignatureError, InvalidTokenError
-from fastapi import Depends, status
+from fastapi import Depends, Header, status
 from fastapi.exceptions import HTTPException
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
+from redis.asyncio import Redis
 
 from app.db.database import get_session
+from app.dependencies.redis_client import get_redis
 from app.core.jwt import UserJWT
-from app.core.refresh_token import UserRefreshToken
+from app.core.calendar_token import CalendarToken
+from app.core.principal_cache import principal_cache
+from app.core.revocation import revocation_list
+from app.core.config import get_settings
+from app.core.refresh_token import UserRefreshToken, SESSION_EXPIRE_DAYS
 from app.models.user import User
-from app.exceptions.auth_exceptions import DuplicateEmailError
+from app.models.user_session import UserSession
+from app.exceptions.auth_exceptions import InvalidCalendarToken
 
 security = HTTPBearer()
 
+settings = get_settings()
+
 NO_ACCOUNT = "No account"
 EXPIRED_TOKEN = "Expired token"
 INVALID_JWT = "Invalid JWT"
 NO_REFRESH_TOKEN = "No refresh token"
 INVALID_SESSION_TOKEN = "Invalid session token"
 LOGGED_OUT = "Logged out"
+REVOKED_TOKEN = "Revoked token"
+INVALID_ADMIN_KEY = "Invalid admin key"
+INVALID_CALENDAR_TOKEN = "Invalid calendar token"
 
 async def verify_jwt(authorization: HTTPAuthorizationCredentials = Depends(security),
     db: AsyncSession = Depends(get_session),
-    user_jwt: UserJWT = Depends(UserJWT)
+    user_jwt: UserJWT = Depends(UserJWT),
+    redis: Redis = Depends(get_redis)
 ):
-    """Verifies if user id in JWT is valid"""
+    """Verifies if user id in JWT is valid. Recently verified user ids are served from the
+    principal cache, so the db is only hit on a cache miss.
+    In stateless mode the signed claims are trusted as long as the token is not revoked"""
     try:
         token = authorization.credentials
+        if settings.stateless_auth:
+            payload = user_jwt.decode_claims(token)
+            if await revocation_list.is_revoked(payload, redis):
+                raise HTTPException(
+                    status_code=status.HTTP_401_UNAUTHORIZED,
+                    detail=REVOKED_TOKEN
+                )
+            return payload.sub
         user_id = user_jwt.decode_jwt(token)
-        stmt = select(User).where(user_id == User.id)
+        if await principal_cache.contains(user_id, redis):
+            return user_id
+        stmt = select(User.id).where(user_id == User.id)
         result = await db.execute(statement=stmt)
-        user = result.scalar_one()
-        return user.id
+        verified_id = result.scalar_one()
+        await principal_cache.add(verified_id, redis)
+        return verified_id
     except NoResultFound:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -56,22 +85,13 @@ async def verify_jwt(authorization: HTTPAuthorizationCredentials = Depends(secur
     
 async def verify_expired_jwt(
     authorization: HTTPAuthorizationCredentials = Depends(security),
-    db: AsyncSession = Depends(get_session),
     user_jwt: UserJWT = Depends(UserJWT)
 ):
-    """Verifies if user id in JWT is valid"""
+    """Verifies JWT signature, allowing expired JWTs. The user id is not looked up here since
+    every caller matches it against the user's session, which only exists for a real account"""
     try:
         token = authorization.credentials
-        user_id = user_jwt.decode_expired_jwt(token)
-        stmt = select(User).where(user_id == User.id)
-        result = await db.execute(statement=stmt)
-        user = result.scalar_one()
-        return user.id
-    except NoResultFound:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail=NO_ACCOUNT
-        ) from NoResultFound
+        return user_jwt.decode_expired_jwt(token)
     except InvalidTokenError:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
@@ -80,57 +100,62 @@ async def verify_expired_jwt(
     except Exception as e:
         raise e
 
+async def verify_calendar_token(token: str):
+    """Verifies the calendar token in a feed url and returns its user id. Not looked up in the db,
+    a deleted user's feed just has no events"""
+    try:
+        return CalendarToken().decode_calendar_token(token)
+    except InvalidCalendarToken:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail=INVALID_CALENDAR_TOKEN
+        ) from InvalidCalendarToken
+
+def session_expiry():
+    """Returns when a session created or rotated now expires"""
+    return datetime.now(timezone.utc).replace(tzinfo=None) + timedelta(days=SESSION_EXPIRE_DAYS)
+
 async def create_session_id(
         user_id: uuid.UUID,
         db: AsyncSession
 ):
-    """Creates session id and store it into db"""
+    """Creates session id for a new device and store it into db,
+    clearing out the user's expired sessions on the way"""
     try:
         session_id = uuid.uuid4()
-        stmt = select(User).where(user_id == User.id)
-        result = await db.execute(statement=stmt)
-        user = result.scalar_one()
-        user.session_id = session_id
+        now = datetime.now(timezone.utc).replace(tzinfo=None)
+        await db.execute(delete(UserSession).where(
+            and_(
+                UserSession.user_id == user_id,
+                UserSession.expires_at <= now
+            )
+        ))
+        await db.execute(insert(UserSession).values(
+            id=session_id,
+            user_id=user_id,
+            expires_at=session_expiry()
+        ))
         await db.commit()
-        await db.refresh(user)
         return session_id
-    except NoResultFound:
+    except IntegrityError:
         await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail=NO_ACCOUNT
-        ) from NoResultFound
+        ) from IntegrityError
     except Exception as e:
         await db.rollback()
         raise e
 
-async def check_session_token(
-        user_id: uuid.UUID,
-        refresh_token: str,
-        db: AsyncSession
-):
-    """Checks session token. If valid, returns user with that session token"""
+def decode_session_token(refresh_token: str):
+    """Decodes session token to get session id, raising the matching HTTPException if bad"""
     try:
         if not refresh_token:
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail=NO_REFRESH_TOKEN
             )
-        session_id = UserRefreshToken().decode_refresh_token(refresh_token)
-        stmt = select(User).where(
-            and_(
-                User.id == user_id,
-                User.session_id == session_id
-            )
-        )
-        res = await db.execute(stmt)
-        result = res.scalar_one()
-        return result
-    except NoResultFound:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail=NO_ACCOUNT
-        ) from NoResultFound
+        return UserRefreshToken().decode_refresh_token(refresh_token)
     except ExpiredSignatureError:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -144,33 +169,83 @@ async def check_session_token(
     except Exception as e:
         raise e
 
-async def use_session_token(
+async def check_session_token(
         user_id: uuid.UUID,
         refresh_token: str,
         db: AsyncSession
 ):
-    """Uses session token. If valid, creates a new session id, stores into db and returns it"""
+    """Checks session token. If valid, returns its session id"""
     try:
-        if not refresh_token:
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail=NO_REFRESH_TOKEN
+        session_id = decode_session_token(refresh_token)
+        stmt = select(UserSession.id).where(
+            and_(
+                UserSession.id == session_id,
+                UserSession.user_id == user_id,
+                UserSession.expires_at > datetime.now(timezone.utc).replace(tzinfo=None)
             )
-        result = await check_session_token(user_id, refresh_token, db)
+        )
+        res = await db.execute(stmt)
+        return res.scalar_one()
+    except NoResultFound:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail=NO_ACCOUNT
+        ) from NoResultFound
+    except Exception as e:
+        raise e
+
+async def use_session_token(
+        user_id: uuid.UUID,
+        refresh_token: str,
+        db: AsyncSession,
+        redis: Redis | None = None
+):
+    """Uses session token. If valid, swaps it for a new session id with a single
+    compare-and-swap UPDATE ... RETURNING and returns the new id.
+    The user is also evicted from the principal cache so it is verified again on next use"""
+    try:
+        session_id = decode_session_token(refresh_token)
         new_session_id = uuid.uuid4()
-        result.session_id = new_session_id
-        await db.commit()
-        await db.refresh(result)
-        return new_session_id
+        stmt = update(UserSession).where(
+            and_(
+                UserSession.id == session_id,
+                UserSession.user_id == user_id,
+                UserSession.expires_at > datetime.now(timezone.utc).replace(tzinfo=None)
+            )
+        ).values(
+            id=new_session_id,
+            expires_at=session_expiry()
+        ).returning(UserSession.id)
+        # a single statement is atomic by itself, so skip the BEGIN and COMMIT round trips
+        conn = await db.connection(execution_options={"isolation_level": "AUTOCOMMIT"})
+        result = await conn.execute(stmt)
+        rotated_session_id = result.scalar_one()
+        await principal_cache.invalidate(user_id, redis)
+        return rotated_session_id
+    except NoResultFound:
+        # either the session was already rotated/logged out, or it belongs to someone else
+        await db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail=NO_ACCOUNT
+        ) from NoResultFound
     except Exception as e:
         await db.rollback()
         raise e
-    
+
 async def test_session_token(
         user_id: uuid.UUID,
         refresh_token: str,
         db: AsyncSession
 ):
     """Tests session token. If valid, returns same same session token"""
-    result = await check_session_token(user_id, refresh_token, db)
-    return result.session_id
\ No newline at end of file
+    return await check_session_token(user_id, refresh_token, db)
+
+async def verify_admin(x_admin_key: Annotated[str | None, Header()] = None):
+    """Checks X-Admin-Key against admin_api_key, every admin route is refused if it is unset"""
+    if not settings.admin_api_key or x_admin_key is None \
+        or not hmac.compare_digest(x_admin_key.encode(), settings.admin_api_key.encode()):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail=INVALID_ADMIN_KEY
+        )
@@ -4,3 +4,13 @@ class NoApplicationFound(Exception):
 
 class InvalidApplication(Exception):
     """Exception Wrapper for attempting to make invalid application"""
+
+class InvalidCursor(Exception):
+    """Exception Wrapper for a pagination cursor that cannot be decoded"""
+
+class InvalidImport(Exception):
+    """Exception Wrapper for an application import file that is not a readable CSV
+    or is missing required columns"""
+
+class ImportTooLarge(Exception):
+    """Exception Wrapper for an application import file with more rows than allowed"""
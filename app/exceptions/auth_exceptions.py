@@ -13,3 +13,15 @@ class BadJWTError(Exception):
 
 class ExpiredJWTError(Exception):
     """Expired JWT Wrapper"""
+
+class HasherBusy(Exception):
+    """Password hashing pool saturated Wrapper"""
+
+class RateLimited(Exception):
+    """Too many auth attempts Wrapper"""
+    def __init__(self, retry_after: int):
+        super().__init__(retry_after)
+        self.retry_after = retry_after
+
+class InvalidCalendarToken(Exception):
+    """Calendar feed token not signed by us Wrapper"""
@@ -1,25 +1,53 @@
 """Modules for FastAPI dependencies, setting up routers and db connection"""
 from contextlib import asynccontextmanager
+import asyncio
 
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from uvicorn.middleware.proxy_headers import ProxyHeadersMiddleware
 
 from .api import routes_auth, routes_applications, routes_internship_listings, routes_resume_creator
+from .core.process_pool import hashing_pool
+from .core.password_hasher import get_parameters, configure_hasher
+from .core.config import get_settings
+from .workers.deadline_reminder import schedule_reminders
+from .workers.listings_warmer import schedule_warming
 from .openapi import TAGS_METADATA, DESCRIPTION
 
-# currently not in use since we are not using spaCy anymore
-# @asynccontextmanager
-# async def lifespan(app: FastAPI):
-#     """Creates process pool for spacy since it is CPU intensive"""
-#     pool.create_process_pool()
-#     if pool.executor is None:
-#         raise RuntimeError("Process pool failed to start")
-#     yield
+settings = get_settings()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Calibrates argon2, then creates process pool for it since it is CPU intensive.
+    Also runs the deadline reminder scheduler and listings warmer if enabled,
+    their leases keep tasks from doubling up"""
+    parameters = get_parameters()
+    configure_hasher(parameters)
+    hashing_pool.start(initializer=configure_hasher, initargs=(parameters,))
+    if hashing_pool.executor is None:
+        raise RuntimeError("Process pool failed to start")
+    background = []
+    if settings.reminder_scheduler:
+        background.append(asyncio.create_task(schedule_reminders(
+            settings.reminder_interval,
+            settings.reminder_horizon_hours,
+            settings.reminder_batch_size,
+            settings.reminder_sink
+        )))
+    if settings.listings_warmer:
+        background.append(asyncio.create_task(schedule_warming(
+            settings.listings_warm_interval,
+            settings.listings_warm_pages,
+            settings.listings_warm_max_scrapes
+        )))
+    yield
+    for task in background:
+        task.cancel()
+    hashing_pool.shutdown()
 
 app = FastAPI(
     openapi_tags=TAGS_METADATA,
-    # lifespan=lifespan, not in use, see above
+    lifespan=lifespan,
     description=DESCRIPTION
 )
 
@@ -34,6 +62,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "ETag"]
 )
 app.add_middleware(ProxyHeadersMiddleware)
 
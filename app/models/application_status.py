@@ -2,7 +2,7 @@
 from datetime import datetime, timezone
 import uuid
 
-from sqlalchemy import Uuid, ForeignKey, DateTime, Integer, Enum as SQLAEnum
+from sqlalchemy import Uuid, ForeignKey, DateTime, Integer, Index, func, text, Enum as SQLAEnum
 from sqlalchemy.orm import Mapped, mapped_column
 from app.schemas.application_status import ApplicationStatusEnum
 
@@ -11,6 +11,42 @@ from .base import Base
 class UserApplication(Base):
     """Model of how a user application is stored"""
     __tablename__ = "application_statuses"
+    __table_args__ = (
+        # keyset pagination walks a user's applications in id order as an index range scan
+        Index("ix_application_statuses_user_id_id", "user_id", "id"),
+        # the rest back the filters and sort keys of UserApplications.get_all_applications
+        Index("ix_application_statuses_user_id_status", "user_id", "status"),
+        Index("ix_application_statuses_user_id_created_at", "user_id", "created_at", "id"),
+        Index(
+            "ix_application_statuses_user_id_action_deadline",
+            "user_id",
+            "action_deadline",
+            "id",
+            postgresql_where=text("action_deadline IS NOT NULL"),
+            sqlite_where=text("action_deadline IS NOT NULL")
+        ),
+        # the deadline reminder scheduler walks every user's upcoming deadlines in this order
+        Index(
+            "ix_application_statuses_action_deadline_id",
+            "action_deadline",
+            "id",
+            postgresql_where=text("action_deadline IS NOT NULL"),
+            sqlite_where=text("action_deadline IS NOT NULL")
+        ),
+        # text_pattern_ops lets LIKE 'prefix%' use the index under any collation
+        Index(
+            "ix_application_statuses_user_id_company_name",
+            "user_id",
+            func.lower(text("company_name")).label("company_name_lower"),
+            postgresql_ops={"company_name_lower": "text_pattern_ops"}
+        ),
+        Index(
+            "ix_application_statuses_user_id_role_name",
+            "user_id",
+            func.lower(text("role_name")).label("role_name_lower"),
+            postgresql_ops={"role_name_lower": "text_pattern_ops"}
+        ),
+    )
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
     user_id: Mapped[uuid.UUID] = mapped_column(Uuid(), ForeignKey("user.id"))
     role_name: Mapped[str]
@@ -27,7 +63,7 @@ class UserApplication(Base):
     ))
     created_at: Mapped[datetime] = mapped_column(
         DateTime,
-        default=datetime.now(timezone.utc).replace(tzinfo=None)
+        default=lambda: datetime.now(timezone.utc).replace(tzinfo=None)
     )
     action_deadline: Mapped[datetime] = mapped_column(DateTime, nullable=True)
     notes: Mapped[str] = mapped_column(nullable=True)
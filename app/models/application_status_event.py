@@ -0,0 +1,41 @@
+"""Modules relevant to store the status history of a user's applications"""
+from datetime import datetime, timezone
+import uuid
+
+from sqlalchemy import Uuid, ForeignKey, DateTime, Integer, Index, Enum as SQLAEnum
+from sqlalchemy.orm import Mapped, mapped_column
+from app.schemas.application_status import ApplicationStatusEnum
+
+from .base import Base
+
+def status_column(name: str, nullable: bool = False):
+    """Status column stored like application_statuses.status. Each one names its own
+    check constraint, postgres rejects two constraints of one name on a table"""
+    return mapped_column(SQLAEnum(
+        ApplicationStatusEnum,
+        name=name,
+        values_callable=lambda x: [e.value for e in x],
+        create_constraint=True,
+        native_enum=False
+    ), nullable=nullable)
+
+class ApplicationStatusEvent(Base):
+    """Model of one status change of a user application, append only.
+    Written in the same transaction as the change, from_status is None when the application was created
+    and to_status None when it was deleted. application_id is not a foreign key, so the history of a
+    deleted application outlives it and analytics don't change when old applications are cleaned up"""
+    __tablename__ = "application_status_events"
+    __table_args__ = (
+        # analytics read one user's history at a time, weekly activity by time range
+        Index("ix_application_status_events_user_id_changed_at", "user_id", "changed_at"),
+        Index("ix_application_status_events_application_id_changed_at", "application_id", "changed_at", "id"),
+    )
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    application_id: Mapped[int] = mapped_column(Integer)
+    user_id: Mapped[uuid.UUID] = mapped_column(Uuid(), ForeignKey("user.id", ondelete="CASCADE"))
+    from_status: Mapped[ApplicationStatusEnum | None] = status_column("application_status_event_from_status", nullable=True)
+    to_status: Mapped[ApplicationStatusEnum | None] = status_column("application_status_event_to_status", nullable=True)
+    changed_at: Mapped[datetime] = mapped_column(
+        DateTime,
+        default=lambda: datetime.now(timezone.utc).replace(tzinfo=None)
+    )
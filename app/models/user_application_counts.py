@@ -0,0 +1,24 @@
+"""Modules for SQLAlchemy dependency and storing of per user application status counts"""
+import uuid
+
+from sqlalchemy import Uuid, ForeignKey, Integer
+from sqlalchemy.orm import Mapped, mapped_column
+
+from .base import Base
+
+class UserApplicationCounts(Base):
+    """Model of how many applications of each status a user has, one row per user.
+    Kept exact by every application write so stats are a primary key lookup,
+    column names are the lowercased ApplicationStatusEnum values"""
+    __tablename__ = "user_application_counts"
+    user_id: Mapped[uuid.UUID] = mapped_column(
+        Uuid(),
+        ForeignKey("user.id", ondelete="CASCADE"),
+        primary_key=True
+    )
+    applied: Mapped[int] = mapped_column(Integer, default=0, server_default="0")
+    interview: Mapped[int] = mapped_column(Integer, default=0, server_default="0")
+    pending: Mapped[int] = mapped_column(Integer, default=0, server_default="0")
+    offered: Mapped[int] = mapped_column(Integer, default=0, server_default="0")
+    rejected: Mapped[int] = mapped_column(Integer, default=0, server_default="0")
+    accepted: Mapped[int] = mapped_column(Integer, default=0, server_default="0")
@@ -0,0 +1,19 @@
+"""Modules for SQLAlchemy dependency and storing of refresh token sessions"""
+from datetime import datetime
+import uuid
+
+from sqlalchemy import Uuid, ForeignKey, DateTime
+from sqlalchemy.orm import Mapped, mapped_column
+
+from .base import Base
+
+class UserSession(Base):
+    """Model of how a refresh token session is stored, one row per logged in device"""
+    __tablename__ = "user_sessions"
+    id: Mapped[uuid.UUID] = mapped_column(Uuid(), primary_key=True, default=uuid.uuid4)
+    user_id: Mapped[uuid.UUID] = mapped_column(
+        Uuid(),
+        ForeignKey("user.id", ondelete="CASCADE"),
+        index=True
+    )
+    expires_at: Mapped[datetime] = mapped_column(DateTime)
@@ -20,6 +20,10 @@ TAGS_METADATA = [
         "name": "application",
         "description": "Endpoints for creating, retrieving, modifying, and deleting individual user applications."
     },
+    {
+        "name": "admin",
+        "description": "Endpoints for operators, authenticated with the X-Admin-Key header instead of a JWT."
+    },
     {
         "name": "upload_resume",
         "description": "Retrieve user's resume sections."
@@ -165,8 +169,52 @@ BAD_REFRESH_TOKEN_RESPONSE = {
     }
 }
 
+AUTH_BUSY_RESPONSE = {
+    503: {
+        "description": "Too many logins or registrations in flight, retry shortly",
+        "content": {
+            "application/json": {
+                "example": {"detail": "Authentication busy"}
+            }
+        }
+    }
+}
+
+TOO_MANY_ATTEMPTS_RESPONSE = {
+    429: {
+        "description": "Too many attempts from this client or for this email, see Retry-After",
+        "content": {
+            "application/json": {
+                "example": {"detail": "Too many attempts"}
+            }
+        }
+    }
+}
+
 BAD_JWT = {**NO_ACCOUNT_RESPONSE, **INVALID_JWT_RESPONSE, **EXPIRED_JWT_RESPONSE}
 
+INVALID_CALENDAR_TOKEN_RESPONSE = {
+    403: {
+        "description": "The calendar feed url is not one this server handed out",
+        "content": {
+            "application/json": {
+                "example": {"detail": "Invalid calendar token"}
+            }
+        }
+    }
+}
+
+CALENDAR_RESPONSE = {
+    200: {
+        "description": "Deadlines as an iCalendar feed, one event at each deadline",
+        "content": {
+            "text/calendar": {
+                "schema": {"type": "string"}
+            }
+        }
+    }
+}
+
 INVALID_APPLICATION_RESPONSE = {
     400: {
         "description": "The submitted application is invalid",
@@ -189,6 +237,80 @@ APPLICATION_NOT_FOUND_RESPONSE = {
     }
 }
 
+INVALID_CURSOR_RESPONSE = {
+    400: {
+        "description": "The pagination cursor is malformed, restart from the first page",
+        "content": {
+            "application/json": {
+                "example": {"detail": "Invalid cursor"}
+            }
+        }
+    }
+}
+
+INVALID_IMPORT_RESPONSE = {
+    400: {
+        "description": "The file is not a UTF-8 CSV or its header lacks company_name, role_name, location or status",
+        "content": {
+            "application/json": {
+                "example": {"detail": "Invalid import file"}
+            }
+        }
+    },
+    413: {
+        "description": "The file has more rows than one import allows",
+        "content": {
+            "application/json": {
+                "example": {"detail": "Import file too large"}
+            }
+        }
+    }
+}
+
+PAGINATED_RESPONSE = {
+    200: {
+        "description": "One page of results. X-Next-Cursor holds the cursor of the next page "
+            "and is absent on the last page",
+        "headers": {
+            "X-Next-Cursor": {
+                "description": "Opaque cursor to pass back as cursor for the next page",
+                "schema": {"type": "string"}
+            }
+        }
+    }
+}
+
+EXPORT_RESPONSE = {
+    200: {
+        "description": "Applications streamed in id order, one JSON object per line or CSV with a header row",
+        "content": {
+            "application/x-ndjson": {
+                "schema": {"type": "string"}
+            },
+            "text/csv": {
+                "schema": {"type": "string"}
+            }
+        }
+    }
+}
+
+INVALID_ADMIN_KEY_RESPONSE = {
+    403: {
+        "description": "X-Admin-Key is missing or wrong, or admin routes are not enabled",
+        "content": {
+            "application/json": {
+                "example": {"detail": "Invalid admin key"}
+            }
+        }
+    }
+}
+
+NOT_MODIFIED_RESPONSE = {
+    304: {
+        "description": "Nothing changed since the ETag sent in If-None-Match, reuse the cached body"
+    }
+}
+
 SERVICE_DEAD = {
     503: {
         "description": "A third party service (Gemini, spaCy etc) is down",
@@ -1,9 +1,20 @@
 """Modules for pydantic dependency and optional, datetime"""
-from datetime import datetime
-from typing import Optional
+from datetime import date, datetime
+from typing import Literal, Optional
 import enum
 
-from pydantic import BaseModel, ConfigDict
+from pydantic import BaseModel, ConfigDict, Field, field_validator
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 500
+MAX_BATCH_SIZE = 100
+DEFAULT_SEARCH_SIZE = 20
+MAX_SEARCH_SIZE = 100
+MAX_SEARCH_OFFSET = 1000
+DEFAULT_ANALYTICS_WEEKS = 12
+MAX_ANALYTICS_WEEKS = 52
+IMPORT_BATCH_SIZE = 1000
+MAX_IMPORT_ROWS = 20000
 
 class ApplicationStatusEnum(str, enum.Enum):
     """Enum for possible application status"""
@@ -36,6 +47,16 @@ class UserApplicationModify(UserApplicationBase):
     Rationale: Frontend will send the entire user application back"""
     id: int
 
+class ImportRejection(BaseModel):
+    """Schema of a CSV row that was not imported, line 1 is the header"""
+    line: int
+    errors: list[dict]
+
+class ApplicationImportResult(BaseModel):
+    """Schema of the outcome of an application import"""
+    imported: int
+    rejected: list[ImportRejection]
+
 class ApplicationStatusCounts(BaseModel):
     """Schema of the number of applications of each status for a user"""
     applied: int
@@ -45,3 +66,100 @@ class ApplicationStatusCounts(BaseModel):
     rejected: int
     accepted: int
     total: int
+
+class FunnelStage(BaseModel):
+    """Schema of one status in a user's application funnel. share is the fraction of
+    applications that ever reached it, deleted ones included, mean_days how long they
+    stayed before moving on or being deleted"""
+    status: ApplicationStatusEnum
+    reached: int
+    share: float
+    mean_days: Optional[float] = None
+
+class WeeklyActivity(BaseModel):
+    """Schema of a week of application activity, cumulative_created counts from the first week shown"""
+    week: date
+    created: int
+    status_changes: int
+    deleted: int
+    cumulative_created: int
+
+class ApplicationAnalytics(BaseModel):
+    """Schema of a user's application funnel and weekly activity, weeks start on Monday (UTC)"""
+    funnel: list[FunnelStage]
+    weekly: list[WeeklyActivity]
+
+class ApplicationSortKey(str, enum.Enum):
+    """Enum for columns user applications can be sorted by"""
+    ID = "id"
+    CREATED_AT = "created_at"
+    ACTION_DEADLINE = "action_deadline"
+
+class SortOrder(str, enum.Enum):
+    """Enum for sort direction"""
+    ASC = "asc"
+    DESC = "desc"
+
+class ExportFormat(str, enum.Enum):
+    """Enum for formats applications can be exported in"""
+    NDJSON = "ndjson"
+    CSV = "csv"
+
+class ApplicationFilters(BaseModel):
+    """Schema of the query parameters for filtering and sorting user applications.
+    Prefixes are case insensitive, ranges include the lower bound and exclude the upper bound.
+    Sorting by action_deadline leaves out applications without one"""
+    status: Optional[list[ApplicationStatusEnum]] = None
+    company_prefix: Optional[str] = Field(default=None, max_length=100)
+    role_prefix: Optional[str] = Field(default=None, max_length=100)
+    created_after: Optional[datetime] = None
+    created_before: Optional[datetime] = None
+    deadline_after: Optional[datetime] = None
+    deadline_before: Optional[datetime] = None
+    sort_by: ApplicationSortKey = ApplicationSortKey.ID
+    order: SortOrder = SortOrder.ASC
+
+class ApplicationsPageQuery(ApplicationFilters):
+    """Schema of the query parameters for a page of user applications,
+    cursor is the X-Next-Cursor of the previous page"""
+    limit: int = Field(default=DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE)
+    cursor: Optional[str] = Field(default=None, max_length=512)
+
+class DeadlineWindow(BaseModel):
+    """Schema of the query parameters for a window of deadlines in ascending order,
+    from is inclusive and to exclusive, either can be left open"""
+    model_config = ConfigDict(populate_by_name=True)
+    start: Optional[datetime] = Field(default=None, alias="from")
+    end: Optional[datetime] = Field(default=None, alias="to")
+    limit: int = Field(default=DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE)
+
+class CalendarFeed(BaseModel):
+    """Schema of a user's calendar feed url, the token in it is the only credential"""
+    url: str
+
+class ApplicationBatch(BaseModel):
+    """Schema of a batch of changes to a user's applications, applied in one transaction.
+    Creates run first, then modifies, then deletes"""
+    create: list[UserApplicationCreate] = Field(default_factory=list, max_length=MAX_BATCH_SIZE)
+    modify: list[UserApplicationModify] = Field(default_factory=list, max_length=MAX_BATCH_SIZE)
+    delete: list[int] = Field(default_factory=list, max_length=MAX_BATCH_SIZE)
+
+    @field_validator("modify")
+    @classmethod
+    def unique_modify_ids(cls, value: list[UserApplicationModify]):
+        """Rejects modifying one application twice, the result would depend on row order"""
+        if len({application.id for application in value}) != len(value):
+            raise ValueError("an application can only be modified once per batch")
+        return value
+
+class BatchItemResult(BaseModel):
+    """Schema of the outcome of one operation in a batch"""
+    id: int
+    outcome: Literal["created", "modified", "deleted", "not_found"]
+    application: Optional[GetUserApplication] = None
+
+class ApplicationBatchResult(BaseModel):
+    """Schema of what is returned for a batch, one result per operation in request order"""
+    create: list[BatchItemResult]
+    modify: list[BatchItemResult]
+    delete: list[BatchItemResult]
@@ -4,6 +4,10 @@ from typing import Optional
 
 from pydantic import BaseModel, ConfigDict
 
+PAGE_LENGTH = 10
+DASHBOARD_LENGTH = 4 # the number of listings to show on dashboard
+ACTIVE_PORTALS = 2 # the number of working job portals
+
 class InternshipListing(BaseModel):
     """Schema of how an internship listing is returned"""
     company: Optional[str] = None
@@ -22,3 +22,19 @@ class UserToken(BaseModel):
     """Schema of how a JWT (or a refresh token when implemented) is returned"""
     access_token: str
     token_type: str
+
+class HashingPoolStats(BaseModel):
+    """Schema of the hashing pool's admission control metrics"""
+    in_flight: int
+    completed: int
+    failed: int
+    rejected: int
+    mean_latency: float
+    max_latency: float
+
+class PrincipalCacheStats(BaseModel):
+    """Schema of the principal cache's hit ratio"""
+    hits: int
+    misses: int
+    hit_ratio: float
+    size: int
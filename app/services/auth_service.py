@@ -1,24 +1,49 @@
 """Modules needed for SQLAlchemy, argon2 dependency, schemas for how users are registered
 and logged in and custom exception handling"""
+import asyncio
+import time
 import uuid
 
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.exc import IntegrityError, NoResultFound
-from sqlalchemy import select
+from sqlalchemy import select, update, delete
 
 from pydantic import BaseModel
 
-from argon2 import PasswordHasher
 from argon2.exceptions import VerificationError
+from redis.asyncio import Redis
 
 from app.models.user import User
+from app.models.user_session import UserSession
+from app.models.user_application_counts import UserApplicationCounts
 from app.exceptions.auth_exceptions import DuplicateEmailError, WrongPasswordError, NoAccountError
 from app.schemas.user import UserCreate, UserLogin
 from app.core.logger import setup_custom_logger
 from app.core.timer import timed
+from app.core.principal_cache import principal_cache
+from app.core.revocation import revocation_list
+from app.core.process_pool import hashing_pool
+from app.core.password_hasher import hash_password, verify_password
+from app.db.database import SessionLocal
 
 logger = setup_custom_logger(__name__)
 
+# holds references to fire and forget tasks so they are not garbage collected midway
+background_tasks: set[asyncio.Task] = set()
+
+async def rehash_password(user_id: uuid.UUID, password: str):
+    """Upgrades a user's stored hash to the current argon2 parameters, on its own db session
+    since it outlives the login request"""
+    try:
+        new_hash = await hashing_pool.run(hash_password, password)
+        async with SessionLocal() as db:
+            await db.execute(update(User).where(User.id == user_id).values(encrypted_password=new_hash))
+            await db.commit()
+        logger.info(f"Password hash of {user_id} upgraded.")
+    except Exception as e:
+        # the next login simply tries again
+        logger.warning(f"Failed to upgrade password hash of {user_id}. Cause: {e}")
+
 class UserIn(BaseModel):
     """Schema of what the db returns when a user logs in"""
     id: uuid.UUID
@@ -26,22 +51,24 @@ class UserIn(BaseModel):
 
 class UserAuth:
     """Auth Service"""
-    def __init__(self, db: AsyncSession):
-        self.__pwd_context = PasswordHasher()
+    def __init__(self, db: AsyncSession, redis: Redis | None = None):
         self.__db = db
+        self.__redis = redis
 
     @timed("User registration")
     async def register(self, user_in: UserCreate):
         """Register user and return user id"""
         logger.info(f"Creating account for {user_in.name}")
-        hashed_password = self.__pwd_context.hash(user_in.password)
+        hashed_password = await hashing_pool.run(hash_password, user_in.password)
         user = User(
+            id=uuid.uuid4(),
             name=user_in.name,
             email=user_in.email,
             encrypted_password=hashed_password
         )
         try:
-            self.__db.add(user)
+            # empty status counters, so application stats never need to count
+            self.__db.add_all([user, UserApplicationCounts(user_id=user.id)])
             await self.__db.commit()
             await self.__db.refresh(user)
             logger.info(f"Account for {user_in.name} created.")
@@ -63,7 +90,11 @@ class UserAuth:
             stmt = select(User).where(user_in.email == User.email)
             result = await self.__db.execute(statement=stmt)
             user = result.scalar_one()
-            self.__pwd_context.verify(user.encrypted_password, user_in.password)
+            needs_rehash = await hashing_pool.run(verify_password, user.encrypted_password, user_in.password)
+            if needs_rehash:
+                task = asyncio.create_task(rehash_password(user.id, user_in.password))
+                background_tasks.add(task)
+                task.add_done_callback(background_tasks.discard)
             user_details = UserIn(id=user.id, name=user.name)
             logger.info(f"{user_in.email} has logged in.")
             return user_details
@@ -81,22 +112,20 @@ class UserAuth:
             raise e
 
     @timed("User logout")
-    async def log_out(self, user_id: uuid.UUID):
-        """Logs user out and returns None (idk)"""
+    async def log_out(self, user_id: uuid.UUID, session_id: uuid.UUID | None = None):
+        """Logs user out of the given session, or every session if none is given.
+        Logging out of every session also revokes every access token issued so far"""
         try:
             logger.info(f"Signing out for {user_id}")
-            stmt = select(User).where(user_id == User.id)
-            result = await self.__db.execute(statement=stmt)
-            user = result.scalar_one()
-            user.session_id = None
+            stmt = delete(UserSession).where(UserSession.user_id == user_id)
+            if session_id is not None:
+                stmt = stmt.where(UserSession.id == session_id)
+            await self.__db.execute(stmt)
             await self.__db.commit()
-            await self.__db.refresh(user)
+            await principal_cache.invalidate(user_id, self.__redis)
+            if session_id is None:
+                await revocation_list.revoke_before(user_id, int(time.time()), self.__redis)
             logger.info(f"{user_id} has logged out.")
-            return user.session_id
-        except NoResultFound:
-            await self.__db.rollback()
-            logger.warning("Account with that email does not exist.")
-            raise NoAccountError from NoResultFound
         except Exception as e:
             await self.__db.rollback()
             logger.error(f"{user_id} was unable to log out.")
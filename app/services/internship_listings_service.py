@@ -1,8 +1,10 @@
 """Module dependencies for SQLAlchemy, user id, models and schemas for user applications"""
 import uuid
 import io
-import json
+import base64
+import hashlib
 import asyncio
+import time
 
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, update
@@ -10,19 +12,121 @@ from sqlalchemy.dialects.postgresql import insert as upsert
 from sqlalchemy.exc import NoResultFound
 from anyio import to_thread
 from redis.asyncio import Redis
+import brotli
+import orjson
 
 from app.models.user_skills import UserSkill
 from app.models.user import User
-from app.workers.job_scraper import sync_scrape_jobs
+from app.workers.job_scraper import sync_scrape_jobs, TIMEOUT
 from app.workers.gemini import get_gemini_client
 from app.workers.r2 import R2
-from app.exceptions.internship_listings_exceptions import NotAddedDetails
+from app.exceptions.internship_listings_exceptions import NotAddedDetails, ScraperDown
 from app.schemas.internship_listings import InternshipListing
+from app.core.lease_lock import LeaseLock
+from app.core.single_flight import SingleFlight
+from app.core.config import get_settings
 from app.core.logger import setup_custom_logger
 
 logger = setup_custom_logger(__name__)
 
-CACHE_EXPIRE = 60 * 60 * 24 # seconds in a min * mins in an hour* hours in a day
+settings = get_settings()
+
+CACHE_EXPIRE = 60 * 60 * 24 # seconds in a min * mins in an hour* hours in a day, hard ttl of a key
+CACHE_SOFT_EXPIRE = 60 * 60 * 6 # after this a page is served stale while it's refreshed
+BODIES_EXPIRE = 2 * CACHE_EXPIRE # a day's bodies outlive every key cached that day
+BODIES_KEY = "listings:bodies" # one hash of compressed listing bodies per day, see bodies_key
+DEMAND_KEY = "listings:demand" # one zset of requested preference and industry pairs per hour, see record_demand
+BROTLI_QUALITY = 5 # most of the size win of 11 at a fraction of the cpu
+SCRAPE_LEASE_MS = 10 * 1000 # kept alive while scraping, so a dead scraper is replaced this fast
+SCRAPE_RESULT_TTL = 30 # seconds a published scrape stays up for tasks waiting on it
+SCRAPE_POLL_INTERVAL = 0.25 # seconds between checks for a published scrape
+SCRAPER_DOWN = "down" # published instead of listings when the scrape failed
+
+scrape_flights = SingleFlight()
+refresh_tasks: set[asyncio.Task] = set() # background refreshes, referenced until done
+
+# Appends the ids not in the key yet, scored from the zset's size so ranks stay dense and
+# concurrent writers can't interleave, and stores every body in today's hash so the newest copy
+# of a posting is served. A refresh instead rebuilds the key with the window of ranks it rescraped
+# replaced by the new ids, dropping postings that are gone, and renumbers the ranks after it.
+# Either way each written id's scrape time is recorded, which is what goes stale. A new key lives
+# for the hard ttl and a refresh extends it another hard ttl, so a key that keeps being requested
+# never expires. A refresh therefore also moves the bodies of the ids it keeps into today's hash,
+# as fetch only looks in today's and yesterday's. A key that expired before its refresh finished
+# is left to the next miss.
+# KEYS: listing ids zset, today's bodies hash, yesterday's bodies hash, scrape times zset.
+# ARGV: hard ttl, bodies ttl, now, first rank of the refreshed window or -1 to append, its length,
+# then listing id and compressed body pairs. Returns how many ids were written
+CACHE_SCRIPT = """
+local now = tonumber(ARGV[3])
+local start = tonumber(ARGV[4])
+local created = redis.call('EXISTS', KEYS[1]) == 0
+local added = 0
+if start >= 0 and created then
+    return added
+end
+if start < 0 then
+    local next_score = redis.call('ZCARD', KEYS[1])
+    for i = 6, #ARGV, 2 do
+        redis.call('HSET', KEYS[2], ARGV[i], ARGV[i + 1])
+        if redis.call('ZADD', KEYS[1], 'NX', next_score, ARGV[i]) == 1 then
+            redis.call('ZADD', KEYS[4], now, ARGV[i])
+            next_score = next_score + 1
+            added = added + 1
+        end
+    end
+    if created and added > 0 then
+        redis.call('EXPIRE', KEYS[1], ARGV[1])
+    end
+else
+    local stop = start + tonumber(ARGV[5])
+    local ids = redis.call('ZRANGE', KEYS[1], 0, -1)
+    local placed = {}
+    for rank, id in ipairs(ids) do
+        if rank <= start or rank > stop then
+            placed[id] = true
+        end
+    end
+    local rebuilt = {}
+    for rank = 1, math.min(start, #ids) do
+        rebuilt[#rebuilt + 1] = ids[rank]
+    end
+    for i = 6, #ARGV, 2 do
+        redis.call('HSET', KEYS[2], ARGV[i], ARGV[i + 1])
+        if not placed[ARGV[i]] then
+            placed[ARGV[i]] = true
+            rebuilt[#rebuilt + 1] = ARGV[i]
+            redis.call('ZADD', KEYS[4], now, ARGV[i])
+            added = added + 1
+        end
+    end
+    for rank = start + 1, math.min(stop, #ids) do
+        if not placed[ids[rank]] then
+            redis.call('ZREM', KEYS[4], ids[rank])
+        end
+    end
+    for rank = stop + 1, #ids do
+        rebuilt[#rebuilt + 1] = ids[rank]
+    end
+    redis.call('DEL', KEYS[1])
+    for score, id in ipairs(rebuilt) do
+        redis.call('ZADD', KEYS[1], score - 1, id)
+        if redis.call('HEXISTS', KEYS[2], id) == 0 then
+            local body = redis.call('HGET', KEYS[3], id)
+            if body then
+                redis.call('HSET', KEYS[2], id, body)
+            end
+        end
+    end
+    redis.call('EXPIRE', KEYS[1], ARGV[1])
+end
+local ttl = redis.call('PTTL', KEYS[1])
+if ttl > 0 then
+    redis.call('PEXPIRE', KEYS[4], ttl)
+end
+redis.call('EXPIRE', KEYS[2], ARGV[2], 'NX')
+return added
+"""
 
 async def upload_resume(db: AsyncSession, user_id: uuid.UUID, file: io.BytesIO):
     """Parses resume with gemini worker, then updates it to db and returns parsed details"""
@@ -78,18 +182,23 @@ async def get_listings(
         cache_start = page * cache_size
         cache_end = (page + 1) * cache_size
         logger.info(f"Starting cache value: {cache_start}, Ending cache value: {cache_end}")
-        key = user.preference + (f"_{industry}" if industry else "")
+        key = listings_cache_key(user.preference, industry)
         logger.info(f"Using redis key {key}")
+        await record_demand(redis, user.preference, industry)
         result = await fetch(redis, key, cache_start, cache_end)
         logger.info(f"Number of cache hits: {len(result)}")
         if len(result) != cache_size:
-            api_start = (page * (cache_size // job_portals)) + (len(result) // job_portals)
-            api_end = cache_end // job_portals
-            api_result = await to_thread.run_sync(
-                sync_scrape_jobs, user.preference, api_start, api_end, industry
-            )
-            asyncio.create_task(cache(redis, api_result, key))
-            result = list(dict.fromkeys(result + api_result))
+            api_start, api_end = page_window(page, len(result), cache_size, job_portals)
+            try:
+                api_result = await scrape_once(redis, key, user.preference, api_start, api_end, industry)
+            except ScraperDown as e:
+                if not result:
+                    raise e
+                logger.warning(f"Scraper down, serving {len(result)} cached listings for {key}")
+                return result
+            result = unique_listings(result + api_result)
+        elif await is_stale(redis, key, result):
+            refresh_in_background(redis, key, user.preference, page, cache_size, job_portals, industry)
         logger.info(f"Total result size of {len(result)}")
         return result
     except NoResultFound:
@@ -100,31 +209,239 @@ async def get_listings(
         logger.error(f"Internship listings for {user_id} failed to be retrieved.")
         raise e
 
+def listings_cache_key(preference: str, industry: str | None = None):
+    """Name of the cached listings of a preference, optionally in one industry"""
+    return preference + (f"_{industry}" if industry else "")
+
+def page_window(page: int, cached: int, cache_size: int, job_portals: int):
+    """Scrape offsets that fill a page of cache_size holding cached listings, counted per portal
+    as every portal returns its share. The warmer scrapes the same windows, so it shares a
+    scrape with users missing the same page"""
+    return page * (cache_size // job_portals) + cached // job_portals, (page + 1) * cache_size // job_portals
+
+def demand_bucket(hour: int):
+    """Key of the zset counting requests per preference and industry in the given hour since epoch"""
+    return f"{DEMAND_KEY}:{hour}"
+
+async def record_demand(r: Redis, preference: str, industry: str | None = None):
+    """Counts a request for preference and industry in this hour's demand zset, so the cache
+    warmer can warm the most requested keys first. The pair is stored as a json array, as either
+    can contain the key's separator. Buckets expire after the demand window. Fails open"""
+    bucket = demand_bucket(int(time.time() // 3600))
+    key = listings_cache_key(preference, industry)
+    try:
+        async with r.pipeline() as pipe:
+            pipe.zincrby(bucket, 1, orjson.dumps([preference, industry]).decode())
+            pipe.expire(bucket, (settings.listings_demand_window_hours + 1) * 3600)
+            await pipe.execute()
+    except Exception as e:
+        logger.warning(f"Failed to record demand for listings key {key}. Cause: {e}")
+
+async def scrape_once(
+    r: Redis,
+    key: str,
+    preference: str,
+    start: int,
+    end: int,
+    industry: str | None = None
+):
+    """Scrapes the start to end window of key once however many requests miss it at the same time,
+    and caches the listings. Requests in this process share one call,
+    see scrape_across_tasks for the rest"""
+    return await scrape_flights.run(
+        f"{key}:{start}:{end}",
+        lambda: scrape_across_tasks(r, key, preference, start, end, industry)
+    )
+
+async def scrape_across_tasks(
+    r: Redis,
+    key: str,
+    preference: str,
+    start: int,
+    end: int,
+    industry: str | None = None
+):
+    """Scrapes the window if this task wins its lease, otherwise waits for the winner to publish
+    the result. Takes over if the winner dies, and scrapes uncoordinated if redis is unavailable"""
+    flight = f"scrape:{key}:{start}:{end}"
+    lease = None
+    try:
+        lease = LeaseLock(r, flight, SCRAPE_LEASE_MS)
+        # a task that dies mid scrape loses its lease within SCRAPE_LEASE_MS, so waiting
+        # longer than a full scrape after that means something else is wrong
+        give_up = time.monotonic() + TIMEOUT + SCRAPE_LEASE_MS / 1000
+        while time.monotonic() < give_up:
+            published = await r.get(f"{flight}:result")
+            if published == SCRAPER_DOWN:
+                raise ScraperDown
+            if published is not None:
+                logger.info(f"Using listings scraped by another task for {flight}")
+                return [InternshipListing(**listing) for listing in orjson.loads(published)]
+            if await lease.acquire():
+                break
+            await asyncio.sleep(SCRAPE_POLL_INTERVAL)
+    except ScraperDown as e:
+        raise e
+    except Exception as e:
+        logger.warning(f"Scrape coordination for {flight} unavailable, scraping anyway. Cause: {e}")
+    held = lease is not None and lease.held
+    keep_alive = asyncio.create_task(lease.keep_alive()) if held else None
+    try:
+        listings = await to_thread.run_sync(sync_scrape_jobs, preference, start, end, industry)
+        # awaited, it is one round trip next to a scrape and the warmer must not exit before it
+        await cache(r, listings, key)
+        if held:
+            await publish_scrape(r, flight, orjson.dumps([listing.model_dump(mode="json") for listing in listings]))
+        return listings
+    except ScraperDown as e:
+        if held:
+            await publish_scrape(r, flight, SCRAPER_DOWN)
+        raise e
+    finally:
+        if held:
+            keep_alive.cancel()
+            try:
+                await lease.release()
+            except Exception as e:
+                logger.warning(f"Failed to release scrape lease {flight}. Cause: {e}")
+
+async def is_stale(r: Redis, key: str, listings: list[InternshipListing]):
+    """Whether any of a page's listings was scraped longer than the soft ttl ago.
+    Fails closed to fresh, the key still hard expires"""
+    try:
+        scraped = await r.zmscore(scraped_key(key), [listing_id(listing) for listing in listings])
+        return time.time() - min(at or 0 for at in scraped) > CACHE_SOFT_EXPIRE
+    except Exception as e:
+        logger.warning(f"Failed to check freshness of listings key {key}. Cause: {e}")
+        return False
+
+def refresh_in_background(
+    r: Redis,
+    key: str,
+    preference: str,
+    page: int,
+    cache_size: int,
+    job_portals: int,
+    industry: str | None = None
+):
+    """Refreshes a stale page of key without holding up the request"""
+    task = asyncio.create_task(refresh(r, key, preference, page, cache_size, job_portals, industry))
+    refresh_tasks.add(task)
+    task.add_done_callback(refresh_tasks.discard)
+
+async def refresh(
+    r: Redis,
+    key: str,
+    preference: str,
+    page: int,
+    cache_size: int,
+    job_portals: int,
+    industry: str | None = None
+):
+    """Rescrapes a page and replaces it in the cache, if this task wins the page's refresh
+    lease. A failed refresh keeps the lease until it lapses, so stale hits don't retry it on
+    every request while the scraper is down"""
+    start = page * cache_size
+    lease = LeaseLock(r, f"refresh:{key}:{start}:{cache_size}", SCRAPE_LEASE_MS)
+    try:
+        if not await lease.acquire():
+            return
+        keep_alive = asyncio.create_task(lease.keep_alive())
+        try:
+            listings = await to_thread.run_sync(
+                sync_scrape_jobs, preference, *page_window(page, 0, cache_size, job_portals), industry
+            )
+        finally:
+            keep_alive.cancel()
+        await cache(r, listings, key, window=(start, cache_size))
+        await lease.release()
+        logger.info(f"Refreshed page {page} of listings key {key} with {len(listings)} listings")
+    except Exception as e:
+        logger.warning(f"Failed to refresh page {page} of listings key {key}, serving it stale. Cause: {e}")
+
+async def publish_scrape(r: Redis, flight: str, result: bytes | str):
+    """Publishes a scrape's listings, or SCRAPER_DOWN, for the tasks waiting on it"""
+    try:
+        await r.set(f"{flight}:result", result, ex=SCRAPE_RESULT_TTL)
+    except Exception as e:
+        logger.warning(f"Failed to publish scrape {flight}. Cause: {e}")
+
+def listings_key(key: str):
+    """Key of the zset of listing ids cached for a listings key, in page order"""
+    return f"listings:ids:{key}"
+
+def scraped_key(key: str):
+    """Key of the zset of when each listing id cached for a listings key was scraped"""
+    return f"listings:scraped:{key}"
+
+def bodies_key(day: int):
+    """Key of the hash of listing bodies cached on the given day since epoch. Keys expire within
+    CACHE_EXPIRE of their creation or last refresh, which moves the bodies they keep into that
+    day's hash, so every cached id has its body in today's or yesterday's"""
+    return f"{BODIES_KEY}:{day}"
+
+def encode_listing(listing: InternshipListing):
+    """Brotli compressed listing json, base64 encoded as the client decodes responses"""
+    return base64.b64encode(brotli.compress(listing.model_dump_json().encode(), quality=BROTLI_QUALITY)).decode()
+
+def decode_listing(body: str):
+    """Inverse of encode_listing"""
+    return InternshipListing.model_validate_json(brotli.decompress(base64.b64decode(body)))
+
 async def fetch(r: Redis, key: str, start: int, end: int):
-    """Fetches listings from redis cache for key. Returns empty list if none"""
+    """Fetches listings from redis cache for key, one HMGET hydrates the page's ids.
+    Only ids cached yesterday need a second one. Returns empty list if none"""
     try:
-        raw_result = await r.zrange(key, start, end - 1)
-        result = list(dict.fromkeys(InternshipListing(**json.loads(obj)) for obj in raw_result))
-        return result
+        ids = await r.zrange(listings_key(key), start, end - 1)
+        if not ids:
+            return []
+        today = int(time.time() // 86400)
+        bodies = await r.hmget(bodies_key(today), ids)
+        missing = [i for i, body in enumerate(bodies) if body is None]
+        if missing:
+            older = await r.hmget(bodies_key(today - 1), [ids[i] for i in missing])
+            for i, body in zip(missing, older):
+                bodies[i] = body
+        return unique_listings([decode_listing(body) for body in bodies if body is not None])
     except Exception as e:
         logger.error("Failed to retrieve cache listings for %s. Cause: %s", key, e, exc_info=True)
         return []
 
-async def cache(r: Redis, listings: list[InternshipListing], key: str):
-    """Sends listings to redis cache on zset and incr for each key and counts of key respectively"""
+def listing_id(listing: InternshipListing):
+    """Stable id of a listing, a posting keeps it when its other fields change"""
+    return hashlib.sha1(listing.job_url.encode()).hexdigest()
+
+def unique_listings(listings: list[InternshipListing]):
+    """Drops later copies of a posting, which can differ from the first in fields other than job_url"""
+    unique: dict[str, InternshipListing] = {}
+    for listing in listings:
+        unique.setdefault(listing_id(listing), listing)
+    return list(unique.values())
+
+async def cache(
+    r: Redis,
+    listings: list[InternshipListing],
+    key: str,
+    window: tuple[int, int] | None = None
+):
+    """Appends the ids of listings not already cached to key's zset and stores their bodies
+    once for all keys, in one atomic script, so a posting is only ever cached once per key
+    and pages stay full. Given the (first rank, length) window of a refreshed page,
+    replaces that page with listings instead, see CACHE_SCRIPT"""
+    if not listings:
+        return
     try:
-        new_count = await r.incrby(f"{key}_count", len(listings))
-        base_score = int(new_count) - len(listings)
-        mapping = dict()
-        for i, listing in enumerate(listings):
-            mapping[listing.model_dump_json()] = base_score + i
-        async with r.pipeline() as pipe:
-            pipe.zadd(key, mapping)
-            pipe.expire(key, CACHE_EXPIRE, nx=True)
-            pipe.incrby(f"{key}_count", len(listings))
-            pipe.expire(f"{key}_count", CACHE_EXPIRE, nx=True)
-            await pipe.execute()
-        logger.info(f"Successfully cached {len(listings)} with starting position {base_score} in key {key}")
+        script = r.register_script(CACHE_SCRIPT)
+        start, length = window if window is not None else (-1, 0)
+        args = [CACHE_EXPIRE, BODIES_EXPIRE, time.time(), start, length]
+        for listing in listings:
+            args += [listing_id(listing), encode_listing(listing)]
+        today = int(time.time() // 86400)
+        added = await script(
+            keys=[listings_key(key), bodies_key(today), bodies_key(today - 1), scraped_key(key)],
+            args=args
+        )
+        logger.info(f"Successfully cached {added} new of {len(listings)} listings in key {key}")
     except Exception as e:
         logger.error("Failed to cache listings for %s. Cause: %s", key, e, exc_info=True)
         return
@@ -1,63 +1,480 @@
 """Module dependencies for SQLAlchemy, user id, models and schemas for user applications"""
+from datetime import date, datetime, timedelta, timezone
+import csv
+import enum
+import io
 import uuid
 from collections import defaultdict
+from typing import Iterator, TextIO
 
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, and_, asc, func
-from sqlalchemy.exc import NoResultFound, StatementError
+from redis.asyncio import Redis
+from anyio import to_thread
+import orjson
+from sqlalchemy import (
+    Select, select, insert, update, delete, values, column, literal_column, cast, exists,
+    and_, or_, asc, desc, func, tuple_, extract, Date
+)
+from sqlalchemy.dialects.postgresql import insert as upsert
+from sqlalchemy.exc import NoResultFound, StatementError, IntegrityError
+from pydantic import ValidationError
 
 from app.models.application_status import UserApplication
+from app.models.user_application_counts import UserApplicationCounts
+from app.models.application_status_event import ApplicationStatusEvent
+from app.models.user import User
 from app.schemas.application_status import (
     UserApplicationBase,
     UserApplicationCreate,
     GetUserApplication,
     UserApplicationModify,
     ApplicationStatusEnum,
-    ApplicationStatusCounts
+    ApplicationStatusCounts,
+    ApplicationFilters,
+    ApplicationSortKey,
+    SortOrder,
+    ApplicationBatch,
+    ApplicationBatchResult,
+    BatchItemResult,
+    ExportFormat,
+    DeadlineWindow,
+    ApplicationAnalytics,
+    FunnelStage,
+    WeeklyActivity,
+    ApplicationImportResult,
+    ImportRejection,
+    DEFAULT_PAGE_SIZE,
+    IMPORT_BATCH_SIZE,
+    MAX_IMPORT_ROWS
+)
+from app.exceptions.application_exceptions import (
+    NoApplicationFound,
+    InvalidApplication,
+    InvalidCursor,
+    InvalidImport,
+    ImportTooLarge
 )
-from app.exceptions.application_exceptions import NoApplicationFound, InvalidApplication
+from app.core.cursor import encode_cursor, decode_cursor
+from app.core.application_cache import application_cache
+from app.core.ics import render_calendar
 from app.core.logger import setup_custom_logger
 from app.core.timer import timed
 
 logger = setup_custom_logger(__name__)
 
+SORT_COLUMNS = {
+    ApplicationSortKey.ID: UserApplication.id,
+    ApplicationSortKey.CREATED_AT: UserApplication.created_at,
+    ApplicationSortKey.ACTION_DEADLINE: UserApplication.action_deadline
+}
+
+# user_application_counts column of each status
+STATUS_COUNT_COLUMNS = {status: status.value.lower() for status in ApplicationStatusEnum}
+
+# columns a client can write, in the order they appear in batch VALUES lists
+WRITABLE_COLUMNS = ("company_name", "role_name", "location", "status", "action_deadline", "notes")
+
+def to_naive_utc(value: datetime):
+    """Converts a datetime to naive UTC, which is how the db stores them"""
+    if value.tzinfo is None:
+        return value
+    return value.astimezone(timezone.utc).replace(tzinfo=None)
+
+def application_values(application: UserApplicationBase):
+    """Returns the column values of an incoming application, deadlines are stored without tz"""
+    row = application.model_dump(include=set(WRITABLE_COLUMNS))
+    if row["action_deadline"]:
+        row["action_deadline"] = row["action_deadline"].replace(tzinfo=None)
+    return row
+
+# generated by migration 9e3b7c1d4a58 on postgres only, so it is not mapped on UserApplication
+SEARCH_VECTOR = literal_column("application_statuses.search_vector")
+SEARCH_CONFIG = literal_column("'english'::regconfig")
+SEARCHED_COLUMNS = ("company_name", "role_name", "location", "notes")
+
+def escape_like(value: str):
+    """Lowercases value and escapes LIKE wildcards in it with /"""
+    return value.lower().replace("/", "//").replace("%", "/%").replace("_", "/_")
+
+def prefix_pattern(prefix: str):
+    """Returns a case insensitive LIKE pattern matching prefix literally. Built here rather than
+    in SQL so postgres sees a constant prefix and can use the text_pattern_ops indexes"""
+    return f"{escape_like(prefix)}%"
+
+def build_search_query(user_id: uuid.UUID, terms: str, limit: int, offset: int, postgres: bool) -> Select:
+    """Builds the query for one page of a user's applications matching terms. On postgres it is
+    a ranked full text search backed by the GIN index on search_vector, terms use web search
+    syntax (quotes, or, -). Elsewhere every word must appear in one of the searched columns"""
+    stmt = select(UserApplication).where(UserApplication.user_id == user_id)
+    if postgres:
+        tsquery = func.websearch_to_tsquery(SEARCH_CONFIG, terms)
+        stmt = stmt.where(SEARCH_VECTOR.op("@@")(tsquery)).order_by(
+            desc(func.ts_rank_cd(SEARCH_VECTOR, tsquery)), UserApplication.id
+        )
+    else:
+        for word in terms.split():
+            pattern = f"%{escape_like(word)}%"
+            stmt = stmt.where(or_(*(
+                func.lower(getattr(UserApplication, name)).like(pattern, escape="/")
+                for name in SEARCHED_COLUMNS
+            )))
+        stmt = stmt.order_by(UserApplication.id)
+    return stmt.limit(limit).offset(offset)
+
+def build_applications_query(
+    user_id: uuid.UUID,
+    filters: ApplicationFilters,
+    limit: int,
+    cursor: str | None = None
+) -> Select:
+    """Builds the query for one page of a user's filtered applications, ordered by the sort key
+    then id. Each filter matches an index on application_statuses, and paging continues from
+    the (sort key, id) of the cursor so every page is an index range scan"""
+    stmt = select(UserApplication).where(UserApplication.user_id == user_id)
+    if filters.status:
+        stmt = stmt.where(UserApplication.status.in_(filters.status))
+    if filters.company_prefix:
+        stmt = stmt.where(func.lower(UserApplication.company_name).like(
+            prefix_pattern(filters.company_prefix), escape="/"
+        ))
+    if filters.role_prefix:
+        stmt = stmt.where(func.lower(UserApplication.role_name).like(
+            prefix_pattern(filters.role_prefix), escape="/"
+        ))
+    if filters.created_after:
+        stmt = stmt.where(UserApplication.created_at >= to_naive_utc(filters.created_after))
+    if filters.created_before:
+        stmt = stmt.where(UserApplication.created_at < to_naive_utc(filters.created_before))
+    if filters.deadline_after:
+        stmt = stmt.where(UserApplication.action_deadline >= to_naive_utc(filters.deadline_after))
+    if filters.deadline_before:
+        stmt = stmt.where(UserApplication.action_deadline < to_naive_utc(filters.deadline_before))
+    if filters.sort_by == ApplicationSortKey.ACTION_DEADLINE:
+        # also lets postgres use the partial deadline index
+        stmt = stmt.where(UserApplication.action_deadline.isnot(None))
+    column = SORT_COLUMNS[filters.sort_by]
+    descending = filters.order == SortOrder.DESC
+    if cursor is not None:
+        position = decode_cursor(cursor)
+        try:
+            if position.get("sort", ApplicationSortKey.ID.value) != filters.sort_by.value \
+                or position.get("order", SortOrder.ASC.value) != filters.order.value:
+                raise InvalidCursor
+            last_id = int(position["id"])
+            if filters.sort_by == ApplicationSortKey.ID:
+                key, bound = UserApplication.id, last_id
+            else:
+                key = tuple_(column, UserApplication.id)
+                bound = tuple_(datetime.fromisoformat(position["value"]), last_id)
+        except (KeyError, TypeError, ValueError) as e:
+            raise InvalidCursor from e
+        stmt = stmt.where(key < bound if descending else key > bound)
+    direction = desc if descending else asc
+    if filters.sort_by != ApplicationSortKey.ID:
+        stmt = stmt.order_by(direction(column))
+    return stmt.order_by(direction(UserApplication.id)).limit(limit)
+
+def build_deadlines_query(user_id: uuid.UUID, window: DeadlineWindow) -> Select:
+    """Builds the query for a window of a user's deadlines, a range scan of the partial
+    (user_id, action_deadline, id) index that stops after limit rows"""
+    stmt = select(UserApplication).where(
+        UserApplication.user_id == user_id,
+        UserApplication.action_deadline.isnot(None)
+    )
+    if window.start is not None:
+        stmt = stmt.where(UserApplication.action_deadline >= to_naive_utc(window.start))
+    if window.end is not None:
+        stmt = stmt.where(UserApplication.action_deadline < to_naive_utc(window.end))
+    return stmt.order_by(asc(UserApplication.action_deadline), asc(UserApplication.id)).limit(window.limit)
+
+def deadline_window_key(window: DeadlineWindow):
+    """Names a window in cache keys, equal windows given in different time zones share a name"""
+    bounds = [to_naive_utc(bound).isoformat() if bound else "" for bound in (window.start, window.end)]
+    return f"{bounds[0]}/{bounds[1]}/{window.limit}"
+
+def days_between(start, end, postgres: bool):
+    """SQL expression for the days from start to end"""
+    if postgres:
+        return extract("epoch", end - start) / 86400
+    return func.julianday(end) - func.julianday(start)
+
+def week_of(moment, postgres: bool):
+    """SQL expression for the Monday starting the week of moment. The week unit is a
+    literal so GROUP BY and the select list render the same expression"""
+    if postgres:
+        return cast(func.date_trunc(literal_column("'week'"), moment), Date)
+    return func.date(moment, literal_column("'weekday 0'"), literal_column("'-6 days'"))
+
+def build_funnel_query(user_id: uuid.UUID, postgres: bool) -> Select:
+    """Builds the query for, per status, how many of a user's applications ever reached it and
+    the mean days they stayed. LEAD over each application's history gives when it left each
+    status, statuses it is still in have none and are left out of the mean"""
+    left_at = func.lead(ApplicationStatusEvent.changed_at).over(
+        partition_by=ApplicationStatusEvent.application_id,
+        order_by=(ApplicationStatusEvent.changed_at, ApplicationStatusEvent.id)
+    )
+    stints = select(
+        ApplicationStatusEvent.application_id,
+        ApplicationStatusEvent.to_status,
+        ApplicationStatusEvent.changed_at,
+        left_at.label("left_at")
+    ).where(ApplicationStatusEvent.user_id == user_id).subquery("stints")
+    # a deletion ends the stint before it, but is not a stage itself
+    return select(
+        stints.c.to_status,
+        func.count(func.distinct(stints.c.application_id)).label("reached"),
+        func.avg(days_between(stints.c.changed_at, stints.c.left_at, postgres)).label("mean_days")
+    ).where(stints.c.to_status.isnot(None)).group_by(stints.c.to_status)
+
+def build_weekly_query(user_id: uuid.UUID, since: datetime, postgres: bool) -> Select:
+    """Builds the query for a user's applications created, status changes and applications deleted
+    per week since since, with a running total of applications created"""
+    week = week_of(ApplicationStatusEvent.changed_at, postgres)
+    created = func.count().filter(ApplicationStatusEvent.from_status.is_(None))
+    return select(
+        week.label("week"),
+        created.label("created"),
+        func.count().filter(
+            ApplicationStatusEvent.from_status.isnot(None),
+            ApplicationStatusEvent.to_status.isnot(None)
+        ).label("status_changes"),
+        func.count().filter(ApplicationStatusEvent.to_status.is_(None)).label("deleted"),
+        func.sum(created).over(order_by=week).label("cumulative_created")
+    ).where(
+        ApplicationStatusEvent.user_id == user_id,
+        ApplicationStatusEvent.changed_at >= since
+    ).group_by(week).order_by(week)
+
+def cursor_after(application: UserApplication, filters: ApplicationFilters):
+    """Returns the cursor of the page that starts after application"""
+    position = {"id": application.id}
+    if filters.sort_by != ApplicationSortKey.ID or filters.order != SortOrder.ASC:
+        position["sort"] = filters.sort_by.value
+        position["order"] = filters.order.value
+    if filters.sort_by != ApplicationSortKey.ID:
+        position["value"] = getattr(application, filters.sort_by.value).isoformat()
+    return encode_cursor(position)
+
+EXPORT_CHUNK_ROWS = 500
+EXPORT_COLUMNS = ("id", "company_name", "role_name", "location", "status", "created_at", "action_deadline", "notes")
+
+def csv_value(value):
+    """Formats a column value for a CSV cell"""
+    if value is None:
+        return ""
+    if isinstance(value, enum.Enum):
+        return value.value
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+async def stream_applications(db: AsyncSession, export_format: ExportFormat, user_id: uuid.UUID | None = None):
+    """Yields applications in id order as NDJSON or CSV, one chunk per EXPORT_CHUNK_ROWS rows.
+    Rows come from a server side cursor, so memory stays flat however many rows there are.
+    Exports one user's applications, or everyone's (with user_id as a column) if user_id is None"""
+    names = EXPORT_COLUMNS if user_id is not None else ("user_id", *EXPORT_COLUMNS)
+    stmt = (
+        select(*(getattr(UserApplication, name) for name in names))
+        .order_by(UserApplication.id)
+        .execution_options(yield_per=EXPORT_CHUNK_ROWS)
+    )
+    if user_id is not None:
+        stmt = stmt.where(UserApplication.user_id == user_id)
+    exported = 0
+    try:
+        if export_format == ExportFormat.CSV:
+            header = io.StringIO()
+            csv.writer(header).writerow(names)
+            yield header.getvalue().encode()
+        result = await db.stream(stmt)
+        async for partition in result.partitions():
+            if export_format == ExportFormat.CSV:
+                chunk = io.StringIO()
+                csv.writer(chunk).writerows([csv_value(value) for value in row] for row in partition)
+                yield chunk.getvalue().encode()
+            else:
+                yield b"".join(orjson.dumps(row._asdict()) + b"\n" for row in partition)
+            exported += len(partition)
+        logger.info(f"Exported {exported} internship applications for {user_id or 'all users'}.")
+    except Exception as e:
+        # headers are already sent, so all that is left is to log and cut the stream short
+        logger.error(f"Export for {user_id or 'all users'} failed after {exported} rows. Cause: {e}")
+        raise e
+
+REQUIRED_IMPORT_COLUMNS = ("company_name", "role_name", "location", "status")
+# columns written by an import, in the order COPY receives them
+IMPORT_COLUMNS = ("user_id", "created_at", *WRITABLE_COLUMNS)
+
+def read_import_batches(file: TextIO) -> Iterator[list[tuple[int, dict]]]:
+    """Streams (line number, row) batches of IMPORT_BATCH_SIZE from a CSV with a header row.
+    Blank cells are read as missing. Raises InvalidImport if the file can't be read as CSV
+    and ImportTooLarge once it goes past MAX_IMPORT_ROWS"""
+    try:
+        reader = csv.DictReader(file)
+        missing = [name for name in REQUIRED_IMPORT_COLUMNS if name not in (reader.fieldnames or ())]
+        if missing:
+            raise InvalidImport(f"missing columns {', '.join(missing)}")
+        batch = []
+        # header is line 1
+        for line, row in enumerate(reader, start=2):
+            if line - 1 > MAX_IMPORT_ROWS:
+                raise ImportTooLarge
+            batch.append((line, {name: value for name, value in row.items() if name and value not in (None, "")}))
+            if len(batch) == IMPORT_BATCH_SIZE:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+    except (csv.Error, UnicodeDecodeError) as e:
+        raise InvalidImport(str(e)) from e
+
+def next_import_batch(batches: Iterator[list[tuple[int, dict]]], user_id: uuid.UUID, created_at: datetime):
+    """Reads and validates the next batch of an import, or returns None once the file is done.
+    Blocking, run it off the event loop. Returns (rows to copy, their statuses, rejections)"""
+    batch = next(batches, None)
+    if batch is None:
+        return None
+    rows = []
+    statuses = []
+    rejected = []
+    for line, raw in batch:
+        try:
+            application = UserApplicationCreate.model_validate(raw)
+        except ValidationError as e:
+            rejected.append(ImportRejection(
+                line=line,
+                errors=e.errors(include_url=False, include_input=False, include_context=False)
+            ))
+            continue
+        row = application_values(application)
+        # COPY sends the enum's value as is, the column stores the value
+        row["status"] = application.status.value
+        rows.append({"user_id": user_id, "created_at": created_at, **row})
+        statuses.append(application.status)
+    return rows, statuses, rejected
+
+async def count_statuses(db: AsyncSession, user_ids: list[uuid.UUID]):
+    """Counts each user's applications of each status from application_statuses itself"""
+    counts = {user_id: dict.fromkeys(STATUS_COUNT_COLUMNS.values(), 0) for user_id in user_ids}
+    stmt = (
+        select(UserApplication.user_id, UserApplication.status, func.count())
+        .where(UserApplication.user_id.in_(user_ids))
+        .group_by(UserApplication.user_id, UserApplication.status)
+    )
+    for user_id, status, count in (await db.execute(stmt)).all():
+        counts[user_id][STATUS_COUNT_COLUMNS[ApplicationStatusEnum(status)]] = count
+    return counts
+
+@timed("Application count reconciliation")
+async def reconcile_application_counts(db: AsyncSession, batch_size: int = 500, redis: Redis | None = None):
+    """Recounts every user's applications in batches of users and repairs counters that drifted,
+    e.g. from writes made outside the app. Returns the number of users repaired"""
+    count_columns = [getattr(UserApplicationCounts, name) for name in STATUS_COUNT_COLUMNS.values()]
+    last_user_id = None
+    repaired = 0
+    while True:
+        stmt = select(User.id).order_by(User.id).limit(batch_size)
+        if last_user_id is not None:
+            stmt = stmt.where(User.id > last_user_id)
+        user_ids = (await db.scalars(stmt)).all()
+        if not user_ids:
+            break
+        last_user_id = user_ids[-1]
+        try:
+            # lock the counters before recounting, so a concurrent write either commits
+            # before the recount sees it or waits and applies its delta on top of the repair
+            stored = {
+                row.user_id: {name: getattr(row, name) for name in STATUS_COUNT_COLUMNS.values()}
+                for row in (await db.execute(
+                    select(UserApplicationCounts.user_id, *count_columns)
+                    .where(UserApplicationCounts.user_id.in_(user_ids))
+                    .with_for_update()
+                )).all()
+            }
+            actual = await count_statuses(db, user_ids)
+            drifted = [
+                {"user_id": user_id, **counts}
+                for user_id, counts in actual.items() if stored.get(user_id) != counts
+            ]
+            if drifted:
+                stmt = upsert(UserApplicationCounts).values(drifted)
+                stmt = stmt.on_conflict_do_update(
+                    index_elements=[UserApplicationCounts.user_id],
+                    set_={name: stmt.excluded[name] for name in STATUS_COUNT_COLUMNS.values()}
+                )
+                await db.execute(stmt)
+                logger.warning(f"Repaired drifted application counts for {len(drifted)} users.")
+            await db.commit()
+            for row in drifted:
+                await application_cache.bump(redis, row["user_id"])
+            repaired += len(drifted)
+        except Exception as e:
+            await db.rollback()
+            logger.error(f"Failed to reconcile application counts after {last_user_id}.")
+            raise e
+    return repaired
+
 class UserApplications:
     """Service for user applications"""
-    def __init__(self, db: AsyncSession):
+    def __init__(self, db: AsyncSession, redis: Redis | None = None):
         self.__db = db
+        self.__redis = redis
 
-    def __copy_from_schema_to_model(
-            self,
-            app_input: UserApplicationBase,
-            output: UserApplication
-    ):
-        """Used to safely update incoming applications"""
-        for key, value in app_input.model_dump().items():
-            setattr(output, key, value)
-        if app_input.action_deadline:
-            setattr(output, "action_deadline", app_input.action_deadline.replace(tzinfo=None))
-        return output
+    async def __update_counts(self, user_id: uuid.UUID, removed=(), added=()):
+        """Moves the user's status counters by the removed and added statuses,
+        in the caller's transaction so counts commit or roll back with the rows"""
+        deltas = defaultdict(int)
+        for status in removed:
+            deltas[ApplicationStatusEnum(status)] -= 1
+        for status in added:
+            deltas[ApplicationStatusEnum(status)] += 1
+        changes = {
+            name: getattr(UserApplicationCounts, name) + deltas[status]
+            for status, name in STATUS_COUNT_COLUMNS.items() if deltas[status]
+        }
+        if changes:
+            await self.__db.execute(
+                update(UserApplicationCounts)
+                .where(UserApplicationCounts.user_id == user_id)
+                .values(changes)
+            )
+
+    async def __record_status_changes(self, user_id: uuid.UUID, changes: list[tuple[int, str | None, str]]):
+        """Appends a status event for every (application id, old status, new status) that really
+        changed, old status None for a created application and new status None for a deleted one.
+        In the caller's transaction"""
+        events = [
+            {
+                "application_id": application_id,
+                "user_id": user_id,
+                "from_status": ApplicationStatusEnum(old) if old is not None else None,
+                "to_status": ApplicationStatusEnum(new) if new is not None else None
+            }
+            for application_id, old, new in changes
+            if old is None or new is None or ApplicationStatusEnum(old) != ApplicationStatusEnum(new)
+        ]
+        if events:
+            # core insert on the table, the ORM would split rows into a statement per set of NULL columns
+            await self.__db.execute(insert(ApplicationStatusEvent.__table__), events)
 
     @timed("Application creation")
     async def create_application(self, application: UserApplicationCreate, id_user: uuid.UUID):
-        """Creates user application"""
-        if application.action_deadline:
-            application.action_deadline = application.action_deadline.replace(tzinfo=None)
-        user_application = UserApplication(
-            user_id=id_user,
-            company_name=application.company_name,
-            role_name=application.role_name,
-            location=application.location,
-            status=application.status,
-            action_deadline=application.action_deadline,
-            notes=application.notes
-        )
+        """Creates user application with a single INSERT ... RETURNING"""
         try:
-            self.__db.add(user_application)
+            stmt = (
+                insert(UserApplication)
+                .values(user_id=id_user, **application_values(application))
+                .returning(UserApplication)
+            )
+            user_application = (await self.__db.scalars(stmt)).one()
+            # validate before commit expires the returned row
+            created = GetUserApplication.model_validate(user_application)
+            await self.__update_counts(id_user, added=[created.status])
+            await self.__record_status_changes(id_user, [(created.id, None, created.status)])
             await self.__db.commit()
-            await self.__db.refresh(user_application)
+            await application_cache.bump(self.__redis, id_user)
             logger.info(f"Internship application for {id_user} created.")
-            return GetUserApplication.model_validate(user_application)
+            return created
         except StatementError as e:
             # means given status input is not in enum
             await self.__db.rollback()
@@ -91,69 +508,131 @@ class UserApplications:
             raise e
 
     @timed("Fetching all user applications")
-    async def get_all_applications(self, user_id: uuid.UUID):
-        """Gets all user's applications"""
+    async def get_all_applications(self,
+        user_id: uuid.UUID,
+        limit: int = DEFAULT_PAGE_SIZE,
+        cursor: str | None = None,
+        filters: ApplicationFilters | None = None
+    ):
+        """Gets a page of user's applications matching filters (id order by default),
+        starting after cursor. Returns the page and the cursor of the next page,
+        which is None on the last page"""
+        filters = filters or ApplicationFilters()
         try:
-            stmt = select(UserApplication).where(user_id == UserApplication.user_id)
+            # fetch one extra row to know if there is a next page without a count query
+            stmt = build_applications_query(user_id, filters, limit + 1, cursor)
             result = await self.__db.execute(stmt)
             user_applications = result.scalars().all()
-            logger.info(f"Retrieved all {user_id}'s internship applications.")
-            return user_applications
+            next_cursor = None
+            if len(user_applications) > limit:
+                user_applications = user_applications[:limit]
+                next_cursor = cursor_after(user_applications[-1], filters)
+            logger.info(f"Retrieved a page of {user_id}'s internship applications.")
+            return user_applications, next_cursor
+        except InvalidCursor:
+            logger.warning(f"Invalid cursor given by {user_id}.")
+            raise
         except Exception as e:
             await self.__db.rollback()
             logger.error(f"Failed to retrieve {user_id}'s internship applications.")
             raise e
 
-    @timed("Fetching all user applications with deadlines")
-    async def get_all_deadlines(self, user_id: uuid.UUID):
-        """Gets all user's deadlines, in ascending order"""
+    @timed("Searching user applications")
+    async def search_applications(self, user_id: uuid.UUID, terms: str, limit: int, offset: int = 0):
+        """Gets a page of user's applications matching terms, best matches first on postgres"""
         try:
-            stmt = select(UserApplication).where(
-                and_(
-                    user_id == UserApplication.user_id,
-                    UserApplication.action_deadline.isnot(None)
-                )
-            ).order_by(asc(UserApplication.action_deadline))
+            postgres = self.__db.bind.dialect.name == "postgresql"
+            stmt = build_search_query(user_id, terms, limit, offset, postgres)
             result = await self.__db.execute(stmt)
             user_applications = result.scalars().all()
-            logger.info(f"Retrieved all {user_id}'s internship applications with deadlines.")
+            logger.info(f"Searched {user_id}'s internship applications.")
+            return user_applications
+        except Exception as e:
+            await self.__db.rollback()
+            logger.error(f"Failed to search {user_id}'s internship applications.")
+            raise e
+
+    @timed("Fetching all user applications with deadlines")
+    async def get_all_deadlines(self, user_id: uuid.UUID, window: DeadlineWindow | None = None):
+        """Gets user's deadlines within the window, in ascending order"""
+        window = window or DeadlineWindow()
+        name = f"deadlines:{deadline_window_key(window)}"
+        generation, cached = await application_cache.get(self.__redis, user_id, name)
+        if cached is not None:
+            return [GetUserApplication.model_validate(application) for application in cached]
+        try:
+            result = await self.__db.execute(build_deadlines_query(user_id, window))
+            user_applications = [
+                GetUserApplication.model_validate(application) for application in result.scalars().all()
+            ]
+            await application_cache.put(
+                self.__redis, user_id, name, generation,
+                [application.model_dump() for application in user_applications]
+            )
+            logger.info(f"Retrieved {user_id}'s internship applications with deadlines.")
             return user_applications
         except Exception as e:
             await self.__db.rollback()
             logger.error(f"Failed to retrieve {user_id}'s internship applications with deadlines.")
             raise e
 
+    @timed("Deadline calendar retrieval")
+    async def get_deadline_calendar(self, user_id: uuid.UUID, window: DeadlineWindow | None = None):
+        """Gets user's deadlines within the window as an iCalendar feed, rendered once per generation"""
+        window = window or DeadlineWindow()
+        name = f"calendar:{deadline_window_key(window)}"
+        generation, cached = await application_cache.get(self.__redis, user_id, name)
+        if cached is not None:
+            return cached
+        applications = await self.get_all_deadlines(user_id, window)
+        calendar = render_calendar(applications, datetime.now(timezone.utc))
+        await application_cache.put(self.__redis, user_id, name, generation, calendar)
+        return calendar
+
     @timed("Modifying application")
     async def modify_application(self,
         incoming_application: UserApplicationModify,
         user_id: uuid.UUID
     ):
-        """Modifies a user's application"""
+        """Modifies a user's application with a single UPDATE ... RETURNING,
+        which also returns the old status on postgres so the counters can be moved"""
         try:
-            stmt = select(UserApplication).where(
-                and_(
-                        incoming_application.id == UserApplication.id,
-                        user_id == UserApplication.user_id
-                    )
+            stmt = (
+                update(UserApplication)
+                .values(application_values(incoming_application))
+                .execution_options(synchronize_session=False, populate_existing=True)
             )
-            result = await self.__db.execute(stmt)
-            current_application = result.scalar_one()
-            new_application = self.__copy_from_schema_to_model(
-                incoming_application,
-                current_application
+            owned = and_(
+                UserApplication.id == incoming_application.id,
+                UserApplication.user_id == user_id
             )
+            if self.__db.bind.dialect.name == "postgresql":
+                # the locked subquery still sees the row as it was before this UPDATE
+                old = select(UserApplication.id, UserApplication.status).where(owned).with_for_update().subquery("old")
+                stmt = stmt.where(UserApplication.id == old.c.id).returning(UserApplication, old.c.status)
+                row, old_status = (await self.__db.execute(stmt)).one()
+            else:
+                # sqlite RETURNING cannot see the FROM clause, so read the old status first
+                old_status = (await self.__db.execute(
+                    select(UserApplication.status).where(owned).with_for_update()
+                )).scalar_one()
+                row = (await self.__db.scalars(stmt.where(owned).returning(UserApplication))).one()
+            new_application = GetUserApplication.model_validate(row)
+            await self.__update_counts(user_id, removed=[old_status], added=[new_application.status])
+            await self.__record_status_changes(user_id, [(new_application.id, old_status, new_application.status)])
             await self.__db.commit()
-            await self.__db.refresh(new_application)
+            await application_cache.bump(self.__redis, user_id)
             logger.info(f"Internship application {incoming_application.id} for {user_id} updated.")
-            return GetUserApplication.model_validate(new_application)
+            return new_application
         except NoResultFound:
             # see above, could be possible uuid is invalid
             await self.__db.rollback()
+            logger.warning(f"Internship application {incoming_application.id} for {user_id} cannot be found.")
             raise NoApplicationFound from NoResultFound
         except StatementError as e:
-        # means given status input is not in enum
+            # means given status input is not in enum
             await self.__db.rollback()
-            logger.warning(f"Internship application {incoming_application.id} for {user_id} cannot be found.")
+            logger.warning(f"Internship application {incoming_application.id} for {user_id} is invalid.")
             raise InvalidApplication from e
         except Exception as e:
             await self.__db.rollback()
@@ -162,15 +641,20 @@ class UserApplications:
 
     @timed("Deleting application")
     async def delete_application(self, application_id: int, user_id: uuid.UUID):
-        """Gets a user's application given application id"""
+        """Deletes a user's application given application id with a single DELETE ... RETURNING,
+        and records the deletion in its status history"""
         try:
-            stmt = select(UserApplication).where(
-                and_(application_id == UserApplication.id, user_id == UserApplication.user_id)
+            stmt = (
+                delete(UserApplication)
+                .where(UserApplication.id == application_id, UserApplication.user_id == user_id)
+                .returning(UserApplication.status)
+                .execution_options(synchronize_session=False)
             )
-            result = await self.__db.execute(stmt)
-            user_application = result.scalar_one()
-            await self.__db.delete(user_application)
+            old_status = (await self.__db.scalars(stmt)).one()
+            await self.__update_counts(user_id, removed=[old_status])
+            await self.__record_status_changes(user_id, [(application_id, old_status, None)])
             await self.__db.commit()
+            await application_cache.bump(self.__redis, user_id)
             logger.info(f"Internship application {application_id} for {user_id} deleted.")
         except NoResultFound:
             # note that it is possible the user's id is invalid, but I dont want to separate
@@ -183,26 +667,284 @@ class UserApplications:
             logger.error(f"Internship application {application_id} for {user_id} failed to be deleted.")
             raise e
 
+    async def __modify_many(self, applications: list[UserApplicationModify], user_id: uuid.UUID):
+        """Updates applications owned by user, returns the updated rows by id"""
+        if not applications:
+            return {}
+        table = UserApplication.__table__
+        if self.__db.bind.dialect.name == "postgresql":
+            # one UPDATE joined against the incoming rows
+            incoming = values(
+                column("id", table.c.id.type),
+                *(column(name, table.c[name].type) for name in WRITABLE_COLUMNS),
+                name="incoming"
+            ).data([
+                (application.id, *application_values(application).values())
+                for application in applications
+            ])
+            stmt = (
+                update(UserApplication)
+                .where(UserApplication.id == incoming.c.id, UserApplication.user_id == user_id)
+                # a VALUES column that is all NULL is typed as text, so cast back to the column type
+                .values({name: cast(incoming.c[name], table.c[name].type) for name in WRITABLE_COLUMNS})
+                .returning(UserApplication)
+                .execution_options(synchronize_session=False, populate_existing=True)
+            )
+            return {row.id: row for row in (await self.__db.scalars(stmt)).all()}
+        # sqlite cannot name the columns of a VALUES list, so update row by row
+        updated = {}
+        for application in applications:
+            stmt = (
+                update(UserApplication)
+                .where(UserApplication.id == application.id, UserApplication.user_id == user_id)
+                .values(application_values(application))
+                .returning(UserApplication)
+                .execution_options(synchronize_session=False, populate_existing=True)
+            )
+            row = (await self.__db.scalars(stmt)).one_or_none()
+            if row is not None:
+                updated[row.id] = row
+        return updated
+
+    @timed("Applying application batch")
+    async def apply_batch(self, batch: ApplicationBatch, user_id: uuid.UUID):
+        """Creates, modifies then deletes a user's applications in one transaction,
+        with one statement per kind of operation. Ids that the user does not own are
+        reported as not found instead of failing the batch"""
+        try:
+            created = []
+            if batch.create:
+                created = (await self.__db.scalars(
+                    insert(UserApplication).returning(UserApplication, sort_by_parameter_order=True),
+                    [{"user_id": user_id, **application_values(application)} for application in batch.create]
+                )).all()
+            old_statuses = {}
+            if batch.modify:
+                # locked so the counters move from the status each row really had
+                old_statuses = dict((await self.__db.execute(
+                    select(UserApplication.id, UserApplication.status)
+                    .where(
+                        UserApplication.user_id == user_id,
+                        UserApplication.id.in_([application.id for application in batch.modify])
+                    )
+                    .with_for_update()
+                )).all())
+            modified = await self.__modify_many(batch.modify, user_id)
+            deleted = {}
+            if batch.delete:
+                deleted = dict((await self.__db.execute(
+                    delete(UserApplication)
+                    .where(UserApplication.user_id == user_id, UserApplication.id.in_(batch.delete))
+                    .returning(UserApplication.id, UserApplication.status)
+                    .execution_options(synchronize_session=False)
+                )).all())
+            await self.__update_counts(
+                user_id,
+                removed=[old_statuses[application_id] for application_id in modified] + list(deleted.values()),
+                added=[row.status for row in created] + [row.status for row in modified.values()]
+            )
+            await self.__record_status_changes(
+                user_id,
+                [(row.id, None, row.status) for row in created]
+                + [(application_id, old_statuses[application_id], row.status) for application_id, row in modified.items()]
+                + [(application_id, old_status, None) for application_id, old_status in deleted.items()]
+            )
+            result = ApplicationBatchResult(
+                create=[
+                    BatchItemResult(id=row.id, outcome="created", application=GetUserApplication.model_validate(row))
+                    for row in created
+                ],
+                modify=[
+                    BatchItemResult(
+                        id=application.id,
+                        outcome="modified",
+                        application=GetUserApplication.model_validate(modified[application.id])
+                    ) if application.id in modified else BatchItemResult(id=application.id, outcome="not_found")
+                    for application in batch.modify
+                ],
+                delete=[
+                    BatchItemResult(id=application_id, outcome="deleted" if application_id in deleted else "not_found")
+                    for application_id in batch.delete
+                ]
+            )
+            await self.__db.commit()
+            await application_cache.bump(self.__redis, user_id)
+            logger.info(
+                f"Applied batch of {len(created)} creates, {len(modified)} modifies "
+                f"and {len(deleted)} deletes for {user_id}."
+            )
+            return result
+        except StatementError as e:
+            # means given status input is not in enum
+            await self.__db.rollback()
+            logger.warning(f"Application batch for {user_id} is invalid.")
+            raise InvalidApplication from e
+        except Exception as e:
+            await self.__db.rollback()
+            logger.error(f"Application batch for {user_id} failed to be applied.")
+            raise e
+
+    async def __copy_applications(self, rows: list[dict]):
+        """Loads rows with COPY on Postgres and a batched INSERT elsewhere,
+        in the session's transaction either way"""
+        if self.__db.bind.dialect.name == "postgresql":
+            connection = await (await self.__db.connection()).get_raw_connection()
+            await connection.driver_connection.copy_records_to_table(
+                UserApplication.__tablename__,
+                records=[tuple(row[name] for name in IMPORT_COLUMNS) for row in rows],
+                columns=IMPORT_COLUMNS
+            )
+            return
+        # core insert on the table, the ORM would split rows into a statement per set of NULL columns
+        await self.__db.execute(insert(UserApplication.__table__), rows)
+
+    @timed("Application import")
+    async def import_applications(self, file: TextIO, user_id: uuid.UUID):
+        """Imports applications from a CSV, validating and loading IMPORT_BATCH_SIZE rows at a time.
+        Batches are read and validated in a worker thread, so the event loop keeps serving.
+        Valid rows are imported in one transaction and invalid ones reported back by line"""
+        try:
+            # asyncpg only opens the transaction on a statement, so this runs first for COPY to
+            # join it, and concurrent imports for the user take turns on the counters
+            await self.__db.execute(
+                select(UserApplicationCounts.user_id)
+                .where(UserApplicationCounts.user_id == user_id)
+                .with_for_update()
+            )
+            created_at = datetime.now(timezone.utc).replace(tzinfo=None)
+            statuses = []
+            rejected = []
+            batches = read_import_batches(file)
+            # reading and validating a big upload would stall every other request on the loop
+            while (parsed := await to_thread.run_sync(next_import_batch, batches, user_id, created_at)) is not None:
+                rows, batch_statuses, batch_rejected = parsed
+                statuses += batch_statuses
+                rejected += batch_rejected
+                if rows:
+                    await self.__copy_applications(rows)
+            await self.__update_counts(user_id, added=statuses)
+            if statuses:
+                # COPY returns no ids, so read back the rows this import created
+                await self.__db.execute(insert(ApplicationStatusEvent.__table__).from_select(
+                    ["application_id", "user_id", "to_status", "changed_at"],
+                    select(
+                        UserApplication.id,
+                        UserApplication.user_id,
+                        UserApplication.status,
+                        UserApplication.created_at
+                    ).where(
+                        UserApplication.user_id == user_id,
+                        UserApplication.created_at == created_at,
+                        ~exists().where(ApplicationStatusEvent.application_id == UserApplication.id)
+                    )
+                ))
+            await self.__db.commit()
+            if statuses:
+                await application_cache.bump(self.__redis, user_id)
+            logger.info(f"Imported {len(statuses)} internship applications for {user_id}, rejected {len(rejected)}.")
+            return ApplicationImportResult(imported=len(statuses), rejected=rejected)
+        except (InvalidImport, ImportTooLarge) as e:
+            await self.__db.rollback()
+            logger.warning(f"Application import for {user_id} was refused. Cause: {e!r}")
+            raise e
+        except Exception as e:
+            await self.__db.rollback()
+            logger.error(f"Application import for {user_id} failed.")
+            raise e
+
+    @timed("Application analytics retrieval")
+    async def get_analytics(self, user_id: uuid.UUID, weeks: int):
+        """Gets a user's status funnel and activity for the last weeks weeks from the status history"""
+        today = datetime.now(timezone.utc).date()
+        since = today - timedelta(days=today.weekday(), weeks=weeks - 1)
+        # the window moves every Monday, so it is part of the name as well as the generation
+        name = f"analytics:{weeks}:{since.isoformat()}"
+        generation, cached = await application_cache.get(self.__redis, user_id, name)
+        if cached is not None:
+            return ApplicationAnalytics.model_validate(cached)
+        try:
+            postgres = self.__db.bind.dialect.name == "postgresql"
+            stages = {
+                ApplicationStatusEnum(row.to_status): row
+                for row in (await self.__db.execute(build_funnel_query(user_id, postgres))).all()
+            }
+            total = (await self.__db.execute(
+                select(func.count(func.distinct(ApplicationStatusEvent.application_id)))
+                .where(ApplicationStatusEvent.user_id == user_id)
+            )).scalar_one()
+            funnel = [
+                FunnelStage(
+                    status=status,
+                    reached=stages[status].reached if status in stages else 0,
+                    share=stages[status].reached / total if status in stages else 0.0,
+                    mean_days=round(stages[status].mean_days, 2)
+                        if status in stages and stages[status].mean_days is not None else None
+                )
+                for status in ApplicationStatusEnum
+            ]
+            rows = (await self.__db.execute(build_weekly_query(
+                user_id, datetime.combine(since, datetime.min.time()), postgres
+            ))).all()
+            # sqlite's date() comes back as text
+            by_week = {date.fromisoformat(row.week) if isinstance(row.week, str) else row.week: row for row in rows}
+            weekly = []
+            cumulative = 0
+            for offset in range(weeks):
+                week = since + timedelta(weeks=offset)
+                row = by_week.get(week)
+                cumulative = row.cumulative_created if row is not None else cumulative
+                weekly.append(WeeklyActivity(
+                    week=week,
+                    created=row.created if row is not None else 0,
+                    status_changes=row.status_changes if row is not None else 0,
+                    deleted=row.deleted if row is not None else 0,
+                    cumulative_created=cumulative
+                ))
+            analytics = ApplicationAnalytics(funnel=funnel, weekly=weekly)
+            await application_cache.put(self.__redis, user_id, name, generation, analytics.model_dump(mode="json"))
+            logger.info(f"Computed {user_id}'s application analytics.")
+            return analytics
+        except Exception as e:
+            await self.__db.rollback()
+            logger.error(f"Failed to compute {user_id}'s application analytics.")
+            raise e
+
     @timed("Application statistics retrieval")
     async def get_statistics(self, user_id: uuid.UUID):
-        """Gets counts of each application status"""
+        """Gets counts of each application status from the user's counters,
+        recounting and storing them if the user has none yet"""
+        generation, cached = await application_cache.get(self.__redis, user_id, "stats")
+        if cached is not None:
+            return ApplicationStatusCounts.model_validate(cached)
         try:
-            stmt = (
-                    select(UserApplication.status, func.count())
-                    .where(UserApplication.user_id == user_id)
-                    .group_by(UserApplication.status)
-                )
-            result = await self.__db.execute(stmt)
-            rows = result.all()
-            raw_counts = defaultdict(int, {status: count for status, count in rows}) # ensures 0 if a status is not retrieved
-            application_stats = {
-                status.value.lower(): raw_counts[status.value] for status in ApplicationStatusEnum
-            }
+            count_columns = [getattr(UserApplicationCounts, name) for name in STATUS_COUNT_COLUMNS.values()]
+            stmt = select(*count_columns).where(UserApplicationCounts.user_id == user_id)
+            row = (await self.__db.execute(stmt)).one_or_none()
+            if row is not None:
+                application_stats = row._asdict()
+            else:
+                application_stats = (await count_statuses(self.__db, [user_id]))[user_id]
+                await self.__store_counts(user_id, application_stats)
             total = sum(application_stats.values())
             application_stats["total"] = total
+            await application_cache.put(self.__redis, user_id, "stats", generation, application_stats)
             logger.info(f"Internship application stats for {user_id} retrieved.")
             return ApplicationStatusCounts.model_validate(application_stats)
         except Exception as e:
             await self.__db.rollback()
             logger.error(f"Internship application stats for {user_id} failed to be retrieved.")
             raise e
+
+    async def __store_counts(self, user_id: uuid.UUID, counts: dict[str, int]):
+        """Stores recounted counters for a user without any, a concurrent store wins"""
+        try:
+            await self.__db.execute(
+                upsert(UserApplicationCounts)
+                .values(user_id=user_id, **counts)
+                .on_conflict_do_nothing(index_elements=[UserApplicationCounts.user_id])
+            )
+            await self.__db.commit()
+            logger.warning(f"Rebuilt missing application counts for {user_id}.")
+        except IntegrityError:
+            # user was deleted in the meantime, the counts are still right for this response
+            await self.__db.rollback()
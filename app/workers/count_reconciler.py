@@ -0,0 +1,31 @@
+"""Modules for repairing drifted user_application_counts, e.g. after manual fixes in the db.
+
+Usage: python -m app.workers.count_reconciler [--batch-size 500] [--interval 3600]
+Runs once, or every interval seconds if given"""
+import argparse
+import asyncio
+
+from app.db.database import SessionLocal
+from app.dependencies.redis_client import get_redis
+from app.services.user_applications_service import reconcile_application_counts
+from app.core.logger import setup_custom_logger
+
+logger = setup_custom_logger(__name__)
+
+async def reconcile(batch_size: int, interval: int | None):
+    """Reconciles every user's counters, forever every interval seconds if given"""
+    while True:
+        async with SessionLocal() as db:
+            # bumps repaired users so their cached stats are not served
+            repaired = await reconcile_application_counts(db, batch_size, get_redis())
+        logger.info(f"Application count reconciliation repaired {repaired} users.")
+        if interval is None:
+            return
+        await asyncio.sleep(interval)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Repair drifted application status counters")
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--interval", type=int, default=None, help="seconds between runs, runs once if omitted")
+    args = parser.parse_args()
+    asyncio.run(reconcile(args.batch_size, args.interval))
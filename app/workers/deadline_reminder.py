@@ -0,0 +1,181 @@
+"""Modules for reminding users of their upcoming application deadlines.
+
+Usage: python -m app.workers.deadline_reminder [--horizon-hours 24] [--interval 300] [--batch-size 500] [--sink log] [--once]
+Every interval, whichever task holds the lease publishes one reminder for each deadline in the
+next horizon hours to the application_reminders redis stream, or to the log with --sink log.
+Can also run inside the API tasks with the reminder_scheduler setting"""
+import argparse
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+from redis.asyncio import Redis
+from sqlalchemy import Row, Select, select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.db.database import SessionLocal
+from app.dependencies.redis_client import get_redis
+from app.models.application_status import UserApplication
+from app.core.lease_lock import LeaseLock
+from app.core.config import get_settings
+from app.core.logger import setup_custom_logger
+from app.core.timer import timed
+
+logger = setup_custom_logger(__name__)
+
+settings = get_settings()
+
+REMINDER_STREAM = "application_reminders"
+REMINDER_STREAM_MAXLEN = 100000 # approximate, consumers are expected to keep up
+LEASE_NAME = "deadline_reminder"
+SENT_GRACE = 3600 # seconds a sent mark outlives its deadline
+
+# marks the deadline as reminded and publishes the reminder in one step, so each deadline is
+# published exactly once however many scans see it. A moved deadline is a new deadline
+PUBLISH_SCRIPT = """
+if redis.call('SET', KEYS[1], 1, 'NX', 'EX', ARGV[1]) then
+    redis.call('XADD', KEYS[2], 'MAXLEN', '~', ARGV[2], '*', unpack(ARGV, 3))
+    return 1
+end
+return 0
+"""
+
+def reminder_fields(row: Row):
+    """Returns the stream entry of a reminder"""
+    return {
+        "application_id": str(row.id),
+        "user_id": str(row.user_id),
+        "company_name": row.company_name,
+        "role_name": row.role_name,
+        "action_deadline": row.action_deadline.isoformat()
+    }
+
+class RedisStreamSink:
+    """Publishes reminders to the reminder stream, each deadline once"""
+    def __init__(self, redis: Redis):
+        self.__redis = redis
+        self.__publish = redis.register_script(PUBLISH_SCRIPT)
+
+    async def publish(self, rows: list[Row], now: datetime):
+        """Publishes a batch of reminders in one round trip, returns how many were new"""
+        async with self.__redis.pipeline(transaction=False) as pipe:
+            for row in rows:
+                fields = reminder_fields(row)
+                ttl = int((row.action_deadline - now).total_seconds()) + SENT_GRACE
+                await self.__publish(
+                    keys=[f"reminders:sent:{row.id}:{fields['action_deadline']}", REMINDER_STREAM],
+                    args=[max(ttl, 1), REMINDER_STREAM_MAXLEN, *(item for pair in fields.items() for item in pair)],
+                    client=pipe
+                )
+            results = await pipe.execute()
+        return sum(int(result) for result in results)
+
+class LogSink:
+    """Logs reminders instead, for running locally. Only remembers what it sent in process"""
+    def __init__(self):
+        self.__sent: set[tuple[int, datetime]] = set()
+
+    async def publish(self, rows: list[Row], now: datetime):
+        """Logs the reminders not logged before, returns how many were new"""
+        published = 0
+        for row in rows:
+            if (row.id, row.action_deadline) in self.__sent:
+                continue
+            self.__sent.add((row.id, row.action_deadline))
+            published += 1
+            logger.info(f"Deadline reminder: {reminder_fields(row)}")
+        return published
+
+def build_reminder_query(
+    start: datetime,
+    end: datetime,
+    after: tuple[datetime, int] | None,
+    batch_size: int
+) -> Select:
+    """Builds the query for the next batch of deadlines in [start, end) after the
+    (action_deadline, id) of the previous batch, a range scan of the global deadline index"""
+    stmt = select(
+        UserApplication.id,
+        UserApplication.user_id,
+        UserApplication.company_name,
+        UserApplication.role_name,
+        UserApplication.action_deadline
+    ).where(
+        UserApplication.action_deadline >= start,
+        UserApplication.action_deadline < end
+    )
+    if after is not None:
+        stmt = stmt.where(tuple_(UserApplication.action_deadline, UserApplication.id) > after)
+    return stmt.order_by(UserApplication.action_deadline, UserApplication.id).limit(batch_size)
+
+@timed("Deadline reminder scan")
+async def scan_deadlines(
+    db: AsyncSession,
+    sink: RedisStreamSink | LogSink,
+    now: datetime,
+    horizon: timedelta,
+    batch_size: int,
+    lease: LeaseLock | None = None
+):
+    """Publishes a reminder for every deadline between now and now + horizon, batch by batch.
+    Only rows in the window are read, so a scan costs the same however big the table gets.
+    Renews the lease between batches and stops if it was lost. Returns (scanned, published)"""
+    start = now.astimezone(timezone.utc).replace(tzinfo=None)
+    after = None
+    scanned = published = 0
+    try:
+        while True:
+            rows = (await db.execute(build_reminder_query(start, start + horizon, after, batch_size))).all()
+            scanned += len(rows)
+            if rows:
+                published += await sink.publish(rows, start)
+            if len(rows) < batch_size:
+                break
+            after = (rows[-1].action_deadline, rows[-1].id)
+            if lease is not None and not await lease.renew():
+                logger.warning(f"Deadline reminder lease lost after {scanned} deadlines, stopping scan.")
+                break
+    finally:
+        # don't hold the read transaction open until the next scan
+        await db.rollback()
+    return scanned, published
+
+async def schedule_reminders(
+    interval: int,
+    horizon_hours: int,
+    batch_size: int,
+    sink_name: str,
+    once: bool = False
+):
+    """Scans for upcoming deadlines every interval seconds while holding the lease,
+    tasks without the lease skip the scan"""
+    redis = get_redis()
+    sink = LogSink() if sink_name == "log" else RedisStreamSink(redis)
+    lease = LeaseLock(redis, LEASE_NAME, settings.reminder_lease_ttl * 1000)
+    while True:
+        try:
+            if await lease.acquire():
+                try:
+                    async with SessionLocal() as db:
+                        scanned, published = await scan_deadlines(
+                            db, sink, datetime.now(timezone.utc), timedelta(hours=horizon_hours), batch_size, lease
+                        )
+                    logger.info(f"Deadline reminder scan saw {scanned} deadlines, published {published}.")
+                finally:
+                    await lease.release()
+            else:
+                logger.debug("Another task holds the deadline reminder lease, skipping scan.")
+        except Exception as e:
+            logger.error(f"Deadline reminder scan failed. Cause: {e}")
+        if once:
+            return
+        await asyncio.sleep(interval)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Publish reminders of upcoming application deadlines")
+    parser.add_argument("--horizon-hours", type=int, default=settings.reminder_horizon_hours)
+    parser.add_argument("--interval", type=int, default=settings.reminder_interval)
+    parser.add_argument("--batch-size", type=int, default=settings.reminder_batch_size)
+    parser.add_argument("--sink", choices=["redis", "log"], default=settings.reminder_sink)
+    parser.add_argument("--once", action="store_true", help="scan once and exit")
+    args = parser.parse_args()
+    asyncio.run(schedule_reminders(args.interval, args.horizon_hours, args.batch_size, args.sink, args.once))
@@ -43,7 +43,7 @@ ROLE_LIST = [
     "Solutions Engineering",
     "Software QA",
     "Automation",
-    "System Admin"
+    "System Admin",
 
     # Business, Finance & Consulting
     "Business Analyst",
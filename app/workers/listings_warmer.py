@@ -0,0 +1,143 @@
+"""Modules for keeping the first pages of internship listings keys cached ahead of demand,
+so users rarely wait on the scraper.
+
+Usage: python -m app.workers.listings_warmer [--interval 900] [--pages 3] [--max-scrapes 20] [--once]
+Keys are warmed most requested first over the last listings_demand_window_hours, then every role in
+ROLE_LIST, then every role in the most requested industries. Can also run inside the API tasks
+with the listings_warmer setting"""
+import argparse
+import asyncio
+import time
+from collections import defaultdict
+
+from redis.asyncio import Redis
+import orjson
+
+from app.dependencies.redis_client import get_redis
+from app.services.internship_listings_service import (
+    scrape_once, demand_bucket, listings_key, listings_cache_key, page_window
+)
+from app.schemas.internship_listings import PAGE_LENGTH, ACTIVE_PORTALS
+from app.exceptions.internship_listings_exceptions import ScraperDown
+from app.workers.internship_roles import ROLE_LIST
+from app.workers.job_scraper import TIMEOUT
+from app.core.lease_lock import LeaseLock
+from app.core.config import get_settings
+from app.core.logger import setup_custom_logger
+from app.core.timer import timed
+
+logger = setup_custom_logger(__name__)
+
+settings = get_settings()
+
+LEASE_NAME = "listings_warmer"
+LEASE_TTL_MS = TIMEOUT * 2 * 1000 # renewed after every scrape, which can take up to TIMEOUT
+
+def rank_warm_keys(demand: dict[tuple[str, str | None], float], roles: list[str], industries: int):
+    """Orders (preference, industry) pairs to warm: requested pairs by recent demand, then every
+    role, then every role in the industries most requested overall"""
+    industry_demand: dict[str, float] = defaultdict(float)
+    for (_, industry), score in demand.items():
+        if industry:
+            industry_demand[industry] += score
+    popular = sorted(industry_demand, key=lambda industry: -industry_demand[industry])[:industries]
+    requested = sorted(demand, key=lambda pair: -demand[pair])
+    return list(dict.fromkeys(
+        requested + [(role, None) for role in roles] + [(role, industry) for industry in popular for role in roles]
+    ))
+
+def warm_windows(size: int, pages: int):
+    """Scrape windows that fill the first pages of a key holding size listings, page by page
+    with get_listings' offsets so a user missing one of those pages shares its scrape"""
+    return [
+        page_window(page, max(size - page * PAGE_LENGTH, 0), PAGE_LENGTH, ACTIVE_PORTALS)
+        for page in range(size // PAGE_LENGTH, pages)
+    ]
+
+async def recent_demand(redis: Redis, window_hours: int):
+    """Returns requests per (preference, industry) summed over the hourly buckets in the window"""
+    hour = int(time.time() // 3600)
+    buckets = [demand_bucket(bucket) for bucket in range(hour - window_hours + 1, hour + 1)]
+    demand = {}
+    for member, score in await redis.zunion(buckets, withscores=True):
+        try:
+            preference, industry = orjson.loads(member)
+        except (orjson.JSONDecodeError, ValueError, TypeError):
+            # recorded before demand was kept as pairs, ages out with the window
+            continue
+        demand[(preference, industry)] = float(score)
+    return demand
+
+@timed("Listings cache warming")
+async def warm_listings(
+    redis: Redis,
+    pages: int,
+    max_scrapes: int,
+    industries: int,
+    window_hours: int,
+    lease: LeaseLock | None = None
+):
+    """Tops up the first pages of listings keys in priority order, one page window per scrape
+    and at most max_scrapes scrapes. Keys that are already full cost one pipelined ZCARD.
+    Returns the number of scrapes"""
+    pairs = rank_warm_keys(await recent_demand(redis, window_hours), ROLE_LIST, industries)
+    async with redis.pipeline(transaction=False) as pipe:
+        for preference, industry in pairs:
+            pipe.zcard(listings_key(listings_cache_key(preference, industry)))
+        sizes = await pipe.execute()
+    scrapes = 0
+    for (preference, industry), size in zip(pairs, sizes):
+        key = listings_cache_key(preference, industry)
+        for start, end in warm_windows(size, pages):
+            if scrapes == max_scrapes:
+                return scrapes
+            scrapes += 1
+            scraper_down = False
+            try:
+                listings = await scrape_once(redis, key, preference, start, end, industry)
+                logger.info(f"Warmed listings key {key} window {start}:{end} with {len(listings)} listings.")
+            except ScraperDown:
+                logger.warning(f"Scraper failed while warming listings key {key}, moving on.")
+                scraper_down = True
+            if lease is not None and not await lease.renew():
+                logger.warning("Listings warmer lease lost, stopping run.")
+                return scrapes
+            if scraper_down:
+                break
+    return scrapes
+
+async def schedule_warming(interval: int, pages: int, max_scrapes: int, once: bool = False):
+    """Warms listings every interval seconds while holding the lease, tasks without it skip the run"""
+    redis = get_redis()
+    lease = LeaseLock(redis, LEASE_NAME, LEASE_TTL_MS)
+    while True:
+        try:
+            if await lease.acquire():
+                try:
+                    scrapes = await warm_listings(
+                        redis,
+                        pages,
+                        max_scrapes,
+                        settings.listings_warm_industries,
+                        settings.listings_demand_window_hours,
+                        lease
+                    )
+                    logger.info(f"Listings warmer run finished with {scrapes} scrapes.")
+                finally:
+                    await lease.release()
+            else:
+                logger.debug("Another task holds the listings warmer lease, skipping run.")
+        except Exception as e:
+            logger.error(f"Listings warmer run failed. Cause: {e}")
+        if once:
+            return
+        await asyncio.sleep(interval)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Keep popular internship listings cached ahead of demand")
+    parser.add_argument("--interval", type=int, default=settings.listings_warm_interval)
+    parser.add_argument("--pages", type=int, default=settings.listings_warm_pages)
+    parser.add_argument("--max-scrapes", type=int, default=settings.listings_warm_max_scrapes)
+    parser.add_argument("--once", action="store_true", help="warm once and exit")
+    args = parser.parse_args()
+    asyncio.run(schedule_warming(args.interval, args.pages, args.max_scrapes, args.once))
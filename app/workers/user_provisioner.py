@@ -0,0 +1,128 @@
+"""Modules for bulk registering users from a CSV or JSONL file, e.g. a career office import.
+
+Usage: python -m app.workers.user_provisioner users.csv [--batch-size 500] [--workers 4] [--report out.jsonl]
+Rows need name, email and password. Writes one JSON result per input row to the report (stdout by default)"""
+import argparse
+import asyncio
+import csv
+import json
+import os
+import sys
+from typing import Iterator, TextIO
+
+from pydantic import ValidationError
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert as upsert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.db.database import SessionLocal
+from app.models.user import User
+from app.models.user_application_counts import UserApplicationCounts
+from app.schemas.user import UserCreate
+from app.core.process_pool import HashingPool
+from app.core.password_hasher import hash_password, get_parameters, configure_hasher
+from app.core.logger import setup_custom_logger
+from app.core.timer import timed
+
+logger = setup_custom_logger(__name__)
+
+def read_rows(file: TextIO, is_csv: bool) -> Iterator[tuple[int, dict]]:
+    """Streams (line number, row) from a CSV or JSONL file. JSONL lines that are not objects
+    come back as an error row, so they are reported invalid instead of failing the run"""
+    if is_csv:
+        # header is line 1
+        for line, row in enumerate(csv.DictReader(file), start=2):
+            yield line, row
+        return
+    for line, raw in enumerate(file, start=1):
+        if raw.strip():
+            try:
+                parsed = json.loads(raw)
+            except json.JSONDecodeError as e:
+                yield line, {"error": str(e)}
+                continue
+            yield line, parsed if isinstance(parsed, dict) else {"error": "not a JSON object"}
+
+@timed("User provisioning batch")
+async def provision_batch(db: AsyncSession, batch: list[tuple[int, dict]], pool: HashingPool):
+    """Validates, hashes in parallel and inserts a batch of users in one statement.
+    Returns a result per row, duplicates are reported instead of failing the batch"""
+    results = []
+    valid: dict[str, tuple[int, UserCreate]] = {}
+    for line, row in batch:
+        try:
+            user = UserCreate.model_validate(row)
+        except ValidationError as e:
+            results.append({"line": line, "email": row.get("email"), "status": "invalid",
+                "error": e.errors(include_url=False, include_input=False)})
+            continue
+        blank = [field for field in ("name", "email", "password") if not getattr(user, field).strip()]
+        if blank:
+            results.append({"line": line, "email": user.email, "status": "invalid", "error": f"blank {', '.join(blank)}"})
+            continue
+        if user.email in valid:
+            results.append({"line": line, "email": user.email, "status": "duplicate"})
+            continue
+        valid[user.email] = (line, user)
+    # skip hashing accounts that already exist, hashing is the expensive part
+    existing = set((await db.execute(
+        select(User.email).where(User.email.in_(valid.keys()))
+    )).scalars().all()) if valid else set()
+    to_create = [(line, user) for email, (line, user) in valid.items() if email not in existing]
+    hashes = await asyncio.gather(*(pool.run(hash_password, user.password) for _, user in to_create))
+    created = set()
+    if to_create:
+        stmt = upsert(User).values([
+            {"name": user.name, "email": user.email, "encrypted_password": hashed}
+            for (_, user), hashed in zip(to_create, hashes)
+        ]).on_conflict_do_nothing(index_elements=[User.email]).returning(User.id, User.email)
+        rows = (await db.execute(stmt)).all()
+        created = {email for _, email in rows}
+        if rows:
+            await db.execute(upsert(UserApplicationCounts).values([{"user_id": user_id} for user_id, _ in rows]))
+        await db.commit()
+    for email, (line, _) in valid.items():
+        results.append({"line": line, "email": email, "status": "created" if email in created else "duplicate"})
+    return sorted(results, key=lambda result: result["line"])
+
+async def provision(path: str, batch_size: int, workers: int, report: TextIO):
+    """Streams users from path into the db batch by batch"""
+    pool = HashingPool(workers, max_queue=batch_size)
+    parameters = get_parameters()
+    configure_hasher(parameters)
+    pool.start(initializer=configure_hasher, initargs=(parameters,))
+    counts = {"created": 0, "duplicate": 0, "invalid": 0}
+    async def flush(db: AsyncSession, batch: list[tuple[int, dict]]):
+        for result in await provision_batch(db, batch, pool):
+            counts[result["status"]] += 1
+            report.write(json.dumps(result) + "\n")
+    try:
+        with open(path, newline="", encoding="utf-8") as file:
+            rows = read_rows(file, path.lower().endswith(".csv"))
+            async with SessionLocal() as db:
+                batch = []
+                for row in rows:
+                    batch.append(row)
+                    if len(batch) == batch_size:
+                        await flush(db, batch)
+                        batch = []
+                if batch:
+                    await flush(db, batch)
+    finally:
+        pool.shutdown()
+    logger.info(f"Provisioning of {path} finished: {counts}")
+    return counts
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Bulk register users from a CSV or JSONL file")
+    parser.add_argument("path")
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--report", default=None, help="file to write per row results to, stdout if omitted")
+    args = parser.parse_args()
+    output = open(args.report, "w", encoding="utf-8") if args.report else sys.stdout
+    try:
+        asyncio.run(provision(args.path, args.batch_size, args.workers, output))
+    finally:
+        if output is not sys.stdout:
+            output.close()
@@ -0,0 +1,74 @@
+"""Benchmark of authenticated requests per second with db verification, the principal cache
+and stateless auth. Needs the same env variables as the app, the db is a throwaway sqlite file
+so the db figures flatter the real (networked) Postgres setup.
+
+Usage: python -m benchmarks.auth_throughput [requests] [concurrency]"""
+import asyncio
+import os
+import sys
+import time
+from unittest.mock import AsyncMock, patch
+
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from httpx import ASGITransport, AsyncClient
+from asgi_lifespan import LifespanManager
+
+from app.main import app
+from app.db.database import get_session
+from app.dependencies.redis_client import get_redis
+from app.dependencies.security import settings
+from app.core.principal_cache import principal_cache
+from app.models.base import Base
+
+DB_PATH = "auth_bench.db"
+
+async def run_requests(client: AsyncClient, token: str, total: int, concurrency: int):
+    """Fires total requests at /api/test_login, concurrency at a time, returns requests/sec"""
+    semaphore = asyncio.Semaphore(concurrency)
+    async def one():
+        async with semaphore:
+            res = await client.post("/api/test_login", headers={"Authorization": f"Bearer {token}"})
+            assert res.status_code == 200, res.text
+    start = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(total)))
+    return total / (time.perf_counter() - start)
+
+async def main(total: int, concurrency: int):
+    """Runs benchmark for every auth mode"""
+    engine = create_async_engine(url=f"sqlite+aiosqlite:///./{DB_PATH}")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    session_local = async_sessionmaker(autoflush=False, bind=engine)
+    async def override_session():
+        async with session_local() as db:
+            yield db
+    app.dependency_overrides[get_session] = override_session
+    # no redis needed, every tier of the caches copes without one
+    app.dependency_overrides[get_redis] = lambda: None
+    try:
+        async with LifespanManager(app) as manager:
+            async with AsyncClient(transport=ASGITransport(app=manager.app), base_url="http://bench") as client:
+                user = {"name": "bench", "email": "bench@example.com", "password": "password"}
+                await client.post("/api/register", json=user)
+                res = await client.post("/api/login", json={"email": user["email"], "password": user["password"]})
+                token = res.json()["access_token"]
+                with patch.object(principal_cache, "contains", AsyncMock(return_value=False)):
+                    db_rps = await run_requests(client, token, total, concurrency)
+                cached_rps = await run_requests(client, token, total, concurrency)
+                with patch.object(settings, "stateless_auth", True):
+                    stateless_rps = await run_requests(client, token, total, concurrency)
+        print(f"{total} requests, concurrency {concurrency}")
+        print(f"db lookup every request: {db_rps:8.1f} req/s")
+        print(f"principal cache:         {cached_rps:8.1f} req/s")
+        print(f"stateless auth:          {stateless_rps:8.1f} req/s")
+    finally:
+        app.dependency_overrides.clear()
+        await engine.dispose()
+        if os.path.exists(DB_PATH):
+            os.remove(DB_PATH)
+
+if __name__ == "__main__":
+    asyncio.run(main(
+        int(sys.argv[1]) if len(sys.argv) > 1 else 2000,
+        int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    ))
@@ -0,0 +1,117 @@
+"""Benchmark of the memory of the listings cache layouts on a synthetic dataset.
+
+Usage: python -m benchmarks.listings_memory_report [--listings 2000] [--keys 100] [--key-size 40] [--rescraped 0.5] [--redis]
+The old layout kept every listing's json in each key's zset next to a set of its ids, the new one
+keeps ids in the zsets and each compressed body in the hash of the day it was scraped. Two daily
+hashes are live at once, today's and yesterday's, so a posting scraped on both days is stored twice;
+--rescraped is the share of postings that were. Reports the payload bytes of both layouts, and
+with --redis the MEMORY USAGE of both written to the configured redis, cleaning up after"""
+import argparse
+import asyncio
+import datetime
+import random
+
+from redis.asyncio import Redis
+
+from app.dependencies.redis_client import get_redis
+from app.schemas.internship_listings import InternshipListing
+from app.services.internship_listings_service import listing_id, encode_listing
+
+REPORT_PREFIX = "listings_memory_report"
+WORDS = (
+    "intern team software data analyst engineering product design marketing finance research "
+    "support build ship learn mentor students experience python sql cloud customers growth "
+    "collaborate across teams own projects end to end communication skills required preferred "
+    "bachelor degree currently pursuing summer program remote hybrid office benefits stipend"
+).split()
+
+def synthetic_description(rng: random.Random):
+    """An html job description of a few kb, about what job boards return"""
+    def sentence():
+        return " ".join(rng.choice(WORDS) for _ in range(rng.randint(8, 20))).capitalize() + "."
+    paragraphs = "".join(f"<p>{' '.join(sentence() for _ in range(4))}</p>" for _ in range(rng.randint(3, 6)))
+    bullets = "".join(f"<li>{sentence()}</li>" for _ in range(rng.randint(5, 10)))
+    return f"<div>{paragraphs}<h3>Requirements</h3><ul>{bullets}</ul></div>"
+
+def synthetic_dataset(listings: int, keys: int, key_size: int, rescraped: float, seed: int = 0):
+    """Returns (listings, {key: listings in it}, [listings in yesterday's hash, listings in today's]).
+    Keys draw from one pool so postings repeat across keys, as the same posting matches several
+    roles and industries. Every posting was scraped yesterday, the rescraped share of them today too"""
+    rng = random.Random(seed)
+    pool = [
+        InternshipListing(
+            company=f"Company {i % 400}",
+            job_url=f"https://jobs.example.com/view/{i}",
+            title=f"{rng.choice(WORDS).capitalize()} {rng.choice(WORDS).capitalize()} Intern",
+            date_posted=datetime.datetime(2026, 1, 1) + datetime.timedelta(hours=i),
+            is_remote=rng.random() < 0.3,
+            company_industry=rng.choice(WORDS),
+            description=synthetic_description(rng)
+        )
+        for i in range(listings)
+    ]
+    keyed = {f"key_{k}": rng.sample(pool, min(key_size, listings)) for k in range(keys)}
+    return pool, keyed, [pool, rng.sample(pool, int(rescraped * listings))]
+
+def payload_bytes(
+    pool: list[InternshipListing],
+    keyed: dict[str, list[InternshipListing]],
+    days: list[list[InternshipListing]]
+):
+    """Bytes of members and values each layout stores, before redis' own overhead"""
+    old = sum(
+        len(listing.model_dump_json().encode()) + len(listing_id(listing))
+        for listings in keyed.values() for listing in listings
+    )
+    ids = sum(len(listing_id(listing)) for listings in keyed.values() for listing in listings)
+    bodies = sum(len(listing_id(listing)) + len(encode_listing(listing)) for day in days for listing in day)
+    return old, ids + bodies
+
+async def memory_usage(
+    redis: Redis,
+    keyed: dict[str, list[InternshipListing]],
+    days: list[list[InternshipListing]]
+):
+    """Writes both layouts under REPORT_PREFIX and returns their MEMORY USAGE in bytes"""
+    old_keys = []
+    new_keys = [f"{REPORT_PREFIX}:new:bodies:{day}" for day in range(len(days))]
+    try:
+        async with redis.pipeline(transaction=False) as pipe:
+            for key, listings in keyed.items():
+                old_keys += [f"{REPORT_PREFIX}:old:{key}", f"{REPORT_PREFIX}:old:{key}_ids"]
+                new_keys.append(f"{REPORT_PREFIX}:new:{key}")
+                pipe.zadd(old_keys[-2], {listing.model_dump_json(): i for i, listing in enumerate(listings)})
+                pipe.sadd(old_keys[-1], *(listing_id(listing) for listing in listings))
+                pipe.zadd(new_keys[-1], {listing_id(listing): i for i, listing in enumerate(listings)})
+            for hash_key, day in zip(new_keys, days):
+                if day:
+                    pipe.hset(hash_key, mapping={listing_id(listing): encode_listing(listing) for listing in day})
+            await pipe.execute()
+        async with redis.pipeline(transaction=False) as pipe:
+            for key in old_keys + new_keys:
+                pipe.memory_usage(key, samples=0)
+            usage = [size or 0 for size in await pipe.execute()]
+        return sum(usage[:len(old_keys)]), sum(usage[len(old_keys):])
+    finally:
+        await redis.delete(*old_keys, *new_keys)
+
+async def report(listings: int, keys: int, key_size: int, rescraped: float, use_redis: bool):
+    """Prints the payload, and optionally redis, memory of both layouts"""
+    pool, keyed, days = synthetic_dataset(listings, keys, key_size, rescraped)
+    rows = [("payload", *payload_bytes(pool, keyed, days))]
+    if use_redis:
+        rows.append(("redis MEMORY USAGE", *await memory_usage(get_redis(), keyed, days)))
+    print(f"{listings} listings, {keys} keys of {key_size}, {rescraped:.0%} rescraped today")
+    print(f"{'':<20}{'old':>14}{'new':>14}{'saved':>8}")
+    for name, old, new in rows:
+        print(f"{name:<20}{old:>14,}{new:>14,}{1 - new / old:>8.0%}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare the memory of the listings cache layouts")
+    parser.add_argument("--listings", type=int, default=2000)
+    parser.add_argument("--keys", type=int, default=100)
+    parser.add_argument("--key-size", type=int, default=40)
+    parser.add_argument("--rescraped", type=float, default=0.5, help="share of postings also scraped today")
+    parser.add_argument("--redis", action="store_true", help="also measure MEMORY USAGE on the configured redis")
+    args = parser.parse_args()
+    asyncio.run(report(args.listings, args.keys, args.key_size, args.rescraped, args.redis))
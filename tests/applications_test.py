@@ -1,14 +1,41 @@
 """Modules relevant for FastAPI testing"""
 from datetime import datetime, timedelta, timezone
 from typing import Optional
+from unittest.mock import patch
+import csv
+import io
+import json
+import os
+import uuid
 
 from fastapi import status
 from fastapi.encoders import jsonable_encoder
 from httpx import AsyncClient
 import pytest
 from pydantic import BaseModel
+from sqlalchemy import text, update, delete
+from sqlalchemy.ext.asyncio import create_async_engine
 
-from tests.conftest import UserTest, client, get_user_token
+from app.models.base import Base
+from app.schemas.application_status import ApplicationFilters, DeadlineWindow, GetUserApplication
+from app.core.ics import render_calendar
+from app.workers.deadline_reminder import LogSink, build_reminder_query, scan_deadlines
+from app.models.user_application_counts import UserApplicationCounts
+from app.services.user_applications_service import (
+    build_applications_query,
+    build_deadlines_query,
+    build_search_query,
+    reconcile_application_counts
+)
+from tests.conftest import (
+    UserTest,
+    FakeRedis,
+    client,
+    get_user_token,
+    create_mock_db,
+    sql_statements,
+    mock_redis
+)
 
 class UserApplication(BaseModel):
     """User Application constructor for tests"""
@@ -233,3 +260,490 @@ async def test_get_multiple_application_stats(client: AsyncClient, get_user_toke
     assert result.json()["total"] == 2
     assert result.json()["interview"] == 1
     assert result.json()["offered"] == 1
+
+@pytest.mark.asyncio
+async def test_paginate_applications(client: AsyncClient, get_user_token: str):
+    """Tests if applications are paged by cursor without gaps or repeats"""
+    headers = {"Authorization": f"Bearer {get_user_token}"}
+    first_page = await client.get("/api/all_applications", params={"limit": 1}, headers=headers)
+    assert first_page.status_code == status.HTTP_200_OK
+    assert len(first_page.json()) == 1
+    cursor = first_page.headers["X-Next-Cursor"]
+    second_page = await client.get("/api/all_applications",
+        params={"limit": 1, "cursor": cursor},
+        headers=headers
+    )
+    assert second_page.status_code == status.HTTP_200_OK
+    assert len(second_page.json()) == 1
+    assert second_page.json()[0]["id"] > first_page.json()[0]["id"]
+    assert "X-Next-Cursor" not in second_page.headers
+    bad_page = await client.get("/api/all_applications",
+        params={"cursor": "not a cursor"},
+        headers=headers
+    )
+    assert bad_page.status_code == status.HTTP_400_BAD_REQUEST
+
+@pytest.mark.asyncio
+async def test_filter_applications(client: AsyncClient, get_user_token: str):
+    """Tests if status, prefix and range filters are applied server side"""
+    headers = {"Authorization": f"Bearer {get_user_token}"}
+    by_status = await client.get("/api/all_applications",
+        params={"status": ["Offered", "Rejected"]},
+        headers=headers
+    )
+    assert by_status.status_code == status.HTTP_200_OK
+    assert [application["company_name"] for application in by_status.json()] == ["Melvin"]
+    by_prefix = await client.get("/api/all_applications",
+        params={"company_prefix": "sig", "role_prefix": "B"},
+        headers=headers
+    )
+    assert [application["company_name"] for application in by_prefix.json()] == ["Sigma"]
+    wildcard = await client.get("/api/all_applications",
+        params={"company_prefix": "%"},
+        headers=headers
+    )
+    assert wildcard.json() == []
+    by_deadline = await client.get("/api/all_applications",
+        params={"deadline_before": jsonable_encoder(datetime.now(timezone.utc) + timedelta(days=2, hours=12))},
+        headers=headers
+    )
+    assert [application["company_name"] for application in by_deadline.json()] == ["Melvin"]
+
+@pytest.mark.asyncio
+async def test_sort_applications_by_deadline(client: AsyncClient, get_user_token: str):
+    """Tests if applications can be paged in descending deadline order"""
+    headers = {"Authorization": f"Bearer {get_user_token}"}
+    params = {"sort_by": "action_deadline", "order": "desc", "limit": 1}
+    first_page = await client.get("/api/all_applications", params=params, headers=headers)
+    assert first_page.status_code == status.HTTP_200_OK
+    assert first_page.json()[0]["company_name"] == "Sigma"
+    second_page = await client.get("/api/all_applications",
+        params={**params, "cursor": first_page.headers["X-Next-Cursor"]},
+        headers=headers
+    )
+    assert second_page.json()[0]["company_name"] == "Melvin"
+    assert "X-Next-Cursor" not in second_page.headers
+    # cursors only make sense for the sort order they were made for
+    mismatched = await client.get("/api/all_applications",
+        params={"cursor": first_page.headers["X-Next-Cursor"]},
+        headers=headers
+    )
+    assert mismatched.status_code == status.HTTP_400_BAD_REQUEST
+
+@pytest.mark.skipif("TEST_POSTGRES_URL" not in os.environ, reason="needs a postgres database")
+@pytest.mark.asyncio
+async def test_filters_use_indexes():
+    """Tests if postgres plans every filter and sort key as an index scan"""
+    engine = create_async_engine(os.environ["TEST_POSTGRES_URL"])
+    user_id = uuid.uuid4()
+    cases = [
+        (ApplicationFilters(), "ix_application_statuses_user_id_id"),
+        (ApplicationFilters(status=["Applied", "Offered"]), "ix_application_statuses_user_id"),
+        (ApplicationFilters(company_prefix="Goo"), "ix_application_statuses_user_id_company_name"),
+        (ApplicationFilters(role_prefix="Soft"), "ix_application_statuses_user_id_role_name"),
+        (ApplicationFilters(sort_by="created_at", order="desc"), "ix_application_statuses_user_id_created_at"),
+        (ApplicationFilters(sort_by="action_deadline"), "ix_application_statuses_user_id_action_deadline")
+    ]
+    queries = [(build_applications_query(user_id, filters, 100), index) for filters, index in cases]
+    queries.append((
+        build_deadlines_query(user_id, DeadlineWindow(start=datetime.now(timezone.utc), limit=10)),
+        "ix_application_statuses_user_id_action_deadline"
+    ))
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    queries.append((
+        build_reminder_query(now, now + timedelta(hours=24), (now, 1), 500),
+        "ix_application_statuses_action_deadline_id"
+    ))
+    try:
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+            await conn.execute(text("SET LOCAL enable_seqscan = off"))
+            for query, index in queries:
+                stmt = query.compile(
+                    dialect=conn.dialect,
+                    compile_kwargs={"literal_binds": True}
+                )
+                plan = "\n".join((await conn.execute(text(f"EXPLAIN {stmt}"))).scalars().all())
+                assert "Seq Scan" not in plan
+                assert index in plan
+    finally:
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.drop_all)
+        await engine.dispose()
+
+@pytest.mark.asyncio
+async def test_application_batch(client: AsyncClient, get_user_token: str):
+    """Tests if a batch creates, modifies and deletes applications and reports each outcome"""
+    headers = {"Authorization": f"Bearer {get_user_token}"}
+    existing = (await client.get("/api/all_applications", headers=headers)).json()
+    new_application = UserApplication(company_name="Batch", role_name="Intern", location="SG", status="Applied")
+    modified = UserApplicationModify(**{**existing[0], "status": "Rejected"})
+    missing = UserApplicationModify(**{**existing[0], "id": 999999})
+    result = await client.post("/api/applications/batch",
+        json=jsonable_encoder({
+            "create": [new_application.model_dump()],
+            "modify": [modified.model_dump(), missing.model_dump()],
+            "delete": [existing[1]["id"], 999999]
+        }),
+        headers=headers
+    )
+    assert result.status_code == status.HTTP_200_OK
+    body = result.json()
+    assert body["create"][0]["outcome"] == "created"
+    assert body["create"][0]["application"]["company_name"] == "Batch"
+    assert [item["outcome"] for item in body["modify"]] == ["modified", "not_found"]
+    assert body["modify"][0]["application"]["status"] == "Rejected"
+    assert [item["outcome"] for item in body["delete"]] == ["deleted", "not_found"]
+    stats = await client.get("/api/application_stats", headers=headers)
+    assert stats.json()["total"] == 2
+    assert stats.json()["rejected"] == 1
+    assert stats.json()["applied"] == 1
+    duplicate = await client.post("/api/applications/batch",
+        json=jsonable_encoder({"modify": [modified.model_dump(), modified.model_dump()]}),
+        headers=headers
+    )
+    assert duplicate.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+@pytest.mark.asyncio
+async def test_write_statement_counts(client: AsyncClient, get_user_token: str, sql_statements: list[str]):
+    """Tests if every single application write is one SQL statement, plus one each for the status
+    counters and the status history when the status changes.
+    On sqlite modify also reads the old status first, postgres gets it from the UPDATE itself"""
+    headers = {"Authorization": f"Bearer {get_user_token}"}
+    # warms the principal cache so auth adds no statements
+    await client.get("/api/application_stats", headers=headers)
+    sql_statements.clear()
+    application = UserApplication(company_name="Count", role_name="Intern", location="SG", status="Applied")
+    created = await client.post("/api/application",
+        json=jsonable_encoder(application.model_dump()),
+        headers=headers
+    )
+    assert created.status_code == status.HTTP_200_OK
+    assert len(sql_statements) == 3
+    sql_statements.clear()
+    modified = await client.put("/api/application",
+        json=jsonable_encoder({**created.json(), "status": "Interview"}),
+        headers=headers
+    )
+    assert modified.status_code == status.HTTP_200_OK
+    assert modified.json()["status"] == "Interview"
+    assert len(sql_statements) == 4
+    sql_statements.clear()
+    renamed = await client.put("/api/application",
+        json=jsonable_encoder({**modified.json(), "notes": "no status change"}),
+        headers=headers
+    )
+    assert renamed.status_code == status.HTTP_200_OK
+    assert len(sql_statements) == 2
+    sql_statements.clear()
+    deleted = await client.delete("/api/application",
+        params={"application_id": created.json()["id"]},
+        headers=headers
+    )
+    assert deleted.status_code == status.HTTP_202_ACCEPTED
+    assert len(sql_statements) == 3
+    sql_statements.clear()
+    missing = await client.delete("/api/application",
+        params={"application_id": created.json()["id"]},
+        headers=headers
+    )
+    assert missing.status_code == status.HTTP_404_NOT_FOUND
+    assert len(sql_statements) == 1
+    sql_statements.clear()
+    stats = await client.get("/api/application_stats", headers=headers)
+    assert stats.status_code == status.HTTP_200_OK
+    assert len(sql_statements) == 1
+
+@pytest.mark.asyncio
+async def test_application_counts_repair(
+    client: AsyncClient,
+    get_user_token: str,
+    create_mock_db,
+    mock_redis: FakeRedis
+):
+    """Tests if drifted counters are repaired by reconciliation and missing ones rebuilt on read"""
+    headers = {"Authorization": f"Bearer {get_user_token}"}
+    expected = (await client.get("/api/application_stats", headers=headers)).json()
+    async with create_mock_db as db:
+        await db.execute(update(UserApplicationCounts).values(applied=UserApplicationCounts.applied + 5))
+        await db.commit()
+        # the repair must also move cached stats to a new generation
+        assert await reconcile_application_counts(db, batch_size=1, redis=mock_redis) == 1
+    assert (await client.get("/api/application_stats", headers=headers)).json() == expected
+    async with create_mock_db as db:
+        await db.execute(delete(UserApplicationCounts))
+        await db.commit()
+    mock_redis.values.clear()
+    assert (await client.get("/api/application_stats", headers=headers)).json() == expected
+    async with create_mock_db as db:
+        assert await reconcile_application_counts(db) == 0
+
+@pytest.mark.asyncio
+async def test_cached_stats_and_deadlines(client: AsyncClient, get_user_token: str, sql_statements: list[str]):
+    """Tests if stats and deadlines are served from cache until the user writes an application"""
+    headers = {"Authorization": f"Bearer {get_user_token}"}
+    stats = await client.get("/api/application_stats", headers=headers)
+    deadlines = await client.get("/api/all_deadlines", headers=headers)
+    sql_statements.clear()
+    assert (await client.get("/api/application_stats", headers=headers)).json() == stats.json()
+    assert (await client.get("/api/all_deadlines", headers=headers)).json() == deadlines.json()
+    assert sql_statements == []
+    application = UserApplication(
+        company_name="Cached",
+        role_name="Intern",
+        location="SG",
+        status="Offered",
+        action_deadline=datetime.now(timezone.utc) + timedelta(hours=1)
+    )
+    await client.post("/api/application", json=jsonable_encoder(application.model_dump()), headers=headers)
+    new_stats = await client.get("/api/application_stats", headers=headers)
+    assert new_stats.json()["offered"] == stats.json()["offered"] + 1
+    new_deadlines = await client.get("/api/all_deadlines", headers=headers)
+    assert new_deadlines.json()[0]["company_name"] == "Cached"
+
+@pytest.mark.asyncio
+async def test_not_modified(client: AsyncClient, get_user_token: str, sql_statements: list[str]):
+    """Tests if a matching If-None-Match gets a 304 without touching the db until a write"""
+    headers = {"Authorization": f"Bearer {get_user_token}"}
+    stats = await client.get("/api/application_stats", headers=headers)
+    etag = stats.headers["ETag"]
+    assert stats.headers["Cache-Control"] == "private, no-cache"
+    page = await client.get("/api/all_applications", params={"limit": 1}, headers=headers)
+    assert page.headers["ETag"] != etag
+    sql_statements.clear()
+    cached = await client.get("/api/application_stats", headers={**headers, "If-None-Match": f'W/{etag}'})
+    assert cached.status_code == status.HTTP_304_NOT_MODIFIED
+    assert cached.headers["ETag"] == etag
+    assert sql_statements == []
+    application = UserApplication(company_name="Etag", role_name="Intern", location="SG", status="Applied")
+    await client.post("/api/application", json=jsonable_encoder(application.model_dump()), headers=headers)
+    changed = await client.get("/api/application_stats", headers={**headers, "If-None-Match": etag})
+    assert changed.status_code == status.HTTP_200_OK
+    assert changed.headers["ETag"] != etag
+
+@pytest.mark.asyncio
+async def test_search_applications(client: AsyncClient, get_user_token: str):
+    """Tests if search matches every word across company, role, location and notes"""
+    headers = {"Authorization": f"Bearer {get_user_token}"}
+    application = UserApplication(
+        company_name="Searchable",
+        role_name="Backend Intern",
+        location="SG",
+        status="Applied",
+        notes="Referred by alumni"
+    )
+    await client.post("/api/application", json=jsonable_encoder(application.model_dump()), headers=headers)
+    found = await client.get("/api/applications/search", params={"q": "backend ALUMNI"}, headers=headers)
+    assert found.status_code == status.HTTP_200_OK
+    assert [result["company_name"] for result in found.json()] == ["Searchable"]
+    missing = await client.get("/api/applications/search", params={"q": "backend frontend"}, headers=headers)
+    assert missing.json() == []
+    empty = await client.get("/api/applications/search", params={"q": ""}, headers=headers)
+    assert empty.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+@pytest.mark.skipif("TEST_POSTGRES_URL" not in os.environ, reason="needs a postgres database")
+@pytest.mark.asyncio
+async def test_search_uses_gin_index():
+    """Tests if postgres plans full text search with the GIN index on search_vector"""
+    engine = create_async_engine(os.environ["TEST_POSTGRES_URL"])
+    try:
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+            # same column and index as migration 9e3b7c1d4a58, which create_all does not know about
+            await conn.execute(text(
+                "ALTER TABLE application_statuses ADD COLUMN search_vector tsvector "
+                "GENERATED ALWAYS AS (to_tsvector('english', coalesce(company_name, '') || ' ' || "
+                "coalesce(role_name, '') || ' ' || coalesce(location, '') || ' ' || coalesce(notes, ''))) STORED"
+            ))
+            await conn.execute(text(
+                "CREATE INDEX ix_application_statuses_search_vector ON application_statuses USING gin (search_vector)"
+            ))
+            await conn.execute(text("SET LOCAL enable_seqscan = off"))
+            stmt = build_search_query(uuid.uuid4(), '"software engineer" -google', 20, 0, True).compile(
+                dialect=conn.dialect,
+                compile_kwargs={"literal_binds": True}
+            )
+            plan = "\n".join((await conn.execute(text(f"EXPLAIN {stmt}"))).scalars().all())
+            assert "ix_application_statuses_search_vector" in plan
+    finally:
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.drop_all)
+        await engine.dispose()
+
+@pytest.mark.asyncio
+async def test_export_applications(client: AsyncClient, get_user_token: str):
+    """Tests if a user's applications stream out as NDJSON and CSV in id order"""
+    headers = {"Authorization": f"Bearer {get_user_token}"}
+    applications = (await client.get("/api/all_applications", headers=headers)).json()
+    ndjson = await client.get("/api/applications/export", headers=headers)
+    assert ndjson.status_code == status.HTTP_200_OK
+    assert ndjson.headers["Content-Type"] == "application/x-ndjson"
+    rows = [json.loads(line) for line in ndjson.text.splitlines()]
+    assert [row["id"] for row in rows] == [application["id"] for application in applications]
+    assert "user_id" not in rows[0]
+    exported_csv = await client.get("/api/applications/export", params={"format": "csv"}, headers=headers)
+    records = list(csv.DictReader(io.StringIO(exported_csv.text)))
+    assert [int(record["id"]) for record in records] == [application["id"] for application in applications]
+    assert records[0]["status"] == applications[0]["status"]
+
+@pytest.mark.asyncio
+async def test_admin_export(client: AsyncClient, get_user_token: str):
+    """Tests if the admin export needs the admin key and includes every user's id"""
+    refused = await client.get("/api/admin/applications/export", headers={"X-Admin-Key": "guess"})
+    assert refused.status_code == status.HTTP_403_FORBIDDEN
+    with patch("app.dependencies.security.settings.admin_api_key", "secret"):
+        wrong = await client.get("/api/admin/applications/export", headers={"X-Admin-Key": "guess"})
+        assert wrong.status_code == status.HTTP_403_FORBIDDEN
+        exported = await client.get("/api/admin/applications/export", headers={"X-Admin-Key": "secret"})
+    assert exported.status_code == status.HTTP_200_OK
+    rows = [json.loads(line) for line in exported.text.splitlines()]
+    assert rows and all(row["user_id"] for row in rows)
+
+@pytest.mark.asyncio
+async def test_import_applications(client: AsyncClient, get_user_token: str, sql_statements: list[str]):
+    """Tests if a CSV import loads valid rows in one batched insert and reports the rest by line"""
+    headers = {"Authorization": f"Bearer {get_user_token}"}
+    before = (await client.get("/api/application_stats", headers=headers)).json()
+    upload = (
+        "\ufeffcompany_name,role_name,location,status,action_deadline,notes\n"
+        "Imported,Intern,London,Applied,,\n"
+        "Imported,Analyst,Paris,Interview,2030-01-01T00:00:00,second round\n"
+        "Imported,Engineer,Berlin,Ghosted,,\n"
+        "Imported,Designer,,Offered,,\n"
+        "Imported,Researcher,Rome,Offered,not a date,\n"
+        "Imported,Scientist,Oslo,Offered,,\n"
+    )
+    sql_statements.clear()
+    result = await client.post("/api/applications/import", headers=headers,
+        files={"file": ("applications.csv", upload.encode(), "text/csv")}
+    )
+    assert result.status_code == status.HTTP_200_OK
+    summary = result.json()
+    assert summary["imported"] == 3
+    assert [rejection["line"] for rejection in summary["rejected"]] == [4, 5, 6]
+    assert summary["rejected"][1]["errors"][0]["loc"] == ["location"]
+    assert len([statement for statement in sql_statements if statement.startswith("INSERT INTO application_statuses ")]) == 1
+    after = (await client.get("/api/application_stats", headers=headers)).json()
+    assert after["total"] == before["total"] + 3
+    assert after["interview"] == before["interview"] + 1
+    assert after["offered"] == before["offered"] + 1
+    missing_columns = await client.post("/api/applications/import", headers=headers,
+        files={"file": ("applications.csv", b"company_name,role_name\nA,B\n", "text/csv")}
+    )
+    assert missing_columns.status_code == status.HTTP_400_BAD_REQUEST
+    with patch("app.services.user_applications_service.MAX_IMPORT_ROWS", 2):
+        too_large = await client.post("/api/applications/import", headers=headers,
+            files={"file": ("applications.csv", upload.encode(), "text/csv")}
+        )
+    assert too_large.status_code == status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+    assert (await client.get("/api/application_stats", headers=headers)).json() == after
+
+@pytest.mark.asyncio
+async def test_deadline_window(client: AsyncClient, get_user_token: str):
+    """Tests if deadlines can be windowed with from, to and limit"""
+    headers = {"Authorization": f"Bearer {get_user_token}"}
+    start = datetime.now(timezone.utc) + timedelta(days=100)
+    for days, company in ((-500, "Old"), (0, "First"), (1, "Second"), (2, "Third")):
+        await client.post("/api/application", headers=headers, json=jsonable_encoder(UserApplication(
+            company_name=company, role_name="Window", location="SG", status="Applied",
+            action_deadline=start + timedelta(days=days, hours=1)
+        )))
+    window = {"from": jsonable_encoder(start), "to": jsonable_encoder(start + timedelta(days=2))}
+    result = await client.get("/api/all_deadlines", params=window, headers=headers)
+    assert result.status_code == status.HTTP_200_OK
+    assert [application["company_name"] for application in result.json()] == ["First", "Second"]
+    limited = await client.get("/api/all_deadlines", params={**window, "limit": 1}, headers=headers)
+    assert [application["company_name"] for application in limited.json()] == ["First"]
+    unbounded = await client.get("/api/all_deadlines", headers=headers)
+    assert unbounded.json()[0]["company_name"] == "Old"
+    too_many = await client.get("/api/all_deadlines", params={"limit": 10000}, headers=headers)
+    assert too_many.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+@pytest.mark.asyncio
+async def test_deadline_calendar(client: AsyncClient, get_user_token: str, sql_statements: list[str]):
+    """Tests if the calendar feed url serves deadlines as iCalendar and answers polls with 304"""
+    feed = await client.get("/api/calendar_feed", headers={"Authorization": f"Bearer {get_user_token}"})
+    assert feed.status_code == status.HTTP_200_OK
+    path = feed.json()["url"].removeprefix(str(client.base_url))
+    calendar = await client.get(path)
+    assert calendar.status_code == status.HTTP_200_OK
+    assert calendar.headers["Content-Type"].startswith("text/calendar")
+    assert calendar.text.startswith("BEGIN:VCALENDAR\r\n")
+    assert "SUMMARY:Window at First (Applied)" in calendar.text
+    etag = calendar.headers["ETag"]
+    sql_statements.clear()
+    polled = await client.get(path, headers={"If-None-Match": etag})
+    assert polled.status_code == status.HTTP_304_NOT_MODIFIED
+    assert (await client.get(path)).text == calendar.text
+    assert not sql_statements
+    forged = await client.get(f"/api/calendar/{uuid.uuid4().hex}.ics")
+    assert forged.status_code == status.HTTP_403_FORBIDDEN
+
+def test_render_calendar():
+    """Tests if calendar text is escaped and folded into lines of at most 75 octets"""
+    application = GetUserApplication(
+        id=1, company_name="Acme, Inc.", role_name="Intern", location="SG", status="Offered",
+        action_deadline=datetime(2030, 1, 1, 9), notes="Bring; résumé\n" + "é" * 100
+    )
+    calendar = render_calendar([application], datetime(2029, 1, 1, tzinfo=timezone.utc))
+    lines = calendar.split("\r\n")
+    assert all(len(line.encode()) <= 75 for line in lines)
+    assert "SUMMARY:Intern at Acme\\, Inc. (Offered)" in lines
+    assert "DTSTART:20300101T090000Z" in lines
+    unfolded = calendar.replace("\r\n ", "")
+    assert "DESCRIPTION:Bring\\; résumé\\n" + "é" * 100 + "\r\n" in unfolded
+
+@pytest.mark.asyncio
+async def test_deadline_reminders(client: AsyncClient, get_user_token: str, create_mock_db):
+    """Tests if a scan reminds of every deadline within the horizon across batches, and only once"""
+    headers = {"Authorization": f"Bearer {get_user_token}"}
+    now = datetime.now(timezone.utc) + timedelta(days=1000)
+    for hours in (1, 2, 2, 30):
+        await client.post("/api/application", headers=headers, json=jsonable_encoder(UserApplication(
+            company_name="Reminded", role_name="Intern", location="SG", status="Applied",
+            action_deadline=now + timedelta(hours=hours)
+        )))
+    sink = LogSink()
+    async with create_mock_db as db:
+        assert await scan_deadlines(db, sink, now, timedelta(hours=24), batch_size=2) == (3, 3)
+        assert await scan_deadlines(db, sink, now, timedelta(hours=24), batch_size=2) == (3, 0)
+        assert await scan_deadlines(db, sink, now, timedelta(hours=48), batch_size=2) == (4, 1)
+
+@pytest.mark.asyncio
+async def test_application_analytics(client: AsyncClient, mock_redis: FakeRedis, sql_statements: list[str]):
+    """Tests if the funnel and weekly activity follow the status history, deleted applications
+    included, and are cached until a write"""
+    account = {"name": "analyst", "email": "analyst@gmail.com", "password": "password"}
+    await client.post("/api/register", json=account)
+    token = (await client.post("/api/login", json=account)).json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+    created = []
+    for company in ("A", "B", "C"):
+        created.append((await client.post("/api/application", headers=headers, json=jsonable_encoder(
+            UserApplication(company_name=company, role_name="Intern", location="SG", status="Applied")
+        ))).json())
+    for application, path in ((created[0], ("Interview", "Offered")), (created[1], ("Interview", "Rejected"))):
+        for new_status in path:
+            application = (await client.put("/api/application", headers=headers,
+                json=jsonable_encoder({**application, "status": new_status})
+            )).json()
+    await client.post("/api/applications/batch", headers=headers, json={"delete": [created[2]["id"]]})
+    result = await client.get("/api/application_analytics", params={"weeks": 4}, headers=headers)
+    assert result.status_code == status.HTTP_200_OK
+    analytics = result.json()
+    funnel = {stage["status"]: stage for stage in analytics["funnel"]}
+    assert funnel["Applied"]["reached"] == 3 and funnel["Applied"]["share"] == 1.0
+    assert funnel["Interview"]["reached"] == 2
+    assert funnel["Offered"]["reached"] == 1 and funnel["Rejected"]["reached"] == 1
+    assert funnel["Accepted"] == {"status": "Accepted", "reached": 0, "share": 0.0, "mean_days": None}
+    assert funnel["Interview"]["mean_days"] is not None and funnel["Offered"]["mean_days"] is None
+    assert len(analytics["weekly"]) == 4
+    this_week = analytics["weekly"][-1]
+    assert this_week["status_changes"] == 4 and this_week["deleted"] == 1
+    assert this_week["created"] == 3
+    assert this_week["cumulative_created"] == this_week["created"]
+    sql_statements.clear()
+    assert (await client.get("/api/application_analytics", params={"weeks": 4}, headers=headers)).json() == analytics
+    assert not sql_statements
+    assert (await client.get("/api/application_analytics", params={"weeks": 53}, headers=headers)).status_code \
+        == status.HTTP_422_UNPROCESSABLE_ENTITY
@@ -1,13 +1,29 @@
 """Modules relevent for FastAPI testing and constructing mocks"""
+import io
 import uuid
 from datetime import datetime, timedelta, timezone
+from unittest.mock import patch
 
 from fastapi import status
 from httpx import AsyncClient
 import pytest
 import jwt
+from argon2 import PasswordHasher
 
-from tests.conftest import client, get_jwt_secrets, UserTest, good_user, get_session_token_secrets
+from tests.conftest import (
+    client,
+    get_jwt_secrets,
+    UserTest,
+    good_user,
+    get_session_token_secrets,
+    create_mock_db
+)
+from app.core.principal_cache import principal_cache
+from app.exceptions.auth_exceptions import HasherBusy
+from app.core.password_hasher import hash_password, verify_password, get_parameters
+from app.core.process_pool import HashingPool
+from app.core.revocation import RevocationList
+from app.workers.user_provisioner import provision_batch, read_rows
 
 class BadJWTConstructor:
     """Bad JWT Constructor"""
@@ -394,3 +410,261 @@ async def test_invalid_logout(client: AsyncClient, no_account_token: str):
         "Authorization": f"Bearer {no_account_token}"  
     })
     assert response.status_code == status.HTTP_401_UNAUTHORIZED
+
+@pytest.mark.asyncio
+async def test_principal_cache_hit(client: AsyncClient, good_user: UserTest):
+    """Tests if a verified user id is served from the principal cache on later requests"""
+    res1 = await client.post("/api/login",
+        json={"email": good_user.email,
+            "password": good_user.encrypted_password
+        }
+    )
+    token = res1.json()["access_token"]
+    await client.post("/api/test_login", headers={
+        "Authorization": f"Bearer {token}"
+    })
+    hits = principal_cache.hits
+    result = await client.post("/api/test_login", headers={
+        "Authorization": f"Bearer {token}"
+    })
+    assert result.status_code == status.HTTP_200_OK
+    assert principal_cache.hits == hits + 1
+    with patch("app.dependencies.security.settings.admin_api_key", "secret"):
+        stats = await client.get("/api/admin/principal_cache", headers={"X-Admin-Key": "secret"})
+    assert stats.status_code == status.HTTP_200_OK
+    assert stats.json()["hits"] == principal_cache.hits
+    assert 0 < stats.json()["hit_ratio"] <= 1
+
+@pytest.mark.asyncio
+async def test_logout_invalidates_principal(client: AsyncClient, good_user: UserTest):
+    """Tests if logging out evicts the user from the principal cache"""
+    res1 = await client.post("/api/login",
+        json={"email": good_user.email,
+            "password": good_user.encrypted_password
+        }
+    )
+    token = res1.json()["access_token"]
+    res2 = await client.post("/api/test_login", headers={
+        "Authorization": f"Bearer {token}"
+    })
+    user_id = uuid.UUID(res2.json())
+    assert await principal_cache.contains(user_id)
+    await client.post("/api/logout", headers={
+        "Authorization": f"Bearer {token}"
+    })
+    assert not await principal_cache.contains(user_id)
+
+@pytest.mark.asyncio
+async def test_login_hasher_busy(client: AsyncClient, good_user: UserTest):
+    """Tests if login returns 503 when the hashing pool is saturated"""
+    with patch("app.services.auth_service.hashing_pool.run", side_effect=HasherBusy):
+        response = await client.post("/api/login",
+            json={"email": good_user.email,
+                "password": good_user.encrypted_password
+            }
+        )
+    assert response.status_code == status.HTTP_503_SERVICE_UNAVAILABLE
+    assert response.headers["Retry-After"] == "1"
+
+@pytest.mark.asyncio
+async def test_hashing_pool_stats(client: AsyncClient, good_user: UserTest):
+    """Tests if the hashing pool's metrics are served behind the admin key and count logins"""
+    refused = await client.get("/api/admin/hashing_pool", headers={"X-Admin-Key": "guess"})
+    assert refused.status_code == status.HTTP_403_FORBIDDEN
+    with patch("app.dependencies.security.settings.admin_api_key", "secret"):
+        before = await client.get("/api/admin/hashing_pool", headers={"X-Admin-Key": "secret"})
+        await client.post("/api/login", json={"email": good_user.email, "password": good_user.encrypted_password})
+        after = await client.get("/api/admin/hashing_pool", headers={"X-Admin-Key": "secret"})
+    assert before.status_code == status.HTTP_200_OK
+    assert after.json()["completed"] == before.json()["completed"] + 1
+    assert after.json()["in_flight"] == 0
+
+@pytest.mark.asyncio
+async def test_multiple_device_sessions(client: AsyncClient, good_user: UserTest, expired_token):
+    """Tests if two logins keep independent sessions and a rotated token cannot be reused"""
+    logins = []
+    for _ in range(2):
+        res = await client.post("/api/login",
+            json={"email": good_user.email,
+                "password": good_user.encrypted_password
+            }
+        )
+        logins.append(res)
+    token = logins[0].json()["access_token"]
+    res2 = await client.post("/api/test_login", headers={
+        "Authorization": f"Bearer {token}"
+    })
+    old_token = expired_token(res2.json())
+    for res in logins:
+        result = await client.post("/api/token", headers={
+            "Authorization": f"Bearer {old_token}"
+        }, cookies={
+            "refresh_token": res.cookies.get("refresh_token")
+        })
+        assert result.status_code == status.HTTP_200_OK
+    reused = await client.post("/api/token", headers={
+        "Authorization": f"Bearer {old_token}"
+    }, cookies={
+        "refresh_token": logins[0].cookies.get("refresh_token")
+    })
+    assert reused.status_code == status.HTTP_401_UNAUTHORIZED
+
+@pytest.mark.asyncio
+async def test_logout_bad_refresh_token(client: AsyncClient, good_user: UserTest, expired_token):
+    """Tests if logging out with a refresh token that does not decode is refused
+    and leaves the user's other sessions alive"""
+    logins = []
+    for _ in range(2):
+        logins.append(await client.post("/api/login",
+            json={"email": good_user.email,
+                "password": good_user.encrypted_password
+            }
+        ))
+    token = logins[0].json()["access_token"]
+    user_id = (await client.post("/api/test_login", headers={"Authorization": f"Bearer {token}"})).json()
+    response = await client.post("/api/logout", headers={
+        "Authorization": f"Bearer {token}"
+    }, cookies={
+        "refresh_token": "garbled"
+    })
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+    result = await client.post("/api/token", headers={
+        "Authorization": f"Bearer {expired_token(user_id)}"
+    }, cookies={
+        "refresh_token": logins[1].cookies.get("refresh_token")
+    })
+    assert result.status_code == status.HTTP_200_OK
+
+@pytest.mark.asyncio
+async def test_stateless_revoked_token(client: AsyncClient, good_user: UserTest):
+    """Tests if stateless auth accepts a signed token until it is revoked by logging out"""
+    with patch("app.dependencies.security.settings.stateless_auth", True):
+        res1 = await client.post("/api/login",
+            json={"email": good_user.email,
+                "password": good_user.encrypted_password
+            }
+        )
+        token = res1.json()["access_token"]
+        res2 = await client.post("/api/test_login", headers={
+            "Authorization": f"Bearer {token}"
+        })
+        assert res2.status_code == status.HTTP_200_OK
+        await client.post("/api/logout", headers={
+            "Authorization": f"Bearer {token}"
+        })
+        result = await client.post("/api/test_login", headers={
+            "Authorization": f"Bearer {token}"
+        })
+        assert result.status_code == status.HTTP_401_UNAUTHORIZED
+        assert result.json()["detail"] == "Revoked token"
+
+@pytest.mark.asyncio
+async def test_stateless_logout_everywhere(client: AsyncClient, good_user: UserTest):
+    """Tests if logging out without a refresh token revokes every access token issued before,
+    but not one from logging in again"""
+    # earlier tests logged this user out everywhere, start from an empty list
+    revocations = RevocationList(0)
+    with patch("app.dependencies.security.settings.stateless_auth", True), \
+        patch("app.dependencies.security.revocation_list", revocations), \
+        patch("app.services.auth_service.revocation_list", revocations), \
+        patch("app.api.routes_auth.revocation_list", revocations):
+        login = await client.post("/api/login",
+            json={"email": good_user.email,
+                "password": good_user.encrypted_password
+            }
+        )
+        token = login.json()["access_token"]
+        user_id = (await client.post("/api/test_login", headers={"Authorization": f"Bearer {token}"})).json()
+        other_device = BadJWTConstructor(
+            sub=user_id,
+            exp=datetime.now(timezone.utc) + timedelta(minutes=10),
+            iat=datetime.now(timezone.utc) - timedelta(minutes=1)
+        ).generate_token()
+        before = await client.post("/api/test_login", headers={"Authorization": f"Bearer {other_device}"})
+        assert before.status_code == status.HTTP_200_OK
+        await client.post("/api/logout", headers={"Authorization": f"Bearer {token}"})
+        after = await client.post("/api/test_login", headers={"Authorization": f"Bearer {other_device}"})
+        assert after.status_code == status.HTTP_401_UNAUTHORIZED
+        assert after.json()["detail"] == "Revoked token"
+        relogin = await client.post("/api/login",
+            json={"email": good_user.email,
+                "password": good_user.encrypted_password
+            }
+        )
+        fresh = await client.post("/api/test_login", headers={
+            "Authorization": f"Bearer {relogin.json()['access_token']}"
+        })
+        assert fresh.status_code == status.HTTP_200_OK
+
+def test_calibration_shared(tmp_path):
+    """Tests if argon2 is calibrated once per machine and later workers reuse the result"""
+    path = str(tmp_path / "argon2_calibration.json")
+    with patch("app.core.password_hasher.settings.argon2_calibration_file", path), \
+        patch("app.core.password_hasher.settings.argon2_time_cost", None), \
+        patch("app.core.password_hasher.measure", return_value=1.0) as measure:
+        first = get_parameters.__wrapped__()
+        calls = measure.call_count
+        second = get_parameters.__wrapped__()
+    assert calls > 0 and measure.call_count == calls
+    assert first == second
+
+def test_weak_hash_needs_rehash():
+    """Tests if hashes weaker than the calibrated parameters are flagged for upgrade"""
+    weak_hash = PasswordHasher(time_cost=1, memory_cost=8192, parallelism=1).hash("password")
+    assert verify_password(weak_hash, "password")
+    assert not verify_password(hash_password("password"), "password")
+
+@pytest.mark.asyncio
+async def test_login_rate_limited(client: AsyncClient, good_user: UserTest):
+    """Tests if login is rejected with 429 before hashing once the token bucket is empty"""
+    with patch("app.dependencies.rate_limiter.take_token", return_value=(False, 7)), \
+        patch("app.services.auth_service.hashing_pool.run") as mock_hash:
+        response = await client.post("/api/login",
+            json={"email": good_user.email,
+                "password": good_user.encrypted_password
+            }
+        )
+    assert response.status_code == status.HTTP_429_TOO_MANY_REQUESTS
+    assert response.headers["Retry-After"] == "7"
+    mock_hash.assert_not_called()
+
+def fail_hash(unused: str):
+    """Hash function that always fails"""
+    raise ValueError("bad hash")
+
+@pytest.mark.asyncio
+async def test_hashing_pool_failures():
+    """Tests if failed jobs are counted apart from completed ones and left out of their latency"""
+    pool = HashingPool(1, max_queue=10)
+    assert await pool.run(str.upper, "ok") == "OK"
+    with pytest.raises(ValueError):
+        await pool.run(fail_hash, "bad")
+    stats = pool.stats()
+    assert (stats["completed"], stats["failed"], stats["in_flight"]) == (1, 1, 0)
+    assert stats["mean_latency"] == pool.total_latency
+
+@pytest.mark.asyncio
+async def test_bulk_provision(create_mock_db):
+    """Tests if bulk provisioning creates users once and reports duplicate and invalid rows"""
+    pool = HashingPool(2, max_queue=10)
+    batch = [
+        (2, {"name": "bulk", "email": "bulk@gmail.com", "password": "password"}),
+        (3, {"name": "bulk", "email": "bulk@gmail.com", "password": "password"}),
+        (4, {"name": "bulk"}),
+        (5, {"name": "bulk", "email": " ", "password": "password"})
+    ]
+    async with create_mock_db as db:
+        results = await provision_batch(db, batch, pool)
+        assert [result["status"] for result in results] == ["created", "duplicate", "invalid", "invalid"]
+        rerun = await provision_batch(db, batch[:1], pool)
+        assert rerun[0]["status"] == "duplicate"
+
+@pytest.mark.asyncio
+async def test_provision_non_object_rows(create_mock_db):
+    """Tests if JSONL lines that are valid JSON but not objects are reported invalid"""
+    file = io.StringIO('[]\n"x"\n1\nnull\n{"name": "bulk", "email": "objects@gmail.com", "password": "password"}\n')
+    rows = list(read_rows(file, is_csv=False))
+    assert rows[:4] == [(line, {"error": "not a JSON object"}) for line in range(1, 5)]
+    async with create_mock_db as db:
+        results = await provision_batch(db, rows, HashingPool(2, max_queue=10))
+    assert [result["status"] for result in results] == ["invalid"] * 4 + ["created"]
@@ -1,11 +1,13 @@
 """Imports relevant modules needed to test and override db dependency"""
 import io
 import os
+import time
 from unittest.mock import AsyncMock, patch
 
 import pytest
 import pytest_asyncio
 
+from sqlalchemy import event
 from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from httpx import ASGITransport, AsyncClient
 from asgi_lifespan import LifespanManager
@@ -15,6 +17,7 @@ from app.dependencies.redis_client import get_redis
 from app.main import app
 from app.models.base import Base
 from app.schemas.internship_listings import InternshipListing
+from app.services.internship_listings_service import listing_id, encode_listing
 
 def get_jwt_secrets():
     """Returns JWT secret key"""
@@ -60,22 +63,70 @@ async def create_mock_db():
         if os.path.exists("test.db"):
             os.remove("test.db")
 
+@pytest.fixture(scope="function")
+def sql_statements(create_mock_db):
+    """Records every SQL statement sent to the mock db, to lock in round trips per endpoint"""
+    statements: list[str] = []
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+    engine = create_mock_db.bind.sync_engine
+    event.listen(engine, "before_cursor_execute", record)
+    yield statements
+    event.remove(engine, "before_cursor_execute", record)
+
 class FakeRedis:
     """Fake Redis"""
     def __init__(self):
         self.storage: list[InternshipListing] = []
+        self.values: dict[str, str] = {}
+        self.scraped: dict[str, float] = {}
 
     async def zrange(self, unused: str, start: int, end: int):
-        """Fake zrange()"""
+        """Fake zrange(), returns listing ids like the listings zsets"""
         end = min(end + 1, len(self.storage))
         result = []
         for i in range(start, end, 1):
-            result.append(self.storage[i].model_dump_json())
+            result.append(listing_id(self.storage[i]))
         return result
 
-    async def add(self, listings: list[InternshipListing]):
-        """Fake cache adding"""
+    async def hmget(self, unused: str, ids: list[str]):
+        """Fake hmget(), every stored listing's body is in every bodies hash"""
+        bodies = {listing_id(listing): encode_listing(listing) for listing in self.storage}
+        return [bodies.get(id) for id in ids]
+
+    async def zmscore(self, unused: str, ids: list[str]):
+        """Fake zmscore(), returns when each listing id was scraped like the scrape times zsets"""
+        return [self.scraped.get(id) for id in ids]
+
+    async def add(self, listings: list[InternshipListing], scraped_at: float | None = None):
+        """Fake cache adding, listings are scraped now unless given when"""
         self.storage.extend(listings)
+        for listing in listings:
+            self.scraped[listing_id(listing)] = time.time() if scraped_at is None else scraped_at
+
+    async def get(self, key: str):
+        """Fake get()"""
+        return self.values.get(key)
+
+    async def set(self, key: str, value, ex: int | None = None, nx: bool = False):
+        """Fake set(), expiry is ignored. Values come back decoded like decode_responses=True"""
+        if nx and key in self.values:
+            return None
+        self.values[key] = value.decode() if isinstance(value, bytes) else str(value)
+        return True
+
+    async def incr(self, key: str):
+        """Fake incr()"""
+        self.values[key] = str(int(self.values.get(key, 0)) + 1)
+        return int(self.values[key])
+
+    async def exists(self, *keys: str):
+        """Fake exists()"""
+        return sum(key in self.values for key in keys)
+
+    async def delete(self, *keys: str):
+        """Fake delete()"""
+        return sum(self.values.pop(key, None) is not None for key in keys)
 
 @pytest.fixture(scope="function")
 def mock_redis():
@@ -85,7 +136,12 @@ def mock_redis():
 @pytest.fixture(scope="function")
 def mock_cache():
     """Fixture to mock caching"""
-    async def fake_add(fake_redis: FakeRedis, listings: list[InternshipListing], unused: str):
+    async def fake_add(
+        fake_redis: FakeRedis,
+        listings: list[InternshipListing],
+        key: str,
+        window: tuple[int, int] | None = None
+    ):
         await fake_redis.add(listings)
 
     mock = AsyncMock(side_effect=fake_add)
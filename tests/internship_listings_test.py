@@ -1,14 +1,31 @@
 """Modules relevant for FastAPI testing and patching of scraper, boto3 API"""
+import asyncio
 import os
+import time
 from typing import TextIO
 from unittest.mock import patch
 
 from fastapi import status
 from httpx import AsyncClient
+import uuid
+
+import fakeredis
 import pytest
 
-from tests.conftest import UserTest, client, get_user_token, mock_boto3, mock_cache
+from tests.conftest import (
+    UserTest, FakeRedis, client, get_user_token, mock_boto3, mock_cache, mock_redis, create_mock_db
+)
+from app.models.user_skills import UserSkill
 from app.schemas.internship_listings import InternshipListing
+from app.workers.listings_warmer import rank_warm_keys, warm_windows
+from app.services.internship_listings_service import (
+    scrape_once, scrape_flights, unique_listings, listing_id, encode_listing, decode_listing,
+    get_listings, page_window, cache, fetch, is_stale, listings_key, scraped_key, bodies_key,
+    CACHE_EXPIRE, CACHE_SOFT_EXPIRE
+)
+from app.schemas.internship_listings import PAGE_LENGTH, ACTIVE_PORTALS as PORTALS
+from app.exceptions.internship_listings_exceptions import ScraperDown
+from app.core.lease_lock import LeaseLock
 
 PAGE_RESULTS = 10
 ACTIVE_PORTALS = 2
@@ -144,3 +161,135 @@ async def test_less_listings(client: AsyncClient, get_user_token: str, mock_scra
     mock_cache.assert_awaited()
     assert result.status_code == status.HTTP_200_OK
     assert result.json() != []
+
+def test_rank_warm_keys():
+    """Tests if requested keys are warmed by demand first, then roles, then roles in popular industries,
+    with preferences and industries kept apart"""
+    demand = {
+        ("Backend", None): 2.0,
+        ("Frontend", "fintech"): 5.0,
+        ("Backend", "gaming"): 1.0,
+        ("QA", "fintech"): 1.0,
+        ("Machine_Learning", "ad_tech"): 0.5
+    }
+    keys = rank_warm_keys(demand, ["Backend", "Frontend", "QA"], industries=1)
+    assert keys[:5] == [
+        ("Frontend", "fintech"), ("Backend", None), ("Backend", "gaming"), ("QA", "fintech"), ("Machine_Learning", "ad_tech")
+    ]
+    assert keys[5:] == [("Frontend", None), ("QA", None), ("Backend", "fintech")]
+
+def test_warm_windows():
+    """Tests if the warmer scrapes page by page with the windows a user's request would"""
+    assert warm_windows(0, 2) == [page_window(0, 0, PAGE_LENGTH, PORTALS), page_window(1, 0, PAGE_LENGTH, PORTALS)]
+    assert warm_windows(PAGE_LENGTH + 4, 2) == [page_window(1, 4, PAGE_LENGTH, PORTALS)]
+    assert warm_windows(2 * PAGE_LENGTH, 2) == []
+
+@pytest.mark.asyncio
+async def test_coalesced_scrapes(mock_redis: FakeRedis, mock_cache):
+    """Tests if concurrent misses of one key window share a scrape and its failure,
+    while other windows scrape separately"""
+    def slow_scraper(preference: str, start: int, end: int, industry: str | None):
+        time.sleep(0.1)
+        if preference == "Down":
+            raise ScraperDown
+        return [InternshipListing(job_url=f"{preference}/{i}") for i in range(start, end)]
+    with patch("app.services.internship_listings_service.sync_scrape_jobs", side_effect=slow_scraper) as scraper:
+        results = await asyncio.gather(
+            *(scrape_once(mock_redis, "Backend", "Backend", 0, 5) for _ in range(4)),
+            scrape_once(mock_redis, "Backend", "Backend", 5, 10)
+        )
+        assert scraper.call_count == 2
+        assert all(result == results[0] for result in results[:4])
+        assert results[4][0].job_url == "Backend/5"
+        failures = await asyncio.gather(
+            *(scrape_once(mock_redis, "Down", "Down", 0, 5) for _ in range(3)),
+            return_exceptions=True
+        )
+        assert scraper.call_count == 3
+        assert all(isinstance(failure, ScraperDown) for failure in failures)
+    assert mock_cache.await_count == 2
+    assert scrape_flights.in_flight() == 0
+
+def test_unique_listings():
+    """Tests if a posting is identified by its job_url alone and its first copy is kept"""
+    first = InternshipListing(job_url="https://jobs/1", title="Intern")
+    changed = InternshipListing(job_url="https://jobs/1", title="Intern (Summer)")
+    other = InternshipListing(job_url="https://jobs/2", title="Intern")
+    assert listing_id(first) == listing_id(changed) != listing_id(other)
+    assert unique_listings([first, other, changed]) == [first, other]
+
+def test_listing_body_round_trip():
+    """Tests if a cached body decodes back to its listing and is smaller than its json"""
+    listing = InternshipListing(job_url="https://jobs/1", title="Intern", description="<p>Build things.</p>" * 100)
+    assert decode_listing(encode_listing(listing)) == listing
+    assert len(encode_listing(listing)) < len(listing.model_dump_json()) / 4
+
+@pytest.mark.asyncio
+async def test_stale_listings(create_mock_db, mock_redis: FakeRedis):
+    """Tests if a stale page is served at once and refreshed in the background,
+    and if cached listings are served while the scraper is down"""
+    user_id = uuid.uuid4()
+    await mock_redis.add([InternshipListing(job_url=f"Backend/{i}") for i in range(PAGE_RESULTS + 5)])
+    with (
+        patch("app.services.internship_listings_service.refresh_in_background") as refresh,
+        patch("app.services.internship_listings_service.sync_scrape_jobs", side_effect=ScraperDown) as scraper
+    ):
+        async with create_mock_db as db:
+            db.add(UserSkill(user_id=user_id, preference="Backend"))
+            await db.commit()
+            fresh = await get_listings(db, user_id, mock_redis, ACTIVE_PORTALS, PAGE_RESULTS)
+            assert len(fresh) == PAGE_RESULTS
+            refresh.assert_not_called()
+            mock_redis.scraped[listing_id(fresh[-1])] -= CACHE_SOFT_EXPIRE + 1
+            stale = await get_listings(db, user_id, mock_redis, ACTIVE_PORTALS, PAGE_RESULTS)
+            assert stale == fresh
+            refresh.assert_called_once_with(mock_redis, "Backend", "Backend", 0, PAGE_RESULTS, ACTIVE_PORTALS, None)
+            scraper.assert_not_called()
+            partial = await get_listings(db, user_id, mock_redis, ACTIVE_PORTALS, PAGE_RESULTS, page=1)
+            assert [listing.job_url for listing in partial] == [f"Backend/{i}" for i in range(PAGE_RESULTS, PAGE_RESULTS + 5)]
+            with pytest.raises(ScraperDown):
+                await get_listings(db, user_id, mock_redis, ACTIVE_PORTALS, PAGE_RESULTS, page=2)
+
+@pytest.mark.asyncio
+async def test_refresh_replaces_window():
+    """Tests if the cache script's refresh replaces only the refreshed window, drops postings
+    that are gone, makes only the refreshed listings fresh and extends the key's hard ttl,
+    moving the bodies it keeps into today's hash"""
+    r = fakeredis.FakeAsyncRedis(decode_responses=True)
+    listings = [InternshipListing(job_url=f"Backend/{i}") for i in range(3 * PAGE_RESULTS)]
+    await cache(r, listings, "Backend")
+    # as if cached yesterday, longer than the soft ttl ago
+    scraped_at = time.time() - CACHE_SOFT_EXPIRE - 1
+    await r.zadd(scraped_key("Backend"), {listing_id(listing): scraped_at for listing in listings}, xx=True)
+    today = int(time.time() // 86400)
+    await r.rename(bodies_key(today), bodies_key(today - 1))
+    await r.expire(listings_key("Backend"), CACHE_EXPIRE // 2)
+    pages = [listings[i:i + PAGE_RESULTS] for i in range(0, len(listings), PAGE_RESULTS)]
+    assert await is_stale(r, "Backend", pages[1])
+
+    refreshed = [InternshipListing(job_url=f"Backend/new/{i}") for i in range(PAGE_RESULTS - 2)]
+    await cache(r, pages[1][:2] + refreshed + [pages[0][0]], "Backend", window=(PAGE_RESULTS, PAGE_RESULTS))
+    assert await r.ttl(listings_key("Backend")) > CACHE_EXPIRE // 2
+    assert await r.ttl(scraped_key("Backend")) > CACHE_EXPIRE // 2
+    await r.delete(bodies_key(today - 1))
+    cached = await fetch(r, "Backend", 0, 3 * PAGE_RESULTS)
+    assert cached == pages[0] + pages[1][:2] + refreshed + pages[2]
+    assert await r.zcard(listings_key("Backend")) == 3 * PAGE_RESULTS
+    assert await r.zscore(scraped_key("Backend"), listing_id(pages[1][5])) is None
+    assert not await is_stale(r, "Backend", cached[PAGE_RESULTS:2 * PAGE_RESULTS])
+    assert await is_stale(r, "Backend", pages[0])
+    assert await is_stale(r, "Backend", pages[2])
+
+@pytest.mark.asyncio
+async def test_lease_keep_alive_failure():
+    """Tests if a lease whose renewal fails is marked lost instead of failing its keep alive task"""
+    class BrokenRedis:
+        """Redis whose scripts always fail"""
+        def register_script(self, unused: str):
+            async def script(**kwargs):
+                raise ConnectionError("redis down")
+            return script
+    lease = LeaseLock(BrokenRedis(), "scrape", ttl_ms=3)
+    lease.held = True
+    await asyncio.wait_for(lease.keep_alive(), timeout=1)
+    assert not lease.held